@@ -5,12 +5,23 @@ module.exports = {
   paths: {
     // Directory for storing help files
     helpDir: path.join(__dirname, '../../help'),
+    // Reports and summary of compare_corpus.py, apart from the per-tool reports in helpDir
+    corpusDir: path.join(__dirname, '../../help/corpus'),
     // Directory for storing parameter files
     parametersDir: path.join(__dirname, '../../parameters'),
     // Directory for temporary file uploads
     tempUploadsDir: path.join(__dirname, '../../temp_uploads'),
     // Directory for Python scripts
     scriptsDir: path.join(__dirname, '../scripts'),
+    // Directory of per-tool pipeline traces; tracing is off unless METADOCK_TRACE_DIR is set
+    traceDir: process.env.METADOCK_TRACE_DIR ? path.resolve(process.env.METADOCK_TRACE_DIR) : null,
+    // Aligned comparison rows (JSON) served page by page to the virtualized viewer
+    comparisonRowsDir: path.join(__dirname, '../../cache/comparison_rows'),
+    // Tools an upload is processing; watch_help.py leaves them alone meanwhile
+    helpClaimsDir: path.join(__dirname, '../../cache/help_claims'),
+    // Watch hook token generated at startup when METADOCK_WATCH_TOKEN is not set;
+    // watch_help.py reads it from here
+    watchTokenFile: path.join(__dirname, '../../cache/watch_token'),
   },
 
   // Python script paths
@@ -18,6 +29,19 @@ module.exports = {
     param: path.join(__dirname, '../scripts/param.py'),
     jsonToHelp: path.join(__dirname, '../scripts/json_to_help.py'),
     compareHelp: path.join(__dirname, '../scripts/compare_help_html.py'),
+    helpWorker: path.join(__dirname, '../scripts/help_worker.py'),
+    compareCorpus: path.join(__dirname, '../scripts/compare_corpus.py'),
+    // Single entry point for the parse / render / compare / all stages
+    metadockHelp: path.join(__dirname, '../scripts/metadock_help.py'),
+  },
+
+  // Virtualized comparison viewer
+  comparisonRows: {
+    // Rows per request
+    pageSize: 200,
+    maxPageSize: 1000,
+    // Parsed payloads kept in memory
+    cacheEntries: 8,
   },
 
   // File upload settings
@@ -30,6 +54,8 @@ module.exports = {
 
   // Tool configuration
   tool: {
+    // Tool names, as used in help/<tool>_help.txt and route paths
+    namePattern: /^[A-Za-z0-9][A-Za-z0-9._-]*$/,
     // Default environment setup for new tools
     defaultEnv: '',
     // Default HTML template
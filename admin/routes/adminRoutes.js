@@ -1,14 +1,16 @@
 const express = require('express');
 const router = express.Router();
 const multer = require('multer');
+const crypto = require('crypto');
 const path = require('path');
 const fs = require('fs').promises;
-const { exec } = require('child_process');
+const { exec, spawn } = require('child_process');
 const { promisify } = require('util');
 const execAsync = promisify(exec);
 const toolsConfig = require('../../config/tools');
 const adminConfig = require('../config/adminConfig');
 const installerController = require('../controllers/installerController');
+const helpWorker = require('../services/helpWorkerService');
 
 // Admin authentication middleware
 const isAdmin = (req, res, next) => {
@@ -32,6 +34,26 @@ const isConnected = (req, res, next) => {
   next();
 };
 
+// Watch daemon hook check: the shared token, METADOCK_WATCH_TOKEN or one generated
+// at startup and written where watch_help.py reads it. Requests are never trusted
+// for coming from this machine, a reverse proxy makes every request look local
+const watchToken = process.env.METADOCK_WATCH_TOKEN || crypto.randomBytes(32).toString('hex');
+if (!process.env.METADOCK_WATCH_TOKEN) {
+  fs.mkdir(path.dirname(adminConfig.paths.watchTokenFile), { recursive: true })
+    .then(() => fs.writeFile(adminConfig.paths.watchTokenFile, watchToken, { mode: 0o600 }))
+    .then(() => fs.chmod(adminConfig.paths.watchTokenFile, 0o600))
+    .catch(error => console.error('Could not write the watch hook token:', error));
+}
+
+const isWatchHook = (req, res, next) => {
+  const given = Buffer.from(req.get('X-Metadock-Watch-Token') || '');
+  const expected = Buffer.from(watchToken);
+  if (given.length !== expected.length || !crypto.timingSafeEqual(given, expected)) {
+    return res.status(403).json({ error: 'Forbidden' });
+  }
+  next();
+};
+
 // GET /data/tools_install.json -> provide tool installation configuration data
 router.get('/data/tools_install.json', isAdmin, (req, res) => {
     try {
@@ -196,12 +218,84 @@ router.get('/tools', isAdmin, (req, res) => {
   res.render('admin/tool-management');
 });
 
+// tools.js entry of a newly added tool
+function defaultToolEntry(toolName) {
+  return {
+    title: `${toolName} Parameters`,
+    toolName: toolName,
+    route: toolName,
+    commandRoute: `/run-command-${toolName}`,
+    usagePath: `parameters/${toolName}_usage.json`,
+    paraPath: `parameters/${toolName}_para.json`,
+    html: adminConfig.tool.defaultHtml,
+    selectionRoute: `/complete-selection-${toolName}`,
+    env: adminConfig.tool.defaultEnv,
+    hasStderr: adminConfig.tool.defaultHasStderr
+  };
+}
+
+// Copy the help page an upload is re-parsed against to a temp file of its own:
+// the tool's current page or, for a new version uploaded under a new name, the
+// page of previousToolName, whose parameters then seed the new tool's. null when
+// neither was parsed or a full re-parse was asked for
+async function keepPreviousHelp(toolName, previousToolName, fullReparse) {
+  if (!toolName || fullReparse === 'true' || fullReparse === true) {
+    return null;
+  }
+  const files = name => ({
+    help: path.join(adminConfig.paths.helpDir, `${name}_help.txt`),
+    para: path.join(adminConfig.paths.parametersDir, `${name}_para.json`),
+    usage: path.join(adminConfig.paths.parametersDir, `${name}_usage.json`)
+  });
+  const isParsed = async (name) => {
+    const { help, para } = files(name);
+    const found = await Promise.all([help, para].map(file => fs.access(file).then(() => true, () => false)));
+    return found.every(Boolean);
+  };
+
+  let source = toolName;
+  if (!await isParsed(toolName)) {
+    if (!previousToolName || previousToolName === toolName || !await isParsed(previousToolName)) {
+      return null;
+    }
+    source = previousToolName;
+    const previous = files(previousToolName);
+    const current = files(toolName);
+    await fs.mkdir(adminConfig.paths.parametersDir, { recursive: true });
+    await fs.copyFile(previous.para, current.para);
+    await fs.copyFile(previous.usage, current.usage).catch(() => {});
+  }
+
+  await fs.mkdir(adminConfig.paths.tempUploadsDir, { recursive: true });
+  const previousPath = path.join(adminConfig.paths.tempUploadsDir, `${toolName}_previous_${crypto.randomUUID()}.txt`);
+  await fs.copyFile(files(source).help, previousPath);
+  return previousPath;
+}
+
+// Mark a tool as being processed by an upload; watch_help.py skips the files
+// written meanwhile instead of processing the same page a second time
+async function claimHelp(toolName) {
+  await fs.mkdir(adminConfig.paths.helpClaimsDir, { recursive: true });
+  const claimPath = path.join(adminConfig.paths.helpClaimsDir, toolName);
+  await fs.writeFile(claimPath, String(process.pid));
+  return claimPath;
+}
+
 // Upload help file and process
 router.post('/upload-help', upload.single('helpFile'), async (req, res) => {
+  // A tool that was already parsed (or the previous version named by
+  // previousToolName) keeps its help page so only the changed option blocks
+  // are re-parsed and admin edits survive; taken once the upload is valid
+  let previousHelpPath = null;
+  let claimPath = null;
   try {
-    const { toolName, remoteHelpPath } = req.body;
+    const { toolName, previousToolName, remoteHelpPath, fullReparse } = req.body;
     const helpFile = req.file;
 
+    if (!adminConfig.tool.namePattern.test(toolName || '')) {
+      return res.status(400).json({ error: adminConfig.errors.tool.invalidName });
+    }
+
     // Check if we should read from remote server
     if (remoteHelpPath) {
       // Read help file from remote server
@@ -215,6 +309,8 @@ router.post('/upload-help', upload.single('helpFile'), async (req, res) => {
       await fs.mkdir(adminConfig.paths.parametersDir, { recursive: true });
       await fs.mkdir(adminConfig.paths.helpDir, { recursive: true });
       await fs.mkdir(adminConfig.paths.tempUploadsDir, { recursive: true });
+      claimPath = await claimHelp(toolName);
+      previousHelpPath = await keepPreviousHelp(toolName, previousToolName, fullReparse);
 
       // Save help content to local file
       const helpPath = path.join(adminConfig.paths.helpDir, `${toolName}_help.txt`);
@@ -238,6 +334,8 @@ router.post('/upload-help', upload.single('helpFile'), async (req, res) => {
     await fs.mkdir(adminConfig.paths.parametersDir, { recursive: true });
     await fs.mkdir(adminConfig.paths.helpDir, { recursive: true });
     await fs.mkdir(adminConfig.paths.tempUploadsDir, { recursive: true });
+    claimPath = await claimHelp(toolName);
+    previousHelpPath = await keepPreviousHelp(toolName, previousToolName, fullReparse);
 
     // Move help file to help directory
     const helpPath = path.join(adminConfig.paths.helpDir, `${toolName}_help.txt`);
@@ -251,78 +349,30 @@ router.post('/upload-help', upload.single('helpFile'), async (req, res) => {
     const paraOutputPath = path.join(adminConfig.paths.parametersDir, `${toolName}_para.json`);
     const usageOutputPath = path.join(adminConfig.paths.parametersDir, `${toolName}_usage.json`);
 
-    console.log('Running param.py script...');
-    // Run param.py script
-    await new Promise((resolve, reject) => {
-      const command = `python "${adminConfig.scripts.param}" "${helpPath}" "${paraOutputPath}" "${usageOutputPath}"`;
-      console.log('Executing command:', command);
-      
-      exec(command, (error, stdout, stderr) => {
-        if (error) {
-          console.error('param.py error:', error);
-          console.error('param.py stderr:', stderr);
-          reject(new Error(adminConfig.errors.process.paramExtraction));
-          return;
-        }
-        console.log('param.py stdout:', stdout);
-        resolve(stdout);
-      });
-    });
-
-    console.log('Running json_to_help.py script...');
-    // Run json_to_help.py script
+    // Run param.py, json_to_help.py and compare_help_html.py in the persistent help worker
     const generatedHelpPath = path.join(adminConfig.paths.helpDir, `${toolName}_generated_help.txt`);
-    await new Promise((resolve, reject) => {
-      const command = `python "${adminConfig.scripts.jsonToHelp}" "${paraOutputPath}" "${usageOutputPath}" "${generatedHelpPath}"`;
-      console.log('Executing command:', command);
-      
-      exec(command, (error, stdout, stderr) => {
-        if (error) {
-          console.error('json_to_help.py error:', error);
-          console.error('json_to_help.py stderr:', stderr);
-          reject(new Error(adminConfig.errors.process.jsonConversion));
-          return;
-        }
-        console.log('json_to_help.py stdout:', stdout);
-        resolve(stdout);
-      });
-    });
-
-    console.log('Running compare_help_html.py script...');
-    // Run compare_help_html.py script
     const comparisonOutputPath = path.join(adminConfig.paths.helpDir, `${toolName}_comparison.html`);
-    await new Promise((resolve, reject) => {
-      const command = `python "${adminConfig.scripts.compareHelp}" "${helpPath}" "${generatedHelpPath}" "${comparisonOutputPath}"`;
-      console.log('Executing command:', command);
-      
-      exec(command, (error, stdout, stderr) => {
-        if (error) {
-          console.error('compare_help_html.py error:', error);
-          console.error('compare_help_html.py stderr:', stderr);
-          reject(new Error(adminConfig.errors.process.comparison));
-          return;
-        }
-        console.log('compare_help_html.py stdout:', stdout);
-        resolve(stdout);
+    console.log('Processing help file in help worker...');
+    let changes = null;
+    try {
+      const result = await helpWorker.process({
+        help_file: helpPath,
+        para_file: paraOutputPath,
+        usage_file: usageOutputPath,
+        generated_help_file: generatedHelpPath,
+        comparison_file: comparisonOutputPath,
+        previous_help_file: previousHelpPath,
+        changes_file: previousHelpPath && path.join(adminConfig.paths.parametersDir, `${toolName}_changes.json`)
       });
-    });
-
-    // Update tools config
-    const newTool = {
-      title: `${toolName} Parameters`,
-      toolName: toolName,
-      route: toolName,
-      commandRoute: `/run-command-${toolName}`,
-      usagePath: `parameters/${toolName}_usage.json`,
-      paraPath: `parameters/${toolName}_para.json`,
-      html: adminConfig.tool.defaultHtml,
-      selectionRoute: `/complete-selection-${toolName}`,
-      env: adminConfig.tool.defaultEnv,
-      hasStderr: adminConfig.tool.defaultHasStderr
-    };
+      changes = result.changes || null;
+      console.log(`Help worker finished (${result.cached ? 'cache hit' : changes ? 'incremental' : 'parsed'})`);
+    } catch (error) {
+      console.error('Help worker error:', error);
+      throw new Error(adminConfig.errors.process.paramExtraction);
+    }
 
     // Add new tool to config
-    toolsConfig[toolName] = newTool;
+    toolsConfig[toolName] = defaultToolEntry(toolName);
 
     // Save updated config
     await fs.writeFile(
@@ -333,12 +383,20 @@ router.post('/upload-help', upload.single('helpFile'), async (req, res) => {
     res.json({
       success: true,
       message: adminConfig.messages.tool.added,
-      comparisonUrl: `/help/${toolName}_comparison.html`
+      comparisonUrl: `/help/${toolName}_comparison.html`,
+      changes
     });
 
   } catch (error) {
     console.error('Error processing help file:', error);
     res.status(500).json({ error: error.message || 'Failed to process help file' });
+  } finally {
+    if (previousHelpPath) {
+      await fs.unlink(previousHelpPath).catch(() => {});
+    }
+    if (claimPath) {
+      await fs.unlink(claimPath).catch(() => {});
+    }
   }
 });
 
@@ -532,6 +590,83 @@ router.delete('/tools/:toolName', async (req, res) => {
   }
 });
 
+// POST /hooks/help-updated <- watch_help.py rebuilt a tool's artifacts
+// Reloads the tool's entry from config/tools.js in place (the server shares
+// this object) and registers tools whose help page was dropped into help/
+router.post('/hooks/help-updated', isWatchHook, async (req, res) => {
+  const { tool: toolName, stages = [], success, error } = req.body || {};
+  if (typeof toolName !== 'string' || !adminConfig.tool.namePattern.test(toolName)) {
+    return res.status(400).json({ error: adminConfig.errors.tool.invalidName });
+  }
+  const helpPath = path.join(adminConfig.paths.helpDir, `${toolName}_help.txt`);
+  if (!await fs.access(helpPath).then(() => true, () => false)) {
+    return res.status(404).json({ error: 'Help page not found' });
+  }
+  if (!success) {
+    console.error(`Help watch failed for ${toolName}:`, error);
+    return res.json({ reloaded: false });
+  }
+
+  try {
+    const configPath = require.resolve('../../config/tools');
+    delete require.cache[configPath];
+    const onDisk = require(configPath);
+    // Keep handing out the shared object to later require() calls
+    require.cache[configPath].exports = toolsConfig;
+
+    let registered = false;
+    if (Object.hasOwn(onDisk, toolName)) {
+      toolsConfig[toolName] = onDisk[toolName];
+    } else if (!Object.hasOwn(toolsConfig, toolName)) {
+      toolsConfig[toolName] = defaultToolEntry(toolName);
+      await fs.writeFile(
+        'config/tools.js',
+        `module.exports = ${JSON.stringify(toolsConfig, null, 2)};`
+      );
+      registered = true;
+    }
+
+    console.log(`Help watch rebuilt ${toolName} (${stages.join(' -> ')})${registered ? ', tool registered' : ''}`);
+    res.json({ reloaded: true, registered });
+  } catch (err) {
+    console.error('Error reloading tool config:', err);
+    res.status(500).json({ error: 'Failed to reload tool config' });
+  }
+});
+
+// GET /comparison-summary -> fidelity of every tool on one page (compare_corpus.py)
+// ?refresh=1 compares all tools again, ?reparse=1 also re-parses their help pages
+router.get('/comparison-summary', isAdmin, async (req, res) => {
+  const summaryFile = path.join(adminConfig.paths.corpusDir, 'comparison_summary.html');
+  const exists = await fs.access(summaryFile).then(() => true, () => false);
+
+  if (!exists || req.query.refresh === '1' || req.query.reparse === '1') {
+    const reparse = req.query.reparse === '1' ? ' --reparse' : '';
+    try {
+      await execAsync(`python "${adminConfig.scripts.compareCorpus}" --output-dir "${adminConfig.paths.corpusDir}" --link-template "/admin/comparison-summary/{tool}"${reparse}`);
+    } catch (error) {
+      // A failing tool is listed on the summary page; only a missing page is an error
+      console.error('compare_corpus.py reported failures:', error.stderr || error.message);
+    }
+  }
+
+  res.sendFile(summaryFile, (error) => {
+    if (error && !res.headersSent) {
+      res.status(500).send('Error generating comparison summary');
+    }
+  });
+});
+
+// GET /comparison-summary/:toolName -> a tool's report from the last corpus run
+router.get('/comparison-summary/:toolName', isAdmin, (req, res) => {
+  const comparisonPath = path.join(adminConfig.paths.corpusDir, `${path.basename(req.params.toolName)}_comparison.html`);
+  res.sendFile(comparisonPath, (error) => {
+    if (error && !res.headersSent) {
+      res.status(404).send('Comparison report not found');
+    }
+  });
+});
+
 // Get comparison results
 router.get('/comparison/:toolName', (req, res) => {
   const { toolName } = req.params;
@@ -770,16 +905,14 @@ router.post('/tools/:toolName/parameters', isAdmin, async (req, res) => {
     const helpFile = path.join(helpDir, `${toolName}_help.txt`);
     const tempOutputFile = path.join(__dirname, '..', '..', 'temp', `${toolName}_comparison.html`);
 
-    // Call Python script to generate help file
-    const scriptPath = path.join(__dirname, '..', 'scripts', 'json_to_help.py');
-    await execAsync(`python "${scriptPath}" "${paraPath}" "${path.join(__dirname, '..', '..', tool.usagePath)}" "${generatedHelpFile}"`);
-
-    // Generate comparison result
-    const compareScriptPath = path.join(__dirname, '..', 'scripts', 'compare_help_html.py');
-    await execAsync(`python "${compareScriptPath}" "${helpFile}" "${generatedHelpFile}" "${tempOutputFile}"`);
-
-    // Read comparison result
-    const comparisonResult = await fs.readFile(tempOutputFile, 'utf8');
+    // Generate help file and comparison result in the help worker
+    const { comparison: comparisonResult } = await helpWorker.render({
+      help_file: helpFile,
+      para_file: paraPath,
+      usage_file: path.join(__dirname, '..', '..', tool.usagePath),
+      generated_help_file: generatedHelpFile,
+      comparison_file: tempOutputFile
+    });
 
     // Delete temporary file
     await fs.unlink(tempOutputFile);
@@ -804,9 +937,9 @@ router.get('/tools/:toolName/comparison', isAdmin, async (req, res) => {
     const generatedHelpFile = path.join(__dirname, '..', '..', 'help', `${toolName}_generated_help.txt`);
     const tempOutputFile = path.join(__dirname, '..', '..', 'temp', `${toolName}_comparison.html`);
 
-    // Run the comparison script
-    const scriptPath = path.join(__dirname, '..', 'scripts', 'compare_help_html.py');
-    await execAsync(`python "${scriptPath}" "${helpFile}" "${generatedHelpFile}" "${tempOutputFile}"`);
+    // Run the comparison script; ?full=1 skips the structural fast path
+    const full = req.query.full === '1';
+    await execAsync(`python "${adminConfig.scripts.metadockHelp}" compare ${full ? '--full ' : ''}"${helpFile}" "${generatedHelpFile}" "${tempOutputFile}"`);
 
     // Read the comparison result
     const comparisonResult = await fs.readFile(tempOutputFile, 'utf8');
@@ -818,6 +951,7 @@ router.get('/tools/:toolName/comparison', isAdmin, async (req, res) => {
     res.render('comparison', {
       toolName: toolName,
       comparisonResult: comparisonResult,
+      full: full,
       timestamp: new Date().toLocaleString()
     });
   } catch (error) {
@@ -826,6 +960,143 @@ router.get('/tools/:toolName/comparison', isAdmin, async (req, res) => {
   }
 });
 
+// Stream the comparison report to the browser while it is being generated
+router.get('/tools/:toolName/comparison/stream', isAdmin, (req, res) => {
+  const toolName = req.params.toolName;
+  const helpFile = path.join(adminConfig.paths.helpDir, `${toolName}_help.txt`);
+  const generatedHelpFile = path.join(adminConfig.paths.helpDir, `${toolName}_generated_help.txt`);
+
+  // '-' makes compare_help_html.py write the report to stdout chunk by chunk
+  const args = [adminConfig.scripts.metadockHelp, 'compare', helpFile, generatedHelpFile, '-'];
+  if (req.query.full === '1') {
+    args.splice(2, 0, '--full');
+  }
+  const child = spawn('python', args);
+
+  res.type('html');
+  child.stdout.pipe(res);
+
+  child.stderr.on('data', (data) => {
+    console.error('compare_help_html.py stderr:', data.toString());
+  });
+
+  child.on('error', (error) => {
+    console.error('Error streaming comparison:', error);
+    if (!res.headersSent) {
+      res.status(500).send('Error generating comparison');
+    } else {
+      res.end();
+    }
+  });
+
+  // Stop generating if the admin navigates away
+  req.on('close', () => {
+    if (child.exitCode === null) {
+      child.kill();
+    }
+  });
+});
+
+// Parsed comparison row payloads, least recently used first
+const comparisonRowsCache = new Map();
+// Payloads being generated, so concurrent page requests share one run
+const comparisonRowsPending = new Map();
+
+async function fileMtime(file) {
+  return fs.stat(file).then(stat => stat.mtimeMs, () => null);
+}
+
+// Aligned rows of a tool's comparison (compare_help_html.py --format json),
+// regenerated when the help page or the generated help is newer
+async function loadComparisonRows(toolName, full) {
+  const helpFile = path.join(adminConfig.paths.helpDir, `${toolName}_help.txt`);
+  const generatedHelpFile = path.join(adminConfig.paths.helpDir, `${toolName}_generated_help.txt`);
+  const payloadFile = path.join(adminConfig.paths.comparisonRowsDir, `${toolName}${full ? '_full' : ''}.json`);
+
+  const [helpMtime, generatedMtime, payloadMtime] = await Promise.all(
+    [helpFile, generatedHelpFile, payloadFile].map(fileMtime));
+  if (helpMtime === null || generatedMtime === null) {
+    const error = new Error(`No help files for ${toolName}`);
+    error.code = 'ENOENT';
+    throw error;
+  }
+
+  if (payloadMtime === null || payloadMtime < Math.max(helpMtime, generatedMtime)) {
+    if (!comparisonRowsPending.has(payloadFile)) {
+      const run = (async () => {
+        await fs.mkdir(adminConfig.paths.comparisonRowsDir, { recursive: true });
+        await execAsync(`python "${adminConfig.scripts.metadockHelp}" compare --format json ${full ? '--full ' : ''}"${helpFile}" "${generatedHelpFile}" "${payloadFile}"`);
+      })();
+      comparisonRowsPending.set(payloadFile, run.finally(() => comparisonRowsPending.delete(payloadFile)));
+    }
+    await comparisonRowsPending.get(payloadFile);
+  }
+
+  const mtime = await fileMtime(payloadFile);
+  const cached = comparisonRowsCache.get(payloadFile);
+  comparisonRowsCache.delete(payloadFile);
+  if (cached && cached.mtime === mtime) {
+    comparisonRowsCache.set(payloadFile, cached);
+    return cached.payload;
+  }
+
+  const payload = JSON.parse(await fs.readFile(payloadFile, 'utf8'));
+  comparisonRowsCache.set(payloadFile, { mtime, payload });
+  if (comparisonRowsCache.size > adminConfig.comparisonRows.cacheEntries) {
+    comparisonRowsCache.delete(comparisonRowsCache.keys().next().value);
+  }
+  return payload;
+}
+
+// Virtualized comparison viewer: renders visible rows only, fetches the rest on demand
+router.get('/tools/:toolName/comparison/virtual', isAdmin, (req, res) => {
+  res.render('comparison-virtual', {
+    toolName: req.params.toolName,
+    full: req.query.full === '1',
+    pageSize: adminConfig.comparisonRows.pageSize
+  });
+});
+
+// GET /tools/:toolName/comparison/rows?offset=0&limit=200 -> one page of aligned rows
+// ([section_id, original, generated, ratio]) plus the report summary; ?full=1 skips the fast path
+router.get('/tools/:toolName/comparison/rows', isAdmin, async (req, res) => {
+  try {
+    const payload = await loadComparisonRows(req.params.toolName, req.query.full === '1');
+    const { pageSize, maxPageSize } = adminConfig.comparisonRows;
+    const offset = Math.max(0, parseInt(req.query.offset, 10) || 0);
+    const limit = Math.min(maxPageSize, Math.max(1, parseInt(req.query.limit, 10) || pageSize));
+
+    const { rows, ...summary } = payload;
+    res.json({ ...summary, offset, rows: rows.slice(offset, offset + limit) });
+  } catch (error) {
+    if (error.code === 'ENOENT') {
+      return res.status(404).json({ error: error.message });
+    }
+    console.error('Error loading comparison rows:', error);
+    res.status(500).json({ error: 'Error generating comparison' });
+  }
+});
+
+// GET /tools/:toolName/trace -> per-stage timings recorded by pipeline_trace.py
+router.get('/tools/:toolName/trace', isAdmin, async (req, res) => {
+  const traceDir = adminConfig.paths.traceDir;
+  if (!traceDir) {
+    return res.status(404).json({ error: 'Pipeline tracing is disabled' });
+  }
+
+  try {
+    const traceFile = path.join(traceDir, `${path.basename(req.params.toolName)}.json`);
+    const trace = JSON.parse(await fs.readFile(traceFile, 'utf8'));
+    res.json(trace);
+  } catch (error) {
+    if (error.code === 'ENOENT') {
+      return res.status(404).json({ error: 'No trace recorded for this tool' });
+    }
+    console.error('Error reading pipeline trace:', error);
+    res.status(500).json({ error: 'Error reading pipeline trace' });
+  }
+});
+
 // Edit tool
 router.get('/tools/:toolName/edit', isAdmin, async (req, res) => {
   try {
@@ -941,15 +1212,16 @@ async function regenerateHelpFiles(toolName) {
     const helpDir = path.join(__dirname, '..', '..', 'help');
     const generatedHelpFile = path.join(helpDir, `${toolName}_generated_help.txt`);
 
-    // Call Python script to generate help file
-    const scriptPath = path.join(__dirname, '..', 'scripts', 'json_to_help.py');
-    await promisify(exec)(`python "${scriptPath}" "${paraPath}" "${usagePath}" "${generatedHelpFile}"`);
-
-    // Generate comparison result
+    // Generate help file and comparison result in the help worker
     const helpFile = path.join(helpDir, `${toolName}_help.txt`);
     const outputFile = path.join(helpDir, `${toolName}_comparison.html`);
-    const compareScriptPath = path.join(__dirname, '..', 'scripts', 'compare_help_html.py');
-    await promisify(exec)(`python "${compareScriptPath}" "${helpFile}" "${generatedHelpFile}" "${outputFile}"`);
+    await helpWorker.render({
+      help_file: helpFile,
+      para_file: paraPath,
+      usage_file: usagePath,
+      generated_help_file: generatedHelpFile,
+      comparison_file: outputFile
+    });
   } catch (error) {
     console.error('Error regenerating help files:', error);
     throw error;
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import compare_help_html
+import help_lexer
+import help_model
+import json_to_help
+import param
+import synthetic_help
+
+DEFAULT_PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'help_pages_for_test')
+DEFAULT_SCALES = (10, 100, 1000)
+
+
+def run_stage(func, repeat, measure_memory):
+    """Time a stage (best of repeat, cold lexer cache each time), optionally its peak memory"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        help_lexer.tokenize.cache_clear()
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak_kb = None
+    if measure_memory:
+        help_lexer.tokenize.cache_clear()
+        tracemalloc.start()
+        func()
+        peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+
+    return result, {'seconds': best, 'peak_kb': peak_kb}
+
+
+def fidelity(original_text, generated_help):
+    """Share of original blocks whose aligned generated block is a match"""
+    original_blocks = compare_help_html.split_into_blocks(original_text)
+    generated_blocks = compare_help_html.split_into_blocks(generated_help)
+    return compare_help_html.match_fidelity(list(compare_help_html.align_blocks(original_blocks, generated_blocks)))
+
+
+def bench_page(name, help_file, repeat, measure_memory):
+    """Run parse -> render -> compare on one page"""
+    with open(help_file, 'r', encoding='utf-8') as f:
+        text = f.read()
+    line_count = text.count('\n') + 1
+    size = len(text.encode('utf-8'))
+
+    stages = {}
+    (usage_content, parameters), stages['parse'] = run_stage(
+        lambda: param.parse_help_text(text), repeat, measure_memory)
+    generated_help, stages['render'] = run_stage(
+        lambda: json_to_help.render_help_text(parameters, help_model.Usage(usage_content)), repeat, measure_memory)
+    _, stages['compare'] = run_stage(
+        lambda: compare_help_html.create_html_comparison(help_file, generated_help, []), repeat, measure_memory)
+
+    for stage in stages.values():
+        seconds = stage['seconds'] or 1e-9
+        stage['lines_per_sec'] = line_count / seconds
+        stage['kb_per_sec'] = size / 1024 / seconds
+
+    return {
+        'page': name,
+        'lines': line_count,
+        'bytes': size,
+        'parameters': len(parameters),
+        'fidelity': fidelity(text, generated_help),
+        'total_seconds': sum(stage['seconds'] for stage in stages.values()),
+        'stages': stages,
+    }
+
+
+def real_pages(pages_dir):
+    for filename in sorted(os.listdir(pages_dir)):
+        if filename.endswith('.txt'):
+            yield os.path.splitext(filename)[0], os.path.join(pages_dir, filename)
+
+
+def synthetic_pages(styles, scales, workdir):
+    for style in styles:
+        for scale in scales:
+            path = os.path.join(workdir, f"synthetic_{style}_x{scale}.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(synthetic_help.generate_help_page(style, scale))
+            yield f"synthetic_{style}_x{scale}", path
+
+
+def print_header():
+    print(f"{'page':<36} {'lines':>7} {'parse s':>9} {'render s':>9} {'compare s':>10} {'peak KB':>9} {'fidelity':>8}")
+
+
+def print_row(r):
+    stages = r['stages']
+    peaks = [s['peak_kb'] for s in stages.values() if s['peak_kb'] is not None]
+    peak = f"{max(peaks):9.0f}" if peaks else f"{'-':>9}"
+    print(f"{r['page']:<36} {r['lines']:>7} {stages['parse']['seconds']:9.4f} "
+          f"{stages['render']['seconds']:9.4f} {stages['compare']['seconds']:10.4f} {peak} {r['fidelity']:8.2f}",
+          flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the help processing pipeline')
+    parser.add_argument('--pages-dir', default=DEFAULT_PAGES_DIR, help='directory of real help pages')
+    parser.add_argument('--no-real', action='store_true', help='skip the real help pages')
+    parser.add_argument('--styles', nargs='*', default=list(synthetic_help.STYLES),
+                        choices=synthetic_help.STYLES, help='synthetic page styles')
+    parser.add_argument('--scales', nargs='*', type=int, default=list(DEFAULT_SCALES),
+                        help='synthetic page scales (multiples of a typical page)')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs per stage (best is kept)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak memory pass')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='metadock_bench_') as workdir:
+        pages = [] if args.no_real else list(real_pages(args.pages_dir))
+        pages += list(synthetic_pages(args.styles, args.scales, workdir))
+        print_header()
+        for name, path in pages:
+            try:
+                results.append(bench_page(name, path, args.repeat, not args.no_memory))
+            except Exception as e:
+                print(f"Error benchmarking {name}: {str(e)}", file=sys.stderr)
+                continue
+            print_row(results[-1])
+
+    if args.output:
+        report = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'parser_version': param.PARSER_VERSION,
+                'repeat': args.repeat,
+            },
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
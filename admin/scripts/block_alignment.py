@@ -0,0 +1,182 @@
+import bisect
+import difflib
+import heapq
+import math
+import re
+from collections import defaultdict
+
+import line_diff
+import pipeline_trace
+from compare_common import DEFAULT_SIMILARITY, MATCH_THRESHOLD, normalize_for_comparison
+
+# Option names on a block's first line: "-x", "--long-name", "-x/--long"
+OPTION_NAME_RE = re.compile(r'(?<![\w-])(--?[A-Za-z0-9][\w.-]*)')
+# BBTools style key=value flag at the start of a block
+FLAG_NAME_RE = re.compile(r'^\s*([\w.]+)=')
+# Words used for the inverted index
+TOKEN_RE = re.compile(r'[A-Za-z0-9_-]{2,}')
+
+# How many of a block's rarest tokens are looked up in the index
+INDEX_TOKENS_PER_BLOCK = 8
+# How many index candidates get the fine-grained similarity
+CANDIDATES_PER_BLOCK = 5
+# Tokens found in more blocks than this carry no identity and are not looked up
+MAX_POSTINGS = 64
+
+
+def block_names(block):
+    """Identity of a block: its option names, flag name or header line"""
+    first_line = block.split('\n', 1)[0].strip()
+
+    names = OPTION_NAME_RE.findall(first_line.split('  ', 1)[0])
+    if first_line.startswith('-') and names:
+        return {('option', name) for name in names}
+
+    flag = FLAG_NAME_RE.match(first_line)
+    if flag:
+        return {('flag', flag.group(1))}
+
+    if first_line.endswith(':') and '\n' not in block:
+        return {('header', first_line.lower())}
+
+    return set()
+
+
+def block_tokens(normalized):
+    return set(TOKEN_RE.findall(normalized.lower()))
+
+
+class CandidateIndex:
+    """Inverted token index over generated blocks"""
+
+    def __init__(self, token_sets):
+        self.postings = defaultdict(list)
+        for j, tokens in enumerate(token_sets):
+            for token in tokens:
+                self.postings[token].append(j)
+        self.size = len(token_sets)
+
+    def candidates(self, tokens):
+        """Generated blocks sharing the query's rarest tokens, best scored first"""
+        # Rare tokens identify a block; common words would make lookups quadratic
+        known = [t for t in tokens if 0 < len(self.postings.get(t, ())) <= MAX_POSTINGS]
+        known.sort(key=lambda t: len(self.postings[t]))
+
+        scores = defaultdict(float)
+        for token in known[:INDEX_TOKENS_PER_BLOCK]:
+            postings = self.postings[token]
+            weight = math.log(1 + self.size / len(postings))
+            for j in postings:
+                scores[j] += weight
+
+        ranked = heapq.nsmallest(CANDIDATES_PER_BLOCK, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [j for j, _ in ranked]
+
+
+def indexed_alignment(original_blocks, generated_blocks, similarity_mode=None):
+    """Pair blocks sharing option names first, then by indexed token candidates
+
+    Similarity is the same block score as the difflib engine (see
+    line_diff.BlockScorer), but it is only computed for a handful of candidates
+    per block, so alignment time grows roughly linearly with page size. Returns
+    rows of (section_id, original_block, generated_block, ratio) like difflib_alignment.
+    """
+    normalized_original = [normalize_for_comparison(block) for block in original_blocks]
+    normalized_generated = [normalize_for_comparison(block) for block in generated_blocks]
+
+    # The index already limits candidates to a handful per block, so only the
+    # 'token' mode changes the score here; 'compat' keeps the character ratio
+    similarity_mode = similarity_mode or DEFAULT_SIMILARITY
+    scorer = line_diff.BlockScorer(similarity_mode) if similarity_mode == 'token' else None
+    matchers = {}
+    ratio_calls = 0
+
+    def similarity(i, j):
+        nonlocal ratio_calls
+        ratio_calls += 1
+        if scorer is not None:
+            return scorer.ratio(normalized_original[i], normalized_generated[j])
+        # One matcher per generated block so difflib analyses it only once
+        matcher = matchers.get(j)
+        if matcher is None:
+            matcher = matchers[j] = difflib.SequenceMatcher(None, '', normalized_generated[j])
+        matcher.set_seq1(normalized_original[i])
+        return matcher.ratio()
+
+    # Candidates: blocks sharing an option/flag name or header, plus the best
+    # hits of the inverted token index
+    generated_by_name = defaultdict(list)
+    for j, block in enumerate(generated_blocks):
+        for name in block_names(block):
+            generated_by_name[name].append(j)
+
+    index = CandidateIndex([block_tokens(text) for text in normalized_generated])
+
+    scored = []
+    for i, block in enumerate(original_blocks):
+        names = block_names(block)
+        # A short name like "-a" can be reused by dozens of blocks on a large
+        # page; only the block's rarest names pick candidates
+        postings = sorted((generated_by_name[name] for name in names if name in generated_by_name), key=len)
+        named = set()
+        for posting in postings:
+            if named and len(posting) > CANDIDATES_PER_BLOCK:
+                break
+            named.update(posting)
+
+        confident = False
+        for j in named:
+            ratio = similarity(i, j)
+            if ratio > 0:
+                # Identical option names win over a merely similar description
+                same_names = names == block_names(generated_blocks[j])
+                scored.append((not same_names, -ratio, i, j))
+                confident = confident or (same_names and ratio > MATCH_THRESHOLD)
+
+        # Only fall back to the token index when the names did not settle it
+        if confident:
+            continue
+        for j in index.candidates(block_tokens(normalized_original[i])):
+            if j in named:
+                continue
+            ratio = similarity(i, j)
+            if ratio > 0:
+                scored.append((True, -ratio, i, j))
+
+    pipeline_trace.count('matcher_ratio_calls', ratio_calls)
+    pipeline_trace.count('candidate_pairs', len(scored))
+
+    # Greedy assignment, strongest pairs first, each block used at most once
+    pairs = {}
+    used = set()
+    for _, negative_ratio, i, j in sorted(scored):
+        if i in pairs or j in used:
+            continue
+        pairs[i] = (j, -negative_ratio)
+        used.add(j)
+
+    # Rows in original order
+    rows = []
+    row_of_generated = {}
+    for i, block in enumerate(original_blocks):
+        j, ratio = pairs.get(i, (None, 0))
+        rows.append((f"section_{i}", block, generated_blocks[j] if j is not None else None, ratio))
+        if j is not None:
+            row_of_generated[j] = len(rows) - 1
+
+    # Unmatched generated blocks follow the row of the closest preceding matched block
+    anchors = sorted(row_of_generated)
+    inserts = defaultdict(list)
+    for j in range(len(generated_blocks)):
+        if j in used:
+            continue
+        position = bisect.bisect_left(anchors, j)
+        anchor_row = row_of_generated[anchors[position - 1]] if position else -1
+        inserts[anchor_row].append((f"section_new_{j}", None, generated_blocks[j], 0))
+
+    ordered = list(inserts.get(-1, []))
+    for row_index, row in enumerate(rows):
+        ordered.append(row)
+        ordered.extend(inserts.get(row_index, []))
+
+    return ordered
@@ -0,0 +1,140 @@
+import os
+
+import help_lexer
+
+# Aligned blocks more similar than this are shown as a match
+MATCH_THRESHOLD = 0.8
+# Block similarity: 'compat' ranks candidates with the token diff of line_diff.py
+# and scores the chosen pair like before, 'token' uses the token diff only,
+# 'difflib' the character ratio for every candidate
+DEFAULT_SIMILARITY = os.environ.get('METADOCK_SIMILARITY', 'compat')
+
+def normalize_for_comparison(text):
+    """Normalize text for comparison, remove all format differences"""
+    if not text:
+        return ''
+    
+    normalized_lines = []
+    current_param = None
+    current_desc = []
+    in_usage = False
+    
+    for token in help_lexer.tokenize(text):
+        line = token.text
+        
+        # Process usage line
+        if line.startswith('usage:'):
+            in_usage = True
+            # Normalize usage line, remove extra spaces
+            parts = line.split()
+            if len(parts) >= 2:
+                prog_name = parts[1]
+                remaining_parts = []
+                skip_next = False
+                for i in range(2, len(parts)):
+                    if skip_next:
+                        skip_next = False
+                        continue
+                    if parts[i] == prog_name:
+                        skip_next = True
+                        continue
+                    remaining_parts.append(parts[i])
+                normalized_lines.append(f"usage: {prog_name} {' '.join(remaining_parts)}")
+            continue
+        
+        # Process usage continuation
+        if in_usage and line:
+            if not line.startswith('usage:'):
+                # Remove extra spaces, keep parameters
+                normalized_lines.append(' '.join(line.split()))
+            continue
+        
+        # Process empty lines
+        if not line:
+            if current_param:
+                # Normalize parameter and description
+                param_parts = current_param.split(',')
+                # Extract all options and sort (ignore order differences)
+                opts = []
+                for p in param_parts:
+                    p = p.strip()
+                    if p:
+                        opts.append(p)
+                # Sort by length (short options first, long options last)
+                opts.sort(key=lambda x: (len(x), x))
+                param_text = ', '.join(opts)
+                
+                # Normalize description text
+                desc_text = ' '.join(' '.join(current_desc).split())
+                
+                # Combine parameter and description
+                normalized_lines.append(f"{param_text} {desc_text}".strip())
+                current_param = None
+                current_desc = []
+            elif not in_usage:
+                in_usage = False
+            continue
+        
+        # Process parameter lines
+        if line.startswith('-'):
+            if current_param:
+                # Process previous parameter
+                param_parts = current_param.split(',')
+                opts = []
+                for p in param_parts:
+                    p = p.strip()
+                    if p:
+                        opts.append(p)
+                opts.sort(key=lambda x: (len(x), x))
+                param_text = ', '.join(opts)
+                desc_text = ' '.join(' '.join(current_desc).split())
+                normalized_lines.append(f"{param_text} {desc_text}".strip())
+            
+            # Separate parameter name and description
+            parts = line.split('  ', 1)
+            if len(parts) > 1:
+                current_param = parts[0].strip()
+                current_desc = [' '.join(parts[1].split())]
+            else:
+                current_param = line.strip()
+                current_desc = []
+            continue
+        
+        # Process description lines
+        if line.startswith(' ') and current_param:
+            current_desc.append(' '.join(line.split()))
+            continue
+        
+        # Process other lines (category titles etc.)
+        if not line.startswith('usage:'):
+            if current_param:
+                # Process previous parameter
+                param_parts = current_param.split(',')
+                opts = []
+                for p in param_parts:
+                    p = p.strip()
+                    if p:
+                        opts.append(p)
+                opts.sort(key=lambda x: (len(x), x))
+                param_text = ', '.join(opts)
+                desc_text = ' '.join(' '.join(current_desc).split())
+                normalized_lines.append(f"{param_text} {desc_text}".strip())
+                current_param = None
+                current_desc = []
+            normalized_lines.append(line)
+    
+    # Process last parameter
+    if current_param:
+        param_parts = current_param.split(',')
+        opts = []
+        for p in param_parts:
+            p = p.strip()
+            if p:
+                opts.append(p)
+        opts.sort(key=lambda x: (len(x), x))
+        param_text = ', '.join(opts)
+        desc_text = ' '.join(' '.join(current_desc).split())
+        normalized_lines.append(f"{param_text} {desc_text}".strip())
+    
+    # Return normalized text
+    return '\n'.join(normalized_lines)
@@ -0,0 +1,284 @@
+import argparse
+import html
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import compare_help_html
+import help_model
+import json_to_help
+import line_diff
+import param
+
+DEFAULT_HELP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'help')
+DEFAULT_PARAMETERS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'parameters')
+
+# Reports and the summary go to their own directory under the help directory, so a
+# corpus run never replaces the <tool>_comparison.html written by the help pipeline
+CORPUS_DIRNAME = 'corpus'
+SUMMARY_HTML = 'comparison_summary.html'
+SUMMARY_JSON = 'comparison_summary.json'
+# Where a tool's row links to; the admin route passes its own URL pattern
+DEFAULT_LINK_TEMPLATE = '{tool}_comparison.html'
+
+# Structural differences counted per tool, in column order
+DIFFERENCE_KEYS = ('missing_parameters', 'extra_parameters', 'missing_categories', 'missing_defaults', 'content_mismatch')
+
+
+def discover_tools(help_dir, parameters_dir):
+    """Tools that have both a help page and parameter JSON"""
+    tools = []
+    for filename in sorted(os.listdir(help_dir)):
+        if not filename.endswith('_help.txt') or filename.endswith('_generated_help.txt'):
+            continue
+        tool = filename[:-len('_help.txt')]
+        if os.path.exists(os.path.join(parameters_dir, f"{tool}_para.json")):
+            tools.append(tool)
+    return tools
+
+
+def load_generated_help(tool, help_file, parameters_dir, reparse):
+    """Generated help text from the stored parameter JSON, or from a fresh parse of the help page"""
+    if reparse:
+        usage_content, params = param.parse_help_file(help_file)
+        usage = help_model.Usage(usage_content)
+    else:
+        params = help_model.load_parameters(os.path.join(parameters_dir, f"{tool}_para.json"))
+        usage = help_model.load_usage(os.path.join(parameters_dir, f"{tool}_usage.json"))
+    return json_to_help.render_help_text(params, usage)
+
+
+def compare_tool(tool, help_dir, parameters_dir, output_dir, reparse=False, engine='auto', similarity=None):
+    """Full comparison of one tool: detailed report on disk, scores returned"""
+    start = time.perf_counter()
+    result = {'tool': tool, 'success': False, 'error': None}
+    try:
+        help_file = os.path.join(help_dir, f"{tool}_help.txt")
+        generated_help = load_generated_help(tool, help_file, parameters_dir, reparse)
+
+        # Content issues describe the stored JSON, which a re-parse does not use
+        issues = [] if reparse else compare_help_html.check_content_issues(
+            os.path.join(parameters_dir, f"{tool}_para.json"),
+            os.path.join(parameters_dir, f"{tool}_usage.json"))
+        identical, differences = json_to_help.compare_help_pages(help_file, generated_help)
+
+        # One alignment serves both the fidelity score and the detailed report
+        rows = list(compare_help_html.align_help_file(help_file, generated_help, engine, similarity))
+        report_file = os.path.join(output_dir, f"{tool}_comparison.html")
+        with open(report_file, 'w', encoding='utf-8') as f:
+            compare_help_html.write_chunks(
+                compare_help_html.iter_html_comparison(help_file, generated_help, issues, rows=rows), f)
+
+        result.update({
+            'success': True,
+            'fidelity': compare_help_html.match_fidelity(rows),
+            'original_blocks': sum(1 for row in rows if row[1]),
+            'structure_identical': identical,
+            'issues': len(issues),
+            'differences': {key: differences.get(key, []) for key in DIFFERENCE_KEYS},
+        })
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {str(e)}"
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def compare_corpus(help_dir=None, parameters_dir=None, output_dir=None, workers=None, reparse=False, engine='auto',
+                   similarity=None):
+    """Compare every tool, spread across a process pool; workers=1 runs in this process"""
+    help_dir = help_dir or DEFAULT_HELP_DIR
+    parameters_dir = parameters_dir or DEFAULT_PARAMETERS_DIR
+    output_dir = output_dir or os.path.join(help_dir, CORPUS_DIRNAME)
+    os.makedirs(output_dir, exist_ok=True)
+
+    tools = discover_tools(help_dir, parameters_dir)
+    args = (help_dir, parameters_dir, output_dir, reparse, engine, similarity)
+
+    results = []
+    if workers == 1 or len(tools) <= 1:
+        results = [compare_tool(tool, *args) for tool in tools]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(compare_tool, tool, *args): tool for tool in tools}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # The worker process itself died, record it against its tool
+                    results.append({'tool': futures[future], 'success': False, 'seconds': 0.0,
+                                    'error': f"{type(e).__name__}: {str(e)}"})
+
+    results.sort(key=lambda r: r['tool'])
+    return results
+
+
+def load_previous(output_dir):
+    """Fidelity per tool from the last summary, to show what a change did"""
+    try:
+        with open(os.path.join(output_dir, SUMMARY_JSON), 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return {r['tool']: r['fidelity'] for r in previous.get('results', []) if r.get('success')}
+
+
+def render_summary(results, previous, link_template, meta):
+    """Single HTML page: one row per tool, worst fidelity first"""
+    rows = []
+    ordered = sorted(results, key=lambda r: (r['success'], r.get('fidelity', 0), r['tool']))
+    for r in ordered:
+        tool = html.escape(r['tool'])
+        link = html.escape(link_template.format(tool=r['tool']))
+        if not r['success']:
+            rows.append(f'<tr class="failed"><td>{tool}</td>'
+                        f'<td colspan="{len(DIFFERENCE_KEYS) + 4}">Failed: {html.escape(r["error"] or "")}</td></tr>')
+            continue
+
+        fidelity = r['fidelity']
+        change = ''
+        if r['tool'] in previous:
+            delta = fidelity - previous[r['tool']]
+            if abs(delta) >= 0.0005:
+                change = f'<span class="{"up" if delta > 0 else "down"}">{delta:+.1%}</span>'
+
+        level = 'good' if fidelity >= 0.9 else 'fair' if fidelity >= 0.6 else 'poor'
+        counts = ''.join(
+            f'<td class="{"zero" if not r["differences"][key] else ""}" title="{html.escape(", ".join(r["differences"][key]))}">'
+            f'{len(r["differences"][key])}</td>'
+            for key in DIFFERENCE_KEYS)
+        rows.append(
+            f'<tr><td><a href="{link}">{tool}</a></td>'
+            f'<td class="{level}">{fidelity:.1%}</td><td>{change}</td>'
+            f'<td>{"yes" if r["structure_identical"] else "no"}</td>'
+            f'{counts}<td>{r["issues"]}</td></tr>')
+
+    headers = ''.join(f'<th>{key.replace("_", " ").capitalize()}</th>' for key in DIFFERENCE_KEYS)
+    succeeded = [r for r in results if r['success']]
+    mean = sum(r['fidelity'] for r in succeeded) / len(succeeded) if succeeded else 0.0
+
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>Help Comparison Summary</title>
+    <style>
+        body {{
+            font-family: 'Consolas', monospace;
+            margin: 0;
+            padding: 20px;
+            background: #f5f5f5;
+        }}
+        .container {{
+            max-width: 1400px;
+            margin: 0 auto;
+            background: white;
+            border-radius: 8px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+            padding: 20px;
+        }}
+        .header {{
+            background: #2c3e50;
+            color: white;
+            padding: 20px;
+            border-radius: 8px 8px 0 0;
+            margin: -20px -20px 20px -20px;
+        }}
+        .timestamp {{
+            color: #ced4da;
+            font-size: 0.9em;
+            margin-top: 5px;
+        }}
+        table {{
+            width: 100%;
+            border-collapse: collapse;
+        }}
+        th, td {{
+            padding: 8px 10px;
+            border-bottom: 1px solid #eee;
+            text-align: right;
+        }}
+        th:first-child, td:first-child {{
+            text-align: left;
+        }}
+        th {{
+            background: #f8f9fa;
+        }}
+        .good {{ color: #1b5e20; font-weight: bold; }}
+        .fair {{ color: #8a6d00; font-weight: bold; }}
+        .poor {{ color: #b71c1c; font-weight: bold; }}
+        .zero {{ color: #bbb; }}
+        .up {{ color: #1b5e20; }}
+        .down {{ color: #b71c1c; }}
+        .failed td {{ background: #ffebee; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>Help Comparison Summary</h1>
+            <div class="timestamp">Generated on: {meta['timestamp']} &middot; {len(results)} tools in {meta['seconds']:.2f}s
+                &middot; mean fidelity {mean:.1%}{' &middot; parameters re-parsed from help pages' if meta['reparse'] else ''}</div>
+        </div>
+        <table>
+            <tr><th>Tool</th><th>Fidelity</th><th>Change</th><th>Structure identical</th>{headers}<th>Content issues</th></tr>
+            {''.join(rows)}
+        </table>
+    </div>
+</body>
+</html>"""
+
+
+def write_summary(results, output_dir, link_template, seconds, reparse):
+    """Write the summary page and its JSON (the baseline for the next run's change column)"""
+    meta = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'seconds': seconds,
+        'reparse': reparse,
+        'parser_version': param.PARSER_VERSION,
+    }
+    previous = load_previous(output_dir)
+    with open(os.path.join(output_dir, SUMMARY_HTML), 'w', encoding='utf-8') as f:
+        f.write(render_summary(results, previous, link_template, meta))
+    with open(os.path.join(output_dir, SUMMARY_JSON), 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare every tool\'s help page with its generated help')
+    parser.add_argument('--help-dir', default=DEFAULT_HELP_DIR, help='directory of <tool>_help.txt pages')
+    parser.add_argument('--parameters-dir', default=DEFAULT_PARAMETERS_DIR, help='directory of <tool>_para.json files')
+    parser.add_argument('--output-dir', help='where reports and the summary go (default: corpus/ in the help directory)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count, 1 runs in-process)')
+    parser.add_argument('--reparse', action='store_true',
+                        help='parse the help pages again instead of using the stored parameter JSON')
+    parser.add_argument('--engine', default='auto', choices=('auto', 'difflib', 'indexed'), help='block alignment engine')
+    parser.add_argument('--similarity', choices=line_diff.MODES,
+                        help='block score (default: METADOCK_SIMILARITY or compat)')
+    parser.add_argument('--link-template', default=DEFAULT_LINK_TEMPLATE,
+                        help='link to a tool\'s detailed report, {tool} is replaced by the tool name')
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or os.path.join(args.help_dir, CORPUS_DIRNAME)
+    start = time.perf_counter()
+    results = compare_corpus(args.help_dir, args.parameters_dir, output_dir, args.workers, args.reparse, args.engine,
+                             args.similarity)
+    elapsed = time.perf_counter() - start
+    write_summary(results, output_dir, args.link_template, elapsed, args.reparse)
+
+    failures = [r for r in results if not r['success']]
+    for r in results:
+        status = f"{r['fidelity']:6.1%}" if r['success'] else 'FAILED'
+        print(f"{status:>7}  {r['seconds']:7.3f}s  {r['tool']}")
+    for r in failures:
+        print(f"Error: {r['tool']}: {r['error']}", file=sys.stderr)
+    print(f"Compared {len(results)} tools in {elapsed:.3f}s: summary written to "
+          f"{os.path.join(output_dir, SUMMARY_HTML)}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,29 @@
 import json
 import os
-from pathlib import Path
 import textwrap
 import difflib
 from datetime import datetime
 import sys
 
+import block_alignment
+import help_lexer
+import help_model
+import json_to_help
+import line_diff
+import pipeline_trace
+from compare_common import DEFAULT_SIMILARITY, MATCH_THRESHOLD, normalize_for_comparison
+
+# Above this many blocks (original + generated) 'auto' alignment uses the indexed engine
+INDEXED_ENGINE_MIN_BLOCKS = 500
+
 def check_content_issues(para_file, usage_file):
     """Check content issues in JSON files"""
     issues = []
     
     # Check usage.json
     try:
-        with open(usage_file, 'r', encoding='utf-8') as f:
-            usage = json.load(f)
-            if not usage or not usage.get('usage') or (
-                isinstance(usage.get('usage'), list) and 
-                (len(usage['usage']) == 0 or 
-                 (len(usage['usage']) == 1 and not usage['usage'][0].strip()))
-            ):
-                issues.append(f"Warning: {usage_file} - Usage content is empty")
+        if help_model.load_usage(usage_file).is_empty():
+            issues.append(f"Warning: {usage_file} - Usage content is empty")
     except FileNotFoundError:
         issues.append(f"Warning: {usage_file} - File not found")
     except json.JSONDecodeError:
@@ -27,24 +31,15 @@ def check_content_issues(para_file, usage_file):
     
     # Check para.json
     try:
-        with open(para_file, 'r', encoding='utf-8') as f:
-            params = json.load(f)
-            if not params:
-                issues.append(f"Warning: {para_file} - Parameter file is empty")
-            else:
-                # Check null attributes for each parameter
-                for i, param in enumerate(params, 1):
-                    param_name = param.get('short') or param.get('long') or f"Parameter #{i}"
-                    
-                    # Only warn when both short and long are null
-                    if param['short'] is None and param['long'] is None:
-                        issues.append(f"Warning: {para_file} - {param_name} has both short and long names as null")
-                    
-                    # Check other required attributes
-                    if param['category'] is None:
-                        issues.append(f"Warning: {para_file} - {param_name} has null category")
-                    if param['description'] is None:
-                        issues.append(f"Warning: {para_file} - {param_name} has null description")
+        params = help_model.load_parameters(para_file)
+        if not params:
+            issues.append(f"Warning: {para_file} - Parameter file is empty")
+        else:
+            # Check null attributes for each parameter
+            for i, param in enumerate(params, 1):
+                param_name = param.short or param.long or f"Parameter #{i}"
+                for problem in param.problems():
+                    issues.append(f"Warning: {para_file} - {param_name} {problem}")
     except FileNotFoundError:
         issues.append(f"Warning: {para_file} - File not found")
     except json.JSONDecodeError:
@@ -57,15 +52,14 @@ def normalize_text(text):
     if not text:
         return ''
     
-    # Split text into lines and remove leading/trailing whitespace
-    lines = [line.rstrip() for line in text.split('\n')]
     normalized_lines = []
     
     # Track current processing state
     in_usage = False
     current_param = None
     
-    for line in lines:
+    for token in help_lexer.tokenize(text):
+        line = token.rstripped
         # Process usage line
         if line.startswith('usage:'):
             in_usage = True
@@ -88,18 +82,18 @@ def normalize_text(text):
             continue
         
         # Process usage continuation
-        if in_usage and line.strip():
-            if not line.strip().startswith('usage:'):
+        if in_usage and token.text:
+            if not token.text.startswith('usage:'):
                 # Remove extra spaces but maintain basic indentation
-                normalized_lines.append(' ' * 13 + ' '.join(line.strip().split()))
+                normalized_lines.append(' ' * 13 + ' '.join(token.text.split()))
             continue
-        elif in_usage and not line.strip():
+        elif in_usage and not token.text:
             in_usage = False
             normalized_lines.append('')
             continue
         
         # Process parameter lines
-        if line.strip().startswith('-'):
+        if token.text.startswith('-'):
             # Add empty line if there was a previous parameter
             if current_param is not None:
                 normalized_lines.append('')
@@ -136,7 +130,7 @@ def normalize_text(text):
             continue
         
         # Process empty lines or new paragraphs
-        if not line.strip():
+        if not token.text:
             if current_param is not None:
                 normalized_lines.extend(current_param)
                 normalized_lines.append('')
@@ -152,7 +146,7 @@ def normalize_text(text):
             current_param = None
         
         # Normalize regular lines
-        normalized_lines.append(line.strip())
+        normalized_lines.append(token.text)
     
     # Process last parameter (if any)
     if current_param is not None:
@@ -166,146 +160,14 @@ def normalize_text(text):
     
     return '\n'.join(normalized_lines)
 
-def normalize_for_comparison(text):
-    """Normalize text for comparison, remove all format differences"""
-    if not text:
-        return ''
-    
-    # Split text into lines
-    lines = text.split('\n')
-    normalized_lines = []
-    current_param = None
-    current_desc = []
-    in_usage = False
-    
-    for line in lines:
-        line = line.strip()
-        
-        # Process usage line
-        if line.startswith('usage:'):
-            in_usage = True
-            # Normalize usage line, remove extra spaces
-            parts = line.split()
-            if len(parts) >= 2:
-                prog_name = parts[1]
-                remaining_parts = []
-                skip_next = False
-                for i in range(2, len(parts)):
-                    if skip_next:
-                        skip_next = False
-                        continue
-                    if parts[i] == prog_name:
-                        skip_next = True
-                        continue
-                    remaining_parts.append(parts[i])
-                normalized_lines.append(f"usage: {prog_name} {' '.join(remaining_parts)}")
-            continue
-        
-        # Process usage continuation
-        if in_usage and line:
-            if not line.startswith('usage:'):
-                # Remove extra spaces, keep parameters
-                normalized_lines.append(' '.join(line.split()))
-            continue
-        
-        # Process empty lines
-        if not line:
-            if current_param:
-                # Normalize parameter and description
-                param_parts = current_param.split(',')
-                # Extract all options and sort (ignore order differences)
-                opts = []
-                for p in param_parts:
-                    p = p.strip()
-                    if p:
-                        opts.append(p)
-                # Sort by length (short options first, long options last)
-                opts.sort(key=lambda x: (len(x), x))
-                param_text = ', '.join(opts)
-                
-                # Normalize description text
-                desc_text = ' '.join(' '.join(current_desc).split())
-                
-                # Combine parameter and description
-                normalized_lines.append(f"{param_text} {desc_text}".strip())
-                current_param = None
-                current_desc = []
-            elif not in_usage:
-                in_usage = False
-            continue
-        
-        # Process parameter lines
-        if line.startswith('-'):
-            if current_param:
-                # Process previous parameter
-                param_parts = current_param.split(',')
-                opts = []
-                for p in param_parts:
-                    p = p.strip()
-                    if p:
-                        opts.append(p)
-                opts.sort(key=lambda x: (len(x), x))
-                param_text = ', '.join(opts)
-                desc_text = ' '.join(' '.join(current_desc).split())
-                normalized_lines.append(f"{param_text} {desc_text}".strip())
-            
-            # Separate parameter name and description
-            parts = line.split('  ', 1)
-            if len(parts) > 1:
-                current_param = parts[0].strip()
-                current_desc = [' '.join(parts[1].split())]
-            else:
-                current_param = line.strip()
-                current_desc = []
-            continue
-        
-        # Process description lines
-        if line.startswith(' ') and current_param:
-            current_desc.append(' '.join(line.split()))
-            continue
-        
-        # Process other lines (category titles etc.)
-        if not line.startswith('usage:'):
-            if current_param:
-                # Process previous parameter
-                param_parts = current_param.split(',')
-                opts = []
-                for p in param_parts:
-                    p = p.strip()
-                    if p:
-                        opts.append(p)
-                opts.sort(key=lambda x: (len(x), x))
-                param_text = ', '.join(opts)
-                desc_text = ' '.join(' '.join(current_desc).split())
-                normalized_lines.append(f"{param_text} {desc_text}".strip())
-                current_param = None
-                current_desc = []
-            normalized_lines.append(line)
-    
-    # Process last parameter
-    if current_param:
-        param_parts = current_param.split(',')
-        opts = []
-        for p in param_parts:
-            p = p.strip()
-            if p:
-                opts.append(p)
-        opts.sort(key=lambda x: (len(x), x))
-        param_text = ', '.join(opts)
-        desc_text = ' '.join(' '.join(current_desc).split())
-        normalized_lines.append(f"{param_text} {desc_text}".strip())
-    
-    # Return normalized text
-    return '\n'.join(normalized_lines)
-
 def split_into_blocks(text):
     """Split text into meaningful blocks, split by paragraphs and categories"""
     blocks = []
     current_block = []
     in_usage = False
     
-    for line in text.split('\n'):
-        line_stripped = line.rstrip()
+    for token in help_lexer.tokenize(text):
+        line_stripped = token.rstripped
         
         # Check if it's usage part
         if line_stripped.startswith('usage:'):
@@ -388,10 +250,10 @@ def generate_help_text(para_file, usage_file):
     # Read usage
     try:
         with open(usage_file, 'r', encoding='utf-8') as f:
-            usage = json.load(f)
-            if usage.get('usage'):
+            usage = help_model.Usage.from_dict(json.load(f))
+            if usage.lines:
                 # Process usage text, maintain original format
-                usage_text = usage['usage'][0]
+                usage_text = usage.lines[0]
                 if not usage_text.startswith('usage:'):
                     usage_text = 'usage: ' + usage_text
                 
@@ -437,16 +299,16 @@ def generate_help_text(para_file, usage_file):
     # Read parameters
     try:
         with open(para_file, 'r', encoding='utf-8') as f:
-            params = json.load(f)
+            params = help_model.parameters_from_json(json.load(f))
             
             # Filter out invalid parameters (short and long are null cases)
-            params = [p for p in params if not (p['short'] is None and p['long'] is None)]
+            params = [p for p in params if not (p.short is None and p.long is None)]
             
             # Group parameters by category, while maintaining category order
             params_by_category = {}
             category_order = []  # Used to record original category order
             for param in params:
-                category = param['category'] or 'uncategorized'
+                category = param.category or 'uncategorized'
                 if category not in params_by_category:
                     params_by_category[category] = []
                     category_order.append(category)  # Record order of new categories
@@ -463,19 +325,20 @@ def generate_help_text(para_file, usage_file):
                 for param in category_params:
                     # Build parameter line
                     param_parts = []
-                    if param['short'] is not None:
-                        param_parts.append(param['short'])
-                    if param['long'] is not None:
-                        param_parts.append(param['long'])
+                    if param.short is not None:
+                        param_parts.append(param.short)
+                    if param.long is not None:
+                        param_parts.append(param.long)
                     
                     param_line = '  ' + ', '.join(param_parts)
-                    if param.get('metavar'):
-                        param_line += f" {param['metavar']}"
+                    metavar = param.extra.get('metavar') if param.extra else None
+                    if metavar:
+                        param_line += f" {metavar}"
                     help_text.append(param_line)
                     
                     # Add description (with appropriate indentation)
-                    if param['description']:
-                        desc = param['description'].replace('\n', ' ').strip()
+                    if param.description:
+                        desc = param.description.replace('\n', ' ').strip()
                         # Use textwrap to process description text
                         wrapped_desc = textwrap.wrap(
                             desc,
@@ -512,25 +375,136 @@ def split_help_into_parts(help_text):
     
     return parts
 
-def create_html_comparison(original_file, generated_help, issues):
-    """Create HTML format comparison report"""
-    try:
-        with open(original_file, 'r', encoding='utf-8') as f:
-            original_text = f.read()
-    except FileNotFoundError:
-        return "Original file not found"
-    
-    # Split into blocks
-    original_blocks = split_into_blocks(original_text)
-    generated_blocks = split_into_blocks(generated_help)
+def difflib_alignment(original_blocks, generated_blocks, similarity=None):
+    """Pair blocks with difflib opcodes, best normalized ratio inside each opcode range
+
+    Yields rows of (section_id, original_block, generated_block, ratio) in report order.
+    """
+    similarity = similarity or DEFAULT_SIMILARITY
+    # The character ratio keeps its own matchers below; the other modes score with line_diff
+    scorer = None if similarity == 'difflib' else line_diff.BlockScorer(similarity)
+    generated_blocks = list(generated_blocks)
     
     # Generate unique ID for each block
     block_ids = {}
     for i, block in enumerate(original_blocks):
         block_ids[block] = f"section_{i}"
     
-    # HTML header
-    html = f"""<!DOCTYPE html>
+    # Use difflib to find best matching block
+    matcher = difflib.SequenceMatcher(None, original_blocks, generated_blocks)
+    
+    # Normalize every block once. Each generated block keeps its own matcher,
+    # so difflib analyses it a single time and only the original side changes.
+    normalized_original = [normalize_for_comparison(block) for block in original_blocks]
+    normalized_generated = [normalize_for_comparison(block) for block in generated_blocks]
+    generated_matchers = [difflib.SequenceMatcher(None, '', block)
+                          for block in normalized_generated] if scorer is None else None
+    # Matcher work, reported to the pipeline trace once alignment is done
+    ratio_calls = 0
+    pruned = 0
+    
+    # Process each matching block
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        # For each block separately create comparison area
+        for i in range(i1, i2):
+            original_block = original_blocks[i] if i < len(original_blocks) else ''
+            normalized_block = normalized_original[i] if i < len(original_blocks) else ''
+            
+            # Find best matching generated block
+            best_match = None
+            best_match_ratio = 0
+            best_match_index = -1
+            if scorer is not None:
+                candidates = [(j, normalized_generated[j]) for j in range(j1, min(j2, len(generated_blocks)))
+                              if generated_blocks[j] is not None]
+                ratio_calls += len(candidates)
+                j, ratio = scorer.best_match(normalized_block, candidates)
+                if j is not None:
+                    best_match_ratio = ratio
+                    best_match = generated_blocks[j]
+                    best_match_index = j
+            else:
+                for j in range(j1, j2):
+                    if j < len(generated_blocks):
+                        block_matcher = generated_matchers[j]
+                        block_matcher.set_seq1(normalized_block)
+                        # Cheap upper bounds first: skip candidates that cannot beat the current best
+                        if block_matcher.real_quick_ratio() <= best_match_ratio:
+                            pruned += 1
+                            continue
+                        if block_matcher.quick_ratio() <= best_match_ratio:
+                            pruned += 1
+                            continue
+                        ratio_calls += 1
+                        ratio = block_matcher.ratio()
+                        if ratio > best_match_ratio:
+                            best_match_ratio = ratio
+                            best_match = generated_blocks[j]
+                            best_match_index = j
+            
+            section_id = block_ids.get(original_block, f"section_{i}")
+            yield section_id, original_block, best_match, best_match_ratio
+            
+            # Mark matched block (it now compares as empty text)
+            if best_match and best_match_index >= 0:
+                generated_blocks[best_match_index] = None
+                if scorer is None:
+                    generated_matchers[best_match_index] = difflib.SequenceMatcher(None, '', '')
+        
+        # Process unmatched blocks in generated text
+        for j in range(j1, j2):
+            if j >= len(generated_blocks) or generated_blocks[j] is None:
+                continue
+            yield f"section_new_{j}", None, generated_blocks[j], 0
+    
+    pipeline_trace.count('matcher_ratio_calls', ratio_calls)
+    pipeline_trace.count('matcher_pruned', pruned)
+
+def align_blocks(original_blocks, generated_blocks, engine='auto', similarity=None):
+    """Align original and generated blocks with the requested engine
+
+    'difflib' is the opcode based matcher, 'indexed' the option-name/token index
+    engine from block_alignment.py; 'auto' switches to the indexed engine on
+    pages too large for nested difflib passes. similarity picks the block score
+    (DEFAULT_SIMILARITY when not given).
+    """
+    if engine == 'auto':
+        large = len(original_blocks) + len(generated_blocks) > INDEXED_ENGINE_MIN_BLOCKS
+        engine = 'indexed' if large else 'difflib'
+    similarity = similarity or DEFAULT_SIMILARITY
+    pipeline_trace.note('engine', engine)
+    pipeline_trace.note('similarity', similarity)
+    
+    if engine == 'indexed':
+        return block_alignment.indexed_alignment(original_blocks, generated_blocks, similarity)
+    if engine == 'difflib':
+        return difflib_alignment(original_blocks, generated_blocks, similarity)
+    raise ValueError(f"Unknown alignment engine: {engine}")
+
+def align_help_file(original_file, generated_help, engine='auto', similarity=None):
+    """Block alignment rows for a help file and its generated text"""
+    with open(original_file, 'r', encoding='utf-8') as f:
+        original_text = f.read()
+    
+    # Split into blocks
+    original_blocks = split_into_blocks(original_text)
+    generated_blocks = split_into_blocks(generated_help)
+    pipeline_trace.count('lines', original_text.count('\n'))
+    pipeline_trace.count('original_blocks', len(original_blocks))
+    pipeline_trace.count('generated_blocks', len(generated_blocks))
+    
+    return align_blocks(original_blocks, generated_blocks, engine, similarity)
+
+def match_fidelity(rows):
+    """Share of original blocks whose aligned generated block is a match"""
+    ratios = [ratio for _, original_block, _, ratio in rows if original_block]
+    if not ratios:
+        return 1.0
+    return sum(1 for ratio in ratios if ratio > MATCH_THRESHOLD) / len(ratios)
+
+def report_header():
+    """Opening of a comparison report, up to and including its title bar"""
+    return f"""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="utf-8">
@@ -645,6 +619,13 @@ def create_html_comparison(original_file, generated_help, issues):
         .btn-delete {{
             background: #dc3545;
         }}
+        .verdict {{
+            background: #e8f5e9;
+            color: #1b5e20;
+            padding: 15px;
+            border-radius: 4px;
+            border-left: 5px solid #a5d6a7;
+        }}
     </style>
 </head>
 <body>
@@ -655,104 +636,142 @@ def create_html_comparison(original_file, generated_help, issues):
         </div>
 """
 
+def issues_html(issues):
+    """Content issues box, empty when there are none"""
+    if not issues:
+        return ''
+    html = '<div class="issues">\n'
+    html += '<h2>Content Issues</h2>\n'
+    html += '<ul>\n'
+    for issue in issues:
+        html += f'<li>{issue}</li>\n'
+    html += '</ul>\n'
+    html += '</div>\n'
+    return html
+
+def iter_html_comparison(original_file, generated_help, issues, engine='auto', rows=None, similarity=None):
+    """Yield the HTML comparison report piece by piece: header, issues, then one chunk per row
+
+    rows, when given, are alignment rows already computed by align_help_file.
+    """
+    if rows is None:
+        try:
+            rows = align_help_file(original_file, generated_help, engine, similarity)
+        except FileNotFoundError:
+            yield "Original file not found"
+            return
+    
+    yield report_header()
+
     # Add problem report (if any)
     if issues:
-        html += '<div class="issues">\n'
-        html += '<h2>Content Issues</h2>\n'
-        html += '<ul>\n'
-        for issue in issues:
-            html += f'<li>{issue}</li>\n'
-        html += '</ul>\n'
-        html += '</div>\n'
+        yield issues_html(issues)
 
-    # Use difflib to find best matching block
-    matcher = difflib.SequenceMatcher(None, original_blocks, generated_blocks)
-    
-    # Process each matching block
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-        # For each block separately create comparison area
-        for i in range(i1, i2):
-            original_block = original_blocks[i] if i < len(original_blocks) else ''
-            
-            # Find best matching generated block
-            best_match = None
-            best_match_ratio = 0
-            best_match_index = -1
-            for j in range(j1, j2):
-                if j < len(generated_blocks):
-                    ratio = difflib.SequenceMatcher(None, 
-                        normalize_for_comparison(original_block),
-                        normalize_for_comparison(generated_blocks[j])).ratio()
-                    if ratio > best_match_ratio:
-                        best_match_ratio = ratio
-                        best_match = generated_blocks[j]
-                        best_match_index = j
-            
-            # Create comparison block
-            section_id = block_ids.get(original_block, f"section_{i}")
-            html += f'<div class="comparison" data-section-id="{section_id}">\n'
-            
-            # Original text
-            html += '<div class="original">\n'
-            html += '<div class="diff-header">Original</div>\n'
-            if original_block:
-                html += f'<div class="{"match" if best_match_ratio > 0.8 else "nomatch"}">{original_block}</div>\n'
-            else:
-                html += '<div class="empty">(Empty)</div>\n'
-            html += '</div>\n'
-            
-            # Generated text
-            html += '<div class="generated">\n'
-            html += '<div class="diff-header">Generated</div>\n'
-            if best_match:
-                html += f'<div class="{"match" if best_match_ratio > 0.8 else "nomatch"}">{best_match}</div>\n'
-                # Mark matched block
-                if best_match_index >= 0:
-                    generated_blocks[best_match_index] = None
-            else:
-                html += '<div class="empty">(Empty)</div>\n'
-            html += '</div>\n'
-            
-            html += '</div>\n'
+    # Process each aligned pair of blocks
+    for section_id, original_block, generated_block, ratio in rows:
+        match_class = "match" if ratio > MATCH_THRESHOLD else "nomatch"
         
-        # Process unmatched blocks in generated text
-        for j in range(j1, j2):
-            if j >= len(generated_blocks) or generated_blocks[j] is None:
-                continue
-            
-            generated_block = generated_blocks[j]
-            section_id = f"section_new_{j}"
-            
-            # Create new comparison block
-            html += f'<div class="comparison" data-section-id="{section_id}">\n'
-            
-            # Original text (empty)
-            html += '<div class="original">\n'
-            html += '<div class="diff-header">Original</div>\n'
+        # Create comparison block
+        html = f'<div class="comparison" data-section-id="{section_id}">\n'
+        
+        # Original text
+        html += '<div class="original">\n'
+        html += '<div class="diff-header">Original</div>\n'
+        if original_block:
+            html += f'<div class="{match_class}">{original_block}</div>\n'
+        else:
             html += '<div class="empty">(Empty)</div>\n'
-            html += '</div>\n'
-            
-            # Generated text
-            html += '<div class="generated">\n'
-            html += '<div class="diff-header">Generated</div>\n'
-            html += f'<div class="nomatch">{generated_block}</div>\n'
-            html += '</div>\n'
-            
-            html += '</div>\n'
+        html += '</div>\n'
+        
+        # Generated text
+        html += '<div class="generated">\n'
+        html += '<div class="diff-header">Generated</div>\n'
+        if generated_block:
+            html += f'<div class="{match_class}">{generated_block}</div>\n'
+        else:
+            html += '<div class="empty">(Empty)</div>\n'
+        html += '</div>\n'
+        
+        html += '</div>\n'
+        yield html
     
     # HTML footer
-    html += """    </div>
+    yield """    </div>
 </body>
 </html>"""
-    
-    return html
 
-def process_help_file(help_file, generated_help_file, output_file):
-    """Process single help file"""
+def iter_identical_report(original_file, issues):
+    """Yield the lightweight report written when the structural check finds nothing to diff"""
+    yield report_header()
+
+    if issues:
+        yield issues_html(issues)
+
+    yield f"""<div class="verdict" data-verdict="identical">
+<h2>Structure identical</h2>
+<p>Every parameter, category, default value and required usage option of {os.path.basename(original_file)}
+is present in the generated help, so the block-by-block comparison was skipped.</p>
+<p>Request the full comparison to see it anyway.</p>
+</div>
+    </div>
+</body>
+</html>"""
+
+def iter_json_comparison(original_file, issues, rows, identical=False):
+    """Yield the compact JSON payload of the virtualized viewer, one chunk per row
+
+    Rows are [section_id, original_block, generated_block, ratio] with plain text
+    blocks (the viewer escapes them); an identical verdict comes without rows.
+    """
+    header = {
+        'tool': pipeline_trace.tool_name(original_file),
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'verdict': 'identical' if identical else 'compared',
+        'issues': issues,
+        'match_threshold': MATCH_THRESHOLD,
+        'fidelity': match_fidelity(rows),
+        'total': len(rows),
+    }
+    yield json.dumps(header, ensure_ascii=False, separators=(',', ':'))[:-1] + ',"rows":['
+    for index, (section_id, original_block, generated_block, ratio) in enumerate(rows):
+        row = json.dumps([section_id, original_block, generated_block, round(ratio, 4)],
+                         ensure_ascii=False, separators=(',', ':'))
+        yield f",\n{row}" if index else f"\n{row}"
+    yield '\n]}\n'
+
+def create_html_comparison(original_file, generated_help, issues, engine='auto'):
+    """Create HTML format comparison report"""
+    return ''.join(iter_html_comparison(original_file, generated_help, issues, engine))
+
+def write_html_comparison(original_file, generated_help, issues, out, engine='auto', flush=False):
+    """Stream the HTML comparison report into a writable text stream
+
+    With flush=True every chunk is flushed as soon as it is written, so a reader
+    on the other end of a pipe sees rows while the rest is still being aligned.
+    """
+    write_chunks(iter_html_comparison(original_file, generated_help, issues, engine), out, flush)
+
+def write_chunks(chunks, out, flush=False):
+    for chunk in chunks:
+        out.write(chunk)
+        if flush:
+            out.flush()
+
+def process_help_file(help_file, generated_help_file, output_file, para_file=None, usage_file=None, engine='auto', full=False,
+                      output_format='html', similarity=None):
+    """Process single help file
+
+    The cheap structural check runs first; the block alignment report is only
+    produced when it finds differences, or always with full=True.
+    output_format='json' writes the aligned rows for the virtualized viewer
+    instead of the HTML report.
+    """
     try:
-        # Check content issues
-        para_file = help_file.replace('_help.txt', '_para.json').replace('help', 'parameters')
-        usage_file = help_file.replace('_help.txt', '_usage.json').replace('help', 'parameters')
+        # Check content issues (derive JSON paths from the help path unless given)
+        if para_file is None:
+            para_file = help_file.replace('_help.txt', '_para.json').replace('help', 'parameters')
+        if usage_file is None:
+            usage_file = help_file.replace('_help.txt', '_usage.json').replace('help', 'parameters')
         
         issues = check_content_issues(para_file, usage_file)
         
@@ -760,12 +779,26 @@ def process_help_file(help_file, generated_help_file, output_file):
         with open(generated_help_file, 'r', encoding='utf-8') as f:
             generated_help = f.read()
         
-        # Generate HTML report
-        html_report = create_html_comparison(help_file, generated_help, issues)
-        
-        # Save report
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html_report)
+        # Stream HTML report to the output file, or stdout for '-'
+        with pipeline_trace.stage('compare', pipeline_trace.tool_name(help_file)):
+            identical = False
+            if not full:
+                identical, differences = json_to_help.compare_help_pages(help_file, generated_help)
+                pipeline_trace.note('verdict', 'identical' if identical else 'different')
+            
+            if output_format == 'json':
+                rows = [] if identical else align_help_file(help_file, generated_help, engine, similarity)
+                chunks = iter_json_comparison(help_file, issues, list(rows), identical)
+            elif identical:
+                chunks = iter_identical_report(help_file, issues)
+            else:
+                chunks = iter_html_comparison(help_file, generated_help, issues, engine, similarity=similarity)
+            
+            if output_file == '-':
+                write_chunks(chunks, sys.stdout, flush=True)
+            else:
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    write_chunks(chunks, f)
         
         return True
         
@@ -774,18 +807,47 @@ def process_help_file(help_file, generated_help_file, output_file):
         return False
 
 def main():
-    if len(sys.argv) != 4:
-        print("Usage: python compare_help_html.py <original_help_file> <generated_help_file> <output_html_file>")
+    args = sys.argv[1:]
+
+    # Optional alignment engine (--engine auto|difflib|indexed), block score
+    # (--similarity compat|token|difflib), --full to always run the block
+    # comparison, even when the structure is identical, and --format json for
+    # the rows of the virtualized viewer
+    engine = 'auto'
+    similarity = None
+    full = False
+    output_format = 'html'
+    while args and args[0] in ('--engine', '--similarity', '--full', '--format'):
+        if args[0] == '--full':
+            full = True
+            args = args[1:]
+        elif len(args) >= 2 and args[0] == '--format':
+            output_format = args[1]
+            args = args[2:]
+        elif len(args) >= 2 and args[0] == '--similarity':
+            similarity = args[1]
+            args = args[2:]
+        elif len(args) >= 2:
+            engine = args[1]
+            args = args[2:]
+        else:
+            break
+
+    if (len(args) != 3 or engine not in ('auto', 'difflib', 'indexed') or output_format not in ('html', 'json')
+            or similarity not in (None,) + line_diff.MODES):
+        print("Usage: python compare_help_html.py [--engine auto|difflib|indexed] [--similarity compat|token|difflib] [--full] [--format html|json] <original_help_file> <generated_help_file> <output_file|->")
         sys.exit(1)
 
-    original_help_file = sys.argv[1]
-    generated_help_file = sys.argv[2]
-    output_html_file = sys.argv[3]
+    original_help_file = args[0]
+    generated_help_file = args[1]
+    output_html_file = args[2]
 
-    # Ensure output directory exists
-    os.makedirs(os.path.dirname(output_html_file), exist_ok=True)
+    # Ensure output directory exists ('-' streams the report to stdout)
+    if output_html_file != '-' and os.path.dirname(output_html_file):
+        os.makedirs(os.path.dirname(output_html_file), exist_ok=True)
 
-    if not process_help_file(original_help_file, generated_help_file, output_html_file):
+    if not process_help_file(original_help_file, generated_help_file, output_html_file, engine=engine, full=full,
+                             output_format=output_format, similarity=similarity):
         sys.exit(1)
 
 if __name__ == '__main__':
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import param
+
+# Cache location and size bound, both overridable from the environment
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'cache', 'help_artifacts')
+CACHE_DIR = os.environ.get('METADOCK_HELP_CACHE_DIR', DEFAULT_CACHE_DIR)
+MAX_CACHE_BYTES = int(os.environ.get('METADOCK_HELP_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Artifact names inside a cache entry, keyed by the job field holding the target path.
+# Only what follows from the help text alone is cached: the comparison report names
+# the tool and its files and depends on the similarity setting, so it is rebuilt.
+ARTIFACTS = {
+    'para_file': 'para.json',
+    'usage_file': 'usage.json',
+    'generated_help_file': 'generated_help.txt',
+}
+
+
+def help_digest(help_file):
+    """Digest of the help text plus the parser version"""
+    digest = hashlib.sha256()
+    digest.update(f"parser:{param.PARSER_VERSION}\0".encode('utf-8'))
+    with open(help_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def entry_dir(digest, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, digest[:2], digest)
+
+
+def lookup(digest, targets, cache_dir=None):
+    """Copy cached artifacts to their target paths, return True on a hit
+
+    Artifacts are copied rather than hard linked because the admin routes
+    rewrite _para.json and _usage.json in place when a tool is edited.
+    """
+    entry = entry_dir(digest, cache_dir)
+    sources = {key: os.path.join(entry, name) for key, name in ARTIFACTS.items()}
+    if not all(os.path.isfile(path) for path in sources.values()):
+        return False
+
+    for key, source in sources.items():
+        target = targets[key]
+        directory = os.path.dirname(target)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        shutil.copyfile(source, target)
+
+    # Mark entry as recently used for eviction
+    now = time.time()
+    os.utime(entry, (now, now))
+    return True
+
+
+def store(digest, sources, cache_dir=None, max_bytes=None):
+    """Add freshly generated artifacts to the cache, then enforce the size bound"""
+    cache_dir = cache_dir or CACHE_DIR
+    entry = entry_dir(digest, cache_dir)
+    if os.path.isdir(entry):
+        return
+
+    parent = os.path.dirname(entry)
+    os.makedirs(parent, exist_ok=True)
+
+    # Build the entry next to its final location and rename it into place,
+    # so concurrent readers never see a partially written entry
+    staging = tempfile.mkdtemp(prefix=f".{digest}.", dir=parent)
+    try:
+        for key, name in ARTIFACTS.items():
+            shutil.copyfile(sources[key], os.path.join(staging, name))
+        os.rename(staging, entry)
+    except OSError:
+        # Another process stored the same entry first
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.path.isdir(entry):
+            raise
+
+    evict(cache_dir, MAX_CACHE_BYTES if max_bytes is None else max_bytes)
+
+
+def entry_size(entry):
+    total = 0
+    for name in os.listdir(entry):
+        total += os.path.getsize(os.path.join(entry, name))
+    return total
+
+
+def evict(cache_dir=None, max_bytes=MAX_CACHE_BYTES):
+    """Remove least recently used entries until the cache fits in max_bytes"""
+    cache_dir = cache_dir or CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = []
+    for prefix in os.listdir(cache_dir):
+        prefix_dir = os.path.join(cache_dir, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            if name.startswith('.'):
+                continue
+            entry = os.path.join(prefix_dir, name)
+            try:
+                entries.append((os.path.getmtime(entry), entry_size(entry), entry))
+            except OSError:
+                continue
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        removed += 1
+        try:
+            os.rmdir(os.path.dirname(entry))  # Drop the prefix directory once empty
+        except OSError:
+            pass
+
+    return removed
+
+
+def clear(cache_dir=None):
+    """Drop every cached entry"""
+    shutil.rmtree(cache_dir or CACHE_DIR, ignore_errors=True)
+
+
+def main():
+    if len(sys.argv) == 2 and sys.argv[1] == 'clear':
+        clear()
+        return
+    if len(sys.argv) == 2 and sys.argv[1] == 'evict':
+        print(f"Removed {evict()} cache entries")
+        return
+
+    print("Usage: python help_cache.py <clear|evict>")
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import re
+from functools import lru_cache
+
+# Token kinds
+BLANK = 'blank'
+USAGE = 'usage'
+OPTION = 'option'
+FLAG = 'flag'
+CATEGORY = 'category'
+DEFAULT = 'default'
+CONTINUATION = 'continuation'
+TEXT = 'text'
+
+# BBTools style "key=value  description"
+FLAG_RE = re.compile(r'(\S+)=([^ ]*)\s*(.*)')
+# "(default: ...)" annotation
+DEFAULT_RE = re.compile(r'\(default:.*?\)')
+
+# How many distinct texts (help pages, generated pages, blocks) keep their tokens
+CACHE_SIZE = 4096
+
+
+class Token:
+    """One lexed help line
+
+    raw        line without its newline
+    text       line.strip()
+    rstripped  line.rstrip()
+    indent     number of leading whitespace characters
+    default    "(default: ...)" annotation on the line, or None
+    flag       FLAG_RE match on text for key=value lines, or None
+    """
+    __slots__ = ('kind', 'raw', 'text', 'rstripped', 'indent', 'default', 'flag')
+
+    def __init__(self, raw):
+        text = raw.strip()
+        self.raw = raw
+        self.text = text
+        self.rstripped = raw.rstrip()
+        self.indent = len(raw) - len(raw.lstrip())
+        self.default = None
+        self.flag = None
+
+        if '(default:' in text:
+            match = DEFAULT_RE.search(text)
+            if match:
+                self.default = match.group(0)
+        if '=' in text:
+            self.flag = FLAG_RE.match(text)
+
+        self.kind = classify(self)
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.raw!r})"
+
+
+def classify(token):
+    """Typed view of a line; the stages keep their own finer rules on top of it"""
+    text = token.text
+    if not text:
+        return BLANK
+    if text.startswith('-'):
+        return OPTION
+    if text[:5].lower() == 'usage':
+        return USAGE
+    if token.flag is not None and token.indent == 0:
+        return FLAG
+    if text.endswith(':') and '  ' not in text:
+        return CATEGORY
+    if token.default is not None:
+        return DEFAULT
+    if token.indent:
+        return CONTINUATION
+    return TEXT
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def tokenize(text):
+    """Lex text.split('\\n') into a tuple of tokens, cached per text"""
+    return tuple(Token(line) for line in text.split('\n'))
+
+
+def tokenize_file_lines(text):
+    """Tokens for the lines a file iterator would yield
+
+    text.split('\\n') ends with an empty line when the text ends with a newline;
+    a file iterator does not produce that line, so it is dropped here.
+    """
+    if not text:
+        return ()
+    tokens = tokenize(text)
+    if text.endswith('\n'):
+        return tokens[:-1]
+    return tokens
+
+
+def read_help_file(path):
+    """Read a help page as text (universal newlines, like readlines())"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
@@ -0,0 +1,119 @@
+import json
+import sys
+
+# Keys of a _para.json entry, in the order they are written
+PARAMETER_FIELDS = ('category', 'short', 'long', 'needs_input', 'description')
+FIELD_SET = frozenset(PARAMETER_FIELDS)
+
+
+def intern_text(value):
+    """Category names repeat on every entry of a section; keep one copy of each"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Parameter:
+    """One _para.json entry
+
+    Keys beyond PARAMETER_FIELDS (e.g. a 'metavar' added by hand) are kept in
+    extra and written back after the standard ones; extra stays None for the
+    usual entry so it costs no dict.
+    """
+
+    __slots__ = PARAMETER_FIELDS + ('extra',)
+
+    def __init__(self, category=None, short=None, long=None, needs_input=False, description=None, extra=None):
+        self.category = intern_text(category)
+        self.short = short
+        self.long = long
+        self.needs_input = needs_input
+        self.description = description
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = None
+        if not data.keys() <= FIELD_SET:
+            extra = {key: value for key, value in data.items() if key not in FIELD_SET}
+        return cls(data.get('category'), data.get('short'), data.get('long'),
+                   data.get('needs_input', False), data.get('description'), extra)
+
+    def to_dict(self):
+        data = {
+            'category': self.category,
+            'short': self.short,
+            'long': self.long,
+            'needs_input': self.needs_input,
+            'description': self.description
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    @property
+    def name(self):
+        """Option name, e.g. '--input_type' from '--input_type {fastq,...}'"""
+        for value in (self.long, self.short):
+            if value:
+                return value.split()[0]
+        return None
+
+    def problems(self):
+        """Missing attributes, as reported by the content check"""
+        problems = []
+        # Only a problem when both short and long are missing
+        if self.short is None and self.long is None:
+            problems.append('has both short and long names as null')
+        if self.category is None:
+            problems.append('has null category')
+        if self.description is None:
+            problems.append('has null description')
+        return problems
+
+    def __eq__(self, other):
+        if not isinstance(other, Parameter):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Parameter({self.category!r}, {self.short!r}, {self.long!r})"
+
+
+class Usage:
+    """Usage lines of a _usage.json file"""
+
+    __slots__ = ('lines',)
+
+    def __init__(self, lines=None):
+        self.lines = list(lines) if lines else []
+
+    @classmethod
+    def from_dict(cls, data):
+        lines = (data or {}).get('usage') or []
+        return cls(lines if isinstance(lines, list) else [lines])
+
+    def to_dict(self):
+        return {'usage': self.lines}
+
+    def is_empty(self):
+        return not self.lines or (len(self.lines) == 1 and not self.lines[0].strip())
+
+
+def parameters_from_json(entries):
+    return [Parameter.from_dict(entry) for entry in entries]
+
+
+def parameters_to_json(parameters):
+    return [parameter.to_dict() for parameter in parameters]
+
+
+def load_parameters(para_file):
+    """Parameters of a _para.json file (FileNotFoundError / JSONDecodeError propagate)"""
+    with open(para_file, 'r', encoding='utf-8') as f:
+        return parameters_from_json(json.load(f))
+
+
+def load_usage(usage_file):
+    with open(usage_file, 'r', encoding='utf-8') as f:
+        return Usage.from_dict(json.load(f))
@@ -0,0 +1,420 @@
+import re
+import sys
+
+import help_lexer
+from help_model import Parameter
+
+# Option names separated by whitespace or '/', e.g. "-o/--output" or "-o --output"
+OPTION_SPLIT_RE = re.compile(r'[\s/]+(?=-)')
+# Separator between an option name and the description that follows it
+OPTION_DESC_SPLIT_RE = re.compile(r'  | : ')
+
+class UsageCollector:
+    """Capture the first Usage section, joined into a single line"""
+
+    def __init__(self):
+        self.usage_content = []
+        self.temp_usage = ""  # Temporary string to concatenate the entire Usage section
+        self.capturing_usage = False
+        self.done = False
+
+    def feed(self, token, next_token):
+        if self.done:
+            return
+        line = token.text
+
+        # Start capturing Usage section
+        if line.startswith("Usage:") or line.startswith("usage:") or line.startswith("USAGE"):
+            self.capturing_usage = True
+            self.temp_usage = line  # Initialize temp_usage with Usage line
+
+        # If capturing Usage section, continue saving subsequent content
+        elif self.capturing_usage:
+            if line == "":
+                # Stop capturing once an empty line is encountered
+                self.usage_content.append(self.temp_usage)  # Add concatenated Usage section to content
+                self.done = True
+                return
+            self.temp_usage += " " + line  # Append subsequent content to temp_usage (space-separated)
+
+    def result(self):
+        return self.usage_content
+
+
+def process_json(data):
+    # Iterate through each entry, process short and long options, update needs_input
+    for entry in data:
+        short_value = entry.short
+        long_value = entry.long
+        description = entry.description
+
+        if long_value:
+            # Check number of spaces, if multiple spaces exist
+            if long_value.count(' ') > 1:
+                # Find first part separated by consecutive spaces
+                parts = OPTION_DESC_SPLIT_RE.split(long_value, maxsplit=1)
+                if len(parts) > 1:
+                    long_value = parts[0].strip()
+                    # Move remaining content to description
+                    entry.description = parts[1].strip() + (' ' + description if description else '')
+
+            # Update long value
+            entry.long = long_value
+
+        if short_value:
+            # Check number of spaces, if multiple spaces exist
+            if short_value.count(' ') > 1:
+                # Find first part separated by consecutive spaces
+                parts = OPTION_DESC_SPLIT_RE.split(short_value, maxsplit=1)
+                if len(parts) > 1:
+                    short_value = parts[0].strip()
+                    # Move remaining content to description
+                    entry.description = parts[1].strip() + (' ' + description if description else '')
+
+            # Update short value
+            entry.short = short_value
+
+        # Missing short or long names count as empty
+        short = entry.short or ""
+        long = entry.long or ""
+
+        # Check if short or long contains spaces
+        entry.needs_input = (' ' in short) or (' ' in long)
+
+    return data
+
+
+class OptionCollector:
+    """Collect argparse/getopt style options ('-x, --long  description') grouped by category"""
+
+    def __init__(self):
+        self.parsed_data = []
+        self.current_category = None
+        self.current_param = None
+        self.description_lines = []
+
+    def flush(self):
+        if self.current_param:
+            self.current_param.description = '\n'.join(self.description_lines)
+            self.parsed_data.append(self.current_param)
+
+    def feed(self, token, next_token):
+        line = token.text
+
+        # Ensure it's a category: ends with ':' and next line starts with '-'
+        if line.endswith(':') and next_token is not None and next_token.kind == help_lexer.OPTION:
+            self.flush()
+            self.current_category = line[:-1]  # Record current category
+            self.current_param = None
+            self.description_lines = []
+
+        elif token.kind == help_lexer.OPTION:
+            self.flush()
+
+            # Parse parameter
+            current_param = Parameter(self.current_category)
+
+            # First try comma separation
+            parts = line.split(', ')
+            if len(parts) == 1:
+                # If no comma, try space or slash separation (must be followed by -)
+                parts = OPTION_SPLIT_RE.split(line)
+            
+            previous_part = None  # Record last valid option type
+            
+            for part in parts:
+                option = part.strip()
+                
+                if option.startswith('--'):
+                    current_param.long = option
+                    previous_part = 'long'
+                elif option.startswith('-'):
+                    current_param.short = option
+                    previous_part = 'short'
+                else:
+                    if option.startswith(' '):
+                        break
+                    # Append to previous option
+                    if previous_part == 'long' and current_param.long:
+                        current_param.long += ", " + option
+                    elif previous_part == 'short' and current_param.short:
+                        current_param.short += ", " + option
+
+            # Check if input is needed
+            current_param.needs_input = len(parts) > 1
+            self.current_param = current_param
+            self.description_lines = []
+
+        else:
+            self.description_lines.append(line)
+
+    def result(self):
+        # Process last parameter
+        self.flush()
+        self.current_param = None
+        return process_json(self.parsed_data)
+
+
+class FlagCollector:
+    """Collect BBTools style key=value flags listed under headers ending with ':' or 'Flags'"""
+
+    def __init__(self):
+        self.extracting = False
+        self.current_category = None
+        self.parameters = []
+        self.open_flags = []  # Flags still collecting indented continuation lines
+
+    def feed(self, token, next_token):
+        # Indented lines continue the description of the flags above them
+        if self.open_flags:
+            if token.raw.startswith(" "):
+                continuation = " " + token.text
+                for flag in self.open_flags:
+                    flag.description += continuation
+            else:
+                self.open_flags = []
+
+        line = token.text
+
+        # Identify lines ending with ':' or starting with "Flags"
+        if (line.endswith(":") and "  " not in line) or line == "Flags":
+            self.current_category = line.strip(':')
+            self.extracting = True
+            return
+
+        if self.extracting:
+            # Match parameters in key=value format
+            match = token.flag
+            if match:
+                flag = Parameter(
+                    self.current_category,
+                    short=match.group(1) + '=',
+                    long=match.group(2) if match.group(2) else "null",
+                    needs_input=True,
+                    description=match.group(3).strip()
+                )
+                self.parameters.append(flag)
+                self.open_flags.append(flag)
+
+    def result(self):
+        for flag in self.parameters:
+            if not flag.description:
+                flag.description = "No description available"
+        return self.parameters
+
+
+class JavaOptionCollector:
+    """Collect JVM options listed flush left ('-Xmx  description'), as in BBTools' Java Parameters"""
+
+    def __init__(self):
+        self.current_category = None
+        self.parameters = []
+        self.current = None
+
+    def feed(self, token, next_token):
+        # Section headers may be followed by a blank line before the options
+        if token.kind == help_lexer.CATEGORY:
+            self.current_category = token.text[:-1]
+            self.current = None
+
+        elif token.kind == help_lexer.OPTION and token.indent == 0:
+            parts = OPTION_DESC_SPLIT_RE.split(token.text, maxsplit=1)
+            self.current = Parameter(
+                self.current_category,
+                short=parts[0].strip(),
+                description=parts[1].strip() if len(parts) > 1 else ''
+            )
+            self.parameters.append(self.current)
+
+        elif self.current is not None and token.indent and token.text:
+            # Indented lines (even ones starting with '-Xmx20g ...') continue the description
+            self.current.description += ' ' + token.text
+
+        else:
+            # A blank or flush-left line ends the option
+            self.current = None
+
+    def result(self):
+        for option in self.parameters:
+            if not option.description:
+                option.description = "No description available"
+        return self.parameters
+
+
+# Only the head and tail of long pages are sampled; option sections at the end
+# (e.g. BBTools' Java Parameters) are still seen
+SAMPLE_HEAD = 300
+SAMPLE_TAIL = 100
+# Formats scoring below this are not run (unless no format reaches it)
+MIN_CONFIDENCE = 0.3
+
+# JVM options passed through by wrapper scripts
+JAVA_OPTION_RE = re.compile(r'-(?:Xm[sx]|Xss|XX:|D\w|ea\b|da\b|eoom\b)')
+ARGPARSE_HEADERS = {'positional arguments:', 'optional arguments:', 'options:'}
+
+
+class PageSample:
+    """Line statistics over a sample of a lexed page, shared by all detectors"""
+
+    def __init__(self, tokens):
+        if len(tokens) > SAMPLE_HEAD + SAMPLE_TAIL:
+            tokens = tokens[:SAMPLE_HEAD] + tokens[-SAMPLE_TAIL:]
+
+        self.usage = ''
+        self.headers = set()
+        self.options = []       # '-x/--long' option lines
+        self.flags = 0          # flush-left key=value lines
+        self.java_options = 0   # flush-left JVM options
+        for token in tokens:
+            kind = token.kind
+            if kind == help_lexer.OPTION:
+                if token.indent == 0 and JAVA_OPTION_RE.match(token.text):
+                    self.java_options += 1
+                else:
+                    self.options.append(token.text)
+            elif kind == help_lexer.FLAG:
+                self.flags += 1
+            elif kind == help_lexer.CATEGORY:
+                self.headers.add(token.text.lower())
+            elif kind == help_lexer.USAGE and not self.usage:
+                self.usage = token.text
+
+        self.total = len(self.options) + self.flags + self.java_options
+
+    def option_weight(self):
+        """Share of '-x/--long' lines among parameter lines, damped for pages with only a few"""
+        if not self.options:
+            return 0.0
+        return len(self.options) / self.total * min(1.0, len(self.options) / 3)
+
+    def flag_weight(self):
+        if not self.flags:
+            return 0.0
+        return self.flags / self.total * min(1.0, self.flags / 3)
+
+
+class HelpFormat:
+    """A registered help page style
+
+    name        format name reported with its confidence
+    family      formats of one family parse the same kind of lines; at most one of them runs
+    collector   class with feed(token, next_token) / result() producing _para.json entries
+    detect      function(PageSample) -> confidence in [0, 1]
+    """
+
+    def __init__(self, name, family, collector, detect):
+        self.name = name
+        self.family = family
+        self.collector = collector
+        self.detect = detect
+
+    def __repr__(self):
+        return f"HelpFormat({self.name})"
+
+
+FORMATS = []
+
+
+def register(name, family, collector):
+    """Decorator adding a detector function to the format registry"""
+    def decorator(detect):
+        FORMATS.append(HelpFormat(name, family, collector, detect))
+        return detect
+    return decorator
+
+
+@register('argparse', 'options', OptionCollector)
+def detect_argparse(sample):
+    # "usage: prog [-h] ..." and "positional arguments:" / "options:" groups
+    score = 0.4
+    if sample.usage.startswith('usage:'):
+        score += 0.3
+    if sample.headers & ARGPARSE_HEADERS:
+        score += 0.3
+    return sample.option_weight() * score
+
+
+@register('click', 'options', OptionCollector)
+def detect_click(sample):
+    # "Usage: prog [OPTIONS] ..." and a single "Options:" group
+    score = 0.4
+    if sample.usage.startswith('Usage:') and '[OPTIONS]' in sample.usage:
+        score += 0.4
+    if 'options:' in sample.headers:
+        score += 0.2
+    return sample.option_weight() * score
+
+
+@register('getopt', 'options', OptionCollector)
+def detect_getopt(sample):
+    # Plain "-x, --long  description" lines; the fallback for option pages
+    return sample.option_weight() * 0.6
+
+
+@register('spades', 'options', OptionCollector)
+def detect_spades(sample):
+    # "--pe-1 <#> <filename>" style angle-bracket metavars
+    angled = sum(1 for line in sample.options if '<' in line)
+    score = 0.3 + 0.5 * angled / len(sample.options) if sample.options else 0.0
+    if 'spades' in sample.usage.lower():
+        score += 0.2
+    return sample.option_weight() * score
+
+
+@register('bbtools', 'flags', FlagCollector)
+def detect_bbtools(sample):
+    # "key=value   description" lines, "Usage: tool.sh in=<file> ..."
+    score = 0.7
+    if '=' in sample.usage:
+        score += 0.3
+    return sample.flag_weight() * score
+
+
+@register('java', 'java', JavaOptionCollector)
+def detect_java(sample):
+    # "-Xmx  description" lines, usually under a "Java Parameters:" header
+    if not sample.java_options:
+        return 0.0
+    score = 0.4 + 0.15 * sample.java_options
+    if any('java' in header for header in sample.headers):
+        score += 0.3
+    return min(1.0, score)
+
+
+def detect_formats(tokens):
+    """All registered formats as (format, confidence), most likely first"""
+    sample = PageSample(tokens)
+    ranked = [(fmt, round(fmt.detect(sample), 3)) for fmt in FORMATS]
+    ranked.sort(key=lambda item: -item[1])
+    return ranked
+
+
+def select_formats(tokens):
+    """Formats to run: the most likely one of each family above MIN_CONFIDENCE, in registry order
+
+    Falls back to the single most likely format when none is confident.
+    """
+    ranked = detect_formats(tokens)
+    best = {}
+    for fmt, confidence in ranked:
+        if confidence >= MIN_CONFIDENCE and fmt.family not in best:
+            best[fmt.family] = (fmt, confidence)
+    if not best:
+        return ranked[:1]
+    return sorted(best.values(), key=lambda item: FORMATS.index(item[0]))
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python help_parsers.py <help_file>")
+        sys.exit(1)
+
+    tokens = help_lexer.tokenize_file_lines(help_lexer.read_help_file(sys.argv[1]))
+    selected = [fmt for fmt, _ in select_formats(tokens)]
+    for fmt, confidence in detect_formats(tokens):
+        marker = '*' if fmt in selected else ' '
+        print(f"{marker} {fmt.name:<10} {fmt.family:<8} {confidence:.3f}")
+
+
+if __name__ == '__main__':
+    main()
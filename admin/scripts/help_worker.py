@@ -0,0 +1,239 @@
+import json
+import os
+import sqlite3
+import sys
+
+# The worker is started from anywhere, make sibling scripts importable
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import param
+import json_to_help
+import compare_help_html
+import help_cache
+import incremental_parse
+import param_catalog
+
+# Keep the protocol channel for responses only; anything the pipeline
+# prints goes to stderr so it cannot corrupt the JSON-RPC stream
+RPC_OUT = sys.stdout
+sys.stdout = sys.stderr
+
+
+def ensure_parent_dirs(*paths):
+    """Create parent directories of output files"""
+    for path in paths:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+
+def read_artifacts(para_file, usage_file, generated_help_file, comparison_file):
+    """Load generated artifacts so they can be returned in one response"""
+    with open(para_file, 'r', encoding='utf-8') as f:
+        para = json.load(f)
+    with open(usage_file, 'r', encoding='utf-8') as f:
+        usage = json.load(f)
+    with open(generated_help_file, 'r', encoding='utf-8') as f:
+        generated_help = f.read()
+    with open(comparison_file, 'r', encoding='utf-8') as f:
+        comparison = f.read()
+
+    return {
+        'para': para,
+        'usage': usage.get('usage', []),
+        'generated_help': generated_help,
+        'comparison': comparison
+    }
+
+
+def render(para_file, usage_file, generated_help_file):
+    """Run the json_to_help stage"""
+    if not json_to_help.json_to_help(para_file, usage_file, generated_help_file):
+        raise RuntimeError('Failed to convert help file to JSON')
+
+
+def compare(help_file, para_file, usage_file, generated_help_file, comparison_file, full=False):
+    """Run the compare_help_html stage"""
+    if not compare_help_html.process_help_file(help_file, generated_help_file, comparison_file,
+                                               para_file=para_file, usage_file=usage_file, full=full):
+        raise RuntimeError('Failed to generate comparison report')
+
+
+def render_and_compare(help_file, para_file, usage_file, generated_help_file, comparison_file, full=False):
+    """Run json_to_help and compare_help_html stages"""
+    render(para_file, usage_file, generated_help_file)
+    compare(help_file, para_file, usage_file, generated_help_file, comparison_file, full)
+
+
+def refresh_catalog(para_file, usage_file):
+    """Reload this tool's entry in the compiled parameter catalog"""
+    tool = os.path.basename(para_file)
+    if tool.endswith('_para.json'):
+        tool = tool[:-len('_para.json')]
+    try:
+        conn = param_catalog.connect()
+        try:
+            param_catalog.update_tool(conn, tool, para_file, usage_file)
+        finally:
+            conn.close()
+    except Exception as e:
+        # The JSON files stay authoritative; a stale catalog entry is rebuilt later
+        print(f"Warning: could not update parameter catalog for {tool}: {str(e)}", file=sys.stderr)
+
+
+def handle_process(params):
+    """Run the full help pipeline for one tool"""
+    help_file = params['help_file']
+    para_file = params['para_file']
+    usage_file = params['usage_file']
+    generated_help_file = params['generated_help_file']
+    comparison_file = params['comparison_file']
+
+    ensure_parent_dirs(para_file, usage_file, generated_help_file, comparison_file)
+
+    # A new version of a page already parsed (and maybe edited) is merged into
+    # the stored parameters instead of replacing them
+    previous_help_file = params.get('previous_help_file')
+    incremental = bool(previous_help_file) and os.path.exists(previous_help_file) and os.path.exists(para_file)
+
+    # Byte-identical help text (same parser version) reuses the parsed parameters
+    # and generated help; the comparison report is always built for this tool
+    use_cache = params.get('use_cache', True) and not incremental
+    digest = help_cache.help_digest(help_file) if use_cache else None
+    cached = use_cache and help_cache.lookup(digest, params)
+
+    changes = None
+    if not cached:
+        if incremental:
+            changes = incremental_parse.incremental_update(
+                previous_help_file, help_file, para_file, usage_file, params.get('changes_file'))
+        else:
+            param.process_help_file(help_file, para_file, usage_file)
+        render(para_file, usage_file, generated_help_file)
+        if use_cache:
+            help_cache.store(digest, params)
+    compare(help_file, para_file, usage_file, generated_help_file, comparison_file, params.get('full', False))
+
+    if params.get('update_catalog', True):
+        refresh_catalog(para_file, usage_file)
+
+    artifacts = read_artifacts(para_file, usage_file, generated_help_file, comparison_file)
+    artifacts['cached'] = bool(cached)
+    if changes is not None:
+        artifacts['changes'] = changes['summary']
+    return artifacts
+
+
+def handle_render(params):
+    """Regenerate help text and comparison from existing parameter files"""
+    help_file = params['help_file']
+    para_file = params['para_file']
+    usage_file = params['usage_file']
+    generated_help_file = params['generated_help_file']
+    comparison_file = params['comparison_file']
+
+    ensure_parent_dirs(generated_help_file, comparison_file)
+
+    render_and_compare(help_file, para_file, usage_file, generated_help_file, comparison_file,
+                       params.get('full', False))
+
+    # Renders follow admin edits to para/usage JSON
+    if params.get('update_catalog', True):
+        refresh_catalog(para_file, usage_file)
+
+    return read_artifacts(para_file, usage_file, generated_help_file, comparison_file)
+
+
+def handle_lookup(params):
+    """One tool's parameters and usage from the catalog, reloading its entry when the JSON changed"""
+    para_file = params['para_file']
+    usage_file = params['usage_file']
+    tool = os.path.basename(para_file)[:-len('_para.json')]
+    current = param_catalog.file_signature(para_file) + param_catalog.file_signature(usage_file)
+    if current[0] is None:
+        raise FileNotFoundError(f"No parameters for {tool}")
+
+    try:
+        with param_catalog.ParamCatalog() as catalog:
+            if catalog.signature(tool) == current:
+                return {'para': catalog.parameters(tool), 'usage': catalog.usage(tool)}
+    except sqlite3.Error:
+        # No catalog yet: the refresh below creates it
+        pass
+
+    refresh_catalog(para_file, usage_file)
+    with param_catalog.ParamCatalog() as catalog:
+        if catalog.signature(tool) != current:
+            raise RuntimeError(f"Parameter catalog has no current entry for {tool}")
+        return {'para': catalog.parameters(tool), 'usage': catalog.usage(tool)}
+
+
+def handle_catalog(params):
+    """Incrementally rebuild the parameter catalog from parameters/"""
+    return param_catalog.build_catalog(params.get('parameters_dir'), params.get('catalog_path'))
+
+
+def handle_ping(params):
+    """Liveness check"""
+    return {'pid': os.getpid()}
+
+
+METHODS = {
+    'process': handle_process,
+    'render': handle_render,
+    'catalog': handle_catalog,
+    'lookup': handle_lookup,
+    'ping': handle_ping,
+}
+
+
+def send(message):
+    """Write one JSON-RPC message per line"""
+    RPC_OUT.write(json.dumps(message, ensure_ascii=False) + '\n')
+    RPC_OUT.flush()
+
+
+def handle_request(request):
+    """Dispatch one JSON-RPC request and build its response"""
+    request_id = request.get('id')
+    method = request.get('method')
+
+    if method not in METHODS:
+        return {'jsonrpc': '2.0', 'id': request_id,
+                'error': {'code': -32601, 'message': f"Unknown method: {method}"}}
+
+    try:
+        result = METHODS[method](request.get('params') or {})
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+    except KeyError as e:
+        return {'jsonrpc': '2.0', 'id': request_id,
+                'error': {'code': -32602, 'message': f"Missing parameter: {e.args[0]}"}}
+    except Exception as e:
+        print(f"Error handling {method}: {str(e)}", file=sys.stderr)
+        return {'jsonrpc': '2.0', 'id': request_id,
+                'error': {'code': -32000, 'message': str(e)}}
+
+
+def main():
+    # One request per line; the worker lives until stdin closes or shutdown is requested
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            send({'jsonrpc': '2.0', 'id': None,
+                  'error': {'code': -32700, 'message': f"Parse error: {str(e)}"}})
+            continue
+
+        if request.get('method') == 'shutdown':
+            send({'jsonrpc': '2.0', 'id': request.get('id'), 'result': True})
+            break
+
+        send(handle_request(request))
+
+
+if __name__ == '__main__':
+    main()
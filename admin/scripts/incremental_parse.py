@@ -0,0 +1,180 @@
+import sys
+
+import help_model
+import param
+
+
+def option_name(entry):
+    """Name identifying an entry: the 'key=' of a flag, else its long or short option"""
+    short = (entry.short or '').strip()
+    long = (entry.long or '').strip()
+    if short.endswith('='):
+        return short
+    for value in (long, short):
+        if value:
+            return value.split()[0].rstrip(',')
+    return ''
+
+
+def entry_keys(entries):
+    """(name, occurrence) per entry; a name can repeat, e.g. -h in several sub-sections"""
+    seen = {}
+    keys = []
+    for entry in entries:
+        name = option_name(entry)
+        seen[name] = seen.get(name, 0) + 1
+        keys.append((name, seen[name]))
+    return keys
+
+
+def changed_fields(a, b):
+    return [field for field in help_model.PARAMETER_FIELDS if getattr(a, field) != getattr(b, field)]
+
+
+def merge_parameters(old_parsed, new_parsed, stored):
+    """Merge a re-parsed help page into the stored (possibly admin edited) parameters
+
+    old_parsed  parser output for the previous help page
+    new_parsed  parser output for the new help page
+    stored      current _para.json entries
+
+    All three are lists of help_model.Parameter; the changes hold plain dicts.
+
+    Option blocks the parser sees unchanged keep their stored entry, admin edits
+    included. Changed blocks take the new parse unless the admin edited that entry,
+    which is reported as a conflict and left as edited. Entries the admin added
+    (not produced by the old parse) are kept next to their stored neighbour.
+    Returns (parameters, changes).
+    """
+    old_by_key = dict(zip(entry_keys(old_parsed), old_parsed))
+    stored_keys = entry_keys(stored)
+    stored_by_key = dict(zip(stored_keys, stored))
+    new_keys = entry_keys(new_parsed)
+
+    changes = {'added': [], 'changed': [], 'removed': [], 'conflicts': [], 'unchanged': 0, 'kept_edits': 0}
+    merged = []
+    merged_keys = []
+
+    for key, new_entry in zip(new_keys, new_parsed):
+        old_entry = old_by_key.get(key)
+        stored_entry = stored_by_key.get(key)
+
+        if old_entry is None:
+            # New option block (an admin entry with the same name wins)
+            if stored_entry is not None:
+                merged.append(stored_entry)
+            else:
+                merged.append(new_entry)
+                changes['added'].append(new_entry.to_dict())
+        elif old_entry == new_entry:
+            # Unchanged block: keep what is stored, or keep it deleted
+            if stored_entry is None:
+                continue
+            merged.append(stored_entry)
+            changes['unchanged'] += 1
+            if stored_entry != old_entry:
+                changes['kept_edits'] += 1
+        elif stored_entry is None:
+            # Deleted by the admin; the deletion stands even though the block changed
+            continue
+        elif stored_entry == old_entry:
+            merged.append(new_entry)
+            changes['changed'].append({
+                'option': key[0],
+                'fields': changed_fields(old_entry, new_entry),
+                'before': old_entry.to_dict(),
+                'after': new_entry.to_dict()
+            })
+        else:
+            # Changed upstream and edited by the admin: keep the edit, report the new parse
+            merged.append(stored_entry)
+            changes['conflicts'].append({'option': key[0], 'stored': stored_entry.to_dict(),
+                                         'proposed': new_entry.to_dict()})
+        merged_keys.append(key)
+
+    new_key_set = set(new_keys)
+    for key, old_entry in old_by_key.items():
+        if key not in new_key_set and key in stored_by_key:
+            changes['removed'].append(stored_by_key[key].to_dict())
+
+    # Entries the admin added by hand follow the stored entry they came after
+    previous = None
+    for key, stored_entry in zip(stored_keys, stored):
+        if key not in old_by_key and key not in new_key_set:
+            position = merged_keys.index(previous) + 1 if previous in merged_keys else len(merged)
+            merged.insert(position, stored_entry)
+            merged_keys.insert(position, key)
+        previous = key
+
+    return merged, changes
+
+
+def merge_usage(old_usage, new_usage, stored_usage):
+    """Usage lines follow the same rule as a single option block"""
+    if old_usage == new_usage:
+        return stored_usage, 'unchanged'
+    if stored_usage == old_usage:
+        return new_usage, 'updated'
+    return stored_usage, 'conflict'
+
+
+def incremental_update(previous_help_file, help_file, para_file, usage_file, changes_file=None):
+    """Re-parse help_file against previous_help_file, updating the stored JSON in place
+
+    Returns the change set (also written to changes_file when given).
+    """
+    stored = help_model.load_parameters(para_file)
+    try:
+        stored_usage = help_model.load_usage(usage_file).lines
+    except FileNotFoundError:
+        stored_usage = []
+
+    with open(previous_help_file, 'r', encoding='utf-8') as f:
+        previous_text = f.read()
+    with open(help_file, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    if previous_text == text:
+        # Same page again: nothing to re-parse
+        parameters, usage = stored, stored_usage
+        changes = {'added': [], 'changed': [], 'removed': [], 'conflicts': [],
+                   'unchanged': len(stored), 'kept_edits': 0, 'usage': 'unchanged'}
+    else:
+        old_usage, old_parsed = param.parse_help_text(previous_text)
+        new_usage, new_parsed = param.parse_help_text(text)
+        parameters, changes = merge_parameters(old_parsed, new_parsed, stored)
+        usage, changes['usage'] = merge_usage(old_usage, new_usage, stored_usage)
+        if changes['usage'] == 'conflict':
+            changes['proposed_usage'] = new_usage
+
+    changes['summary'] = {
+        'added': len(changes['added']),
+        'changed': len(changes['changed']),
+        'removed': len(changes['removed']),
+        'conflicts': len(changes['conflicts']),
+        'unchanged': changes['unchanged'],
+        'kept_edits': changes['kept_edits'],
+        'usage': changes['usage']
+    }
+
+    param.write_json({"usage": usage}, usage_file)
+    param.write_json(help_model.parameters_to_json(parameters), para_file)
+    if changes_file:
+        param.write_json(changes, changes_file)
+    return changes
+
+
+def main():
+    if len(sys.argv) not in (5, 6):
+        print("Usage: python incremental_parse.py <previous_help_file> <help_file> <para_file> <usage_file> [changes_file]")
+        sys.exit(1)
+
+    changes = incremental_update(*sys.argv[1:])
+    summary = changes['summary']
+    print(f"{summary['added']} added, {summary['changed']} changed, {summary['removed']} removed, "
+          f"{summary['conflicts']} conflicts, {summary['unchanged']} unchanged "
+          f"({summary['kept_edits']} with admin edits kept), usage {summary['usage']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,97 +1,110 @@
-import json
+import re
 import textwrap
-import difflib
 import os
-import re
 import sys
 
-def json_to_help(para_file, usage_file, output_file):
-    try:
-        # Read parameter JSON
-        with open(para_file, 'r', encoding='utf-8') as f:
-            params = json.load(f)
-        
-        # Read usage JSON
-        with open(usage_file, 'r', encoding='utf-8') as f:
-            usage = json.load(f)
-        
-        # Start building help text
-        help_text = []
-        
-        # Add usage section
-        if usage.get('usage'):
-            help_text.extend(usage['usage'])
-            help_text.append('')  # Add blank line
-        
-        # Filter out the duplicate usage entry from params
-        params = [p for p in params if not (p['category'] is None and p['long'] and 'OUT_DIR [-x EXTENSION]' in p['long'])]
-        
-        # Group parameters by category
-        params_by_category = {}
-        for param in params:
-            category = param['category'] or 'uncategorized'
-            if category not in params_by_category:
-                params_by_category[category] = []
-            params_by_category[category].append(param)
+import help_lexer
+import help_model
+import pipeline_trace
+
+# Option names in usage lines and option heads: "-x", "--out_dir"
+USAGE_OPTION_RE = re.compile(r'(?<![\w-])(--?[A-Za-z][\w-]*)')
+# Separator between an option's names and its description
+OPTION_HEAD_SPLIT_RE = re.compile(r'\s{2,}')
+# Deeper indented lines starting with '-' are wrapped descriptions, not options
+OPTION_MAX_INDENT = 8
+
+def render_help_text(params, usage):
+    """Render help text from help_model Parameters and Usage"""
+    # Start building help text
+    help_text = []
+    
+    # Add usage section
+    if usage.lines:
+        help_text.extend(usage.lines)
+        help_text.append('')  # Add blank line
+    
+    # Filter out the duplicate usage entry from params
+    params = [p for p in params if not (p.category is None and p.long and 'OUT_DIR [-x EXTENSION]' in p.long)]
+    
+    # Group parameters by category
+    params_by_category = {}
+    for param in params:
+        category = param.category or 'uncategorized'
+        if category not in params_by_category:
+            params_by_category[category] = []
+        params_by_category[category].append(param)
+    
+    # Process each category
+    for category, category_params in params_by_category.items():
+        if category != 'uncategorized':
+            help_text.append(f"{category}:")
         
-        # Process each category
-        for category, category_params in params_by_category.items():
-            if category != 'uncategorized':
-                help_text.append(f"{category}:")
+        for param in category_params:
+            # Build parameter line
+            param_parts = []
+            if param.short:
+                param_parts.append(param.short)
+            if param.long:
+                param_parts.append(param.long)
             
-            for param in category_params:
-                # Build parameter line
-                param_parts = []
-                if param['short']:
-                    param_parts.append(param['short'])
-                if param['long']:
-                    param_parts.append(param['long'])
-                
-                # Modify parameter line format
-                if param_parts:
-                    param_line = '  '  # Two space indentation
-                    if len(param_parts) > 1:
-                        param_line += f"{param_parts[0]}, {param_parts[1]}"
-                    else:
-                        param_line += param_parts[0]
-                    help_text.append(param_line)
-                
-                # Add description with proper indentation
-                if param['description']:
-                    # Clean up description
-                    desc = param['description'].replace('\n', ' ').strip()
-                    # Use 24 space indentation
-                    wrapped_desc = textwrap.wrap(
-                        desc,
-                        width=56,
-                        initial_indent=' ' * 24,
-                        subsequent_indent=' ' * 24
-                    )
-                    help_text.extend(wrapped_desc)
+            # Modify parameter line format
+            if param_parts:
+                param_line = '  '  # Two space indentation
+                if len(param_parts) > 1:
+                    param_line += f"{param_parts[0]}, {param_parts[1]}"
+                else:
+                    param_line += param_parts[0]
+                help_text.append(param_line)
             
-            help_text.append('')  # Add blank line between categories
+            # Add description with proper indentation
+            if param.description:
+                # Clean up description
+                desc = param.description.replace('\n', ' ').strip()
+                # Use 24 space indentation
+                wrapped_desc = textwrap.wrap(
+                    desc,
+                    width=56,
+                    initial_indent=' ' * 24,
+                    subsequent_indent=' ' * 24
+                )
+                help_text.extend(wrapped_desc)
         
-        # Write to output file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(help_text))
+        help_text.append('')  # Add blank line between categories
+    
+    return '\n'.join(help_text)
+
+def json_to_help(para_file, usage_file, output_file):
+    try:
+        with pipeline_trace.stage('render', pipeline_trace.tool_name(para_file)):
+            params = help_model.load_parameters(para_file)
+            usage = help_model.load_usage(usage_file)
+            
+            help_text = render_help_text(params, usage)
+            pipeline_trace.count('parameters', len(params))
+            pipeline_trace.count('lines', help_text.count('\n'))
+            
+            # Write to output file
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(help_text)
         
         return True
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         return False
 
-def normalize_parameter(param):
-    """Standardize parameter string, keeping only key information"""
-    # Remove extra spaces
-    param = ' '.join(param.split())
-    # Keep only parameter name and its first word description (if any)
-    parts = param.split(' ', 2)
-    if len(parts) > 1:
-        # If it's a combination of short and long parameters
-        if ',' in parts[0]:
-            return parts[0]  # Return format like "-x, --extension"
-        return parts[0]  # Return single parameter
-    return param
+def required_options(usage):
+    """Options a usage line requires: those outside [...], e.g. '--out_dir' in 'prog --out_dir DIR [-x EXT]'"""
+    depth = 0
+    outside = []
+    for char in usage:
+        if char == '[':
+            depth += 1
+        elif char == ']':
+            depth = max(0, depth - 1)
+        elif depth == 0:
+            outside.append(char)
+    return list(dict.fromkeys(USAGE_OPTION_RE.findall(''.join(outside))))
 
 def extract_content_structure(text):
     """Extract content structure, focusing on parameter names and categories"""
@@ -99,43 +112,64 @@ def extract_content_structure(text):
         'usage': '',
         'categories': set(),
         'parameters': set(),  # Store only parameter names
+        'flags': set(),  # BBTools style key= names
         'defaults': set()
     }
     
-    lines = text.splitlines()
-    current_category = None
+    tokens = help_lexer.tokenize(text)
+    usage_lines = None
+    pending_category = None
     
-    for line in lines:
-        line = line.strip()
+    for token in tokens:
+        line = token.text
         
-        # Capture usage
-        if line.startswith('usage:'):
-            structure['usage'] = ' '.join(line.split())
+        # Capture the first usage section, up to the next blank line
+        if usage_lines is not None and not structure['usage']:
+            if line:
+                usage_lines.append(line)
+                continue
+            structure['usage'] = ' '.join(' '.join(usage_lines).split())
+        if token.kind == help_lexer.USAGE and usage_lines is None:
+            usage_lines = [line]
             continue
-            
-        # Capture categories
-        if line.endswith('arguments:'):
-            current_category = line
-            structure['categories'].add(line)
+        
+        if not line:
             continue
-            
-        # Capture parameters
-        if line.startswith('--') or line.startswith('-'):
-            # Standardize and store parameter name
-            param = normalize_parameter(line)
-            if param:
-                structure['parameters'].add(param)
-            
+        
+        # A category counts once a parameter follows it
+        if token.kind == help_lexer.CATEGORY:
+            pending_category = line
+            continue
+        
+        # Capture parameters: option names before the description
+        is_option = token.kind == help_lexer.OPTION and token.indent < OPTION_MAX_INDENT
+        if is_option:
+            head = OPTION_HEAD_SPLIT_RE.split(line, maxsplit=1)[0]
+            structure['parameters'].update(USAGE_OPTION_RE.findall(head))
+        elif token.flag and token.indent <= 2:
+            structure['flags'].add(token.flag.group(1))
+        else:
+            pending_category = None
+        
+        if pending_category and (is_option or token.flag):
+            structure['categories'].add(pending_category)
+            pending_category = None
+        
         # Capture default values
-        if '(default:' in line:
-            match = re.search(r'\(default:.*?\)', line)
-            if match:
-                structure['defaults'].add(match.group(0))
+        if token.default:
+            structure['defaults'].add(token.default)
+    
+    if usage_lines and not structure['usage']:
+        structure['usage'] = ' '.join(' '.join(usage_lines).split())
     
     return structure
 
 def compare_help_pages(original_file, generated_help):
-    """Compare core content of help pages, ignoring format differences"""
+    """Compare core content of help pages, ignoring format differences
+
+    Returns (is_identical, differences). Pages without any recognisable
+    parameter are never reported identical, there is no structure to vouch for them.
+    """
     with open(original_file, 'r', encoding='utf-8') as f:
         original = f.read()
     
@@ -146,38 +180,40 @@ def compare_help_pages(original_file, generated_help):
     # Compare differences
     differences = {
         'missing_parameters': [],
+        'extra_parameters': [],
         'missing_categories': [],
         'missing_defaults': [],
         'content_mismatch': []
     }
     
-    # Compare parameters (only parameter names)
-    orig_params = {p.split()[0] for p in original_structure['parameters']}
-    gen_params = {p.split()[0] for p in generated_structure['parameters']}
+    # Compare parameters (only parameter and flag names)
+    orig_params = original_structure['parameters'] | {f"{flag}=" for flag in original_structure['flags']}
+    gen_params = generated_structure['parameters'] | {f"{flag}=" for flag in generated_structure['flags']}
     
-    missing = orig_params - gen_params
-    if missing:
-        differences['missing_parameters'] = list(missing)
+    if orig_params - gen_params:
+        differences['missing_parameters'] = sorted(orig_params - gen_params)
+    if gen_params - orig_params:
+        differences['extra_parameters'] = sorted(gen_params - orig_params)
     
     # Compare categories
-    orig_cats = {c.strip() for c in original_structure['categories']}
-    gen_cats = {c.strip() for c in generated_structure['categories']}
-    missing_cats = orig_cats - gen_cats
+    missing_cats = original_structure['categories'] - generated_structure['categories']
     if missing_cats:
-        differences['missing_categories'] = list(missing_cats)
+        differences['missing_categories'] = sorted(missing_cats)
     
     # Compare default values (only the values themselves)
     orig_defaults = {d.strip('()') for d in original_structure['defaults']}
     gen_defaults = {d.strip('()') for d in generated_structure['defaults']}
     missing_defaults = orig_defaults - gen_defaults
     if missing_defaults:
-        differences['missing_defaults'] = list(missing_defaults)
+        differences['missing_defaults'] = sorted(missing_defaults)
     
-    # Check required parameters in usage
-    required_params = ['--genome_dir', '--batchfile', '--out_dir']
-    missing_required = [p for p in required_params if p not in generated_structure['usage']]
+    # Check that options the original usage requires are still in the generated usage
+    generated_usage_options = set(USAGE_OPTION_RE.findall(generated_structure['usage']))
+    missing_required = [p for p in required_options(original_structure['usage']) if p not in generated_usage_options]
     if missing_required:
         differences['content_mismatch'].append(f'Missing required parameters in usage: {", ".join(missing_required)}')
+    if not orig_params:
+        differences['content_mismatch'].append('No parameters recognised in the original help')
     
     # Remove empty difference categories
     differences = {k: v for k, v in differences.items() if v}
@@ -0,0 +1,206 @@
+import difflib
+import re
+import sys
+
+# Words and runs of punctuation; whitespace only separates tokens
+TOKEN_RE = re.compile(r'\w+|[^\w\s]+')
+
+MODES = ('difflib', 'token', 'compat')
+# In compat mode the best token scored candidates, at most this many and
+# within COMPAT_MARGIN of the best, are ranked again by character ratio
+COMPAT_SHORTLIST = 3
+COMPAT_MARGIN = 0.2
+# Below this best token score a block has no real counterpart and compat mode
+# ranks all candidates by character ratio
+COMPAT_MIN_SCORE = 0.5
+# Edit distance beyond which Myers' O((N+M)D) walk hands over to the bit-parallel LCS
+MYERS_MAX_D = 32
+
+
+def lcs_length(a, b):
+    """Longest common subsequence length, bit-parallel over b (Allison-Dix / Hyyrö)
+
+    One pass over a with a few big integer operations per element, so the
+    cost stays near linear whatever the distance between the sequences.
+    """
+    masks = {}
+    for i, code in enumerate(b):
+        masks[code] = masks.get(code, 0) | (1 << i)
+    full = (1 << len(b)) - 1
+    v = full
+    for code in a:
+        u = v & masks.get(code, 0)
+        v = ((v + u) | (v - u)) & full
+    return len(b) - bin(v).count('1')
+
+
+def edit_distance(a, b, max_d=None):
+    """Insertions plus deletions turning a into b
+
+    Myers' O((N+M)D) diff settles similar sequences in near linear time; once
+    the distance passes MYERS_MAX_D the bit-parallel LCS finishes the job.
+    Returns None when more than max_d edits would be needed, which bounds the
+    work for pairs that cannot reach a wanted similarity.
+    """
+    # Common prefix and suffix cost nothing and are frequent between near-identical blocks
+    start = 0
+    end_a, end_b = len(a), len(b)
+    while start < end_a and start < end_b and a[start] == b[start]:
+        start += 1
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a = a[start:end_a]
+    b = b[start:end_b]
+
+    n, m = len(a), len(b)
+    limit = n + m if max_d is None else min(max_d, n + m)
+    # At least |n - m| elements are inserted or deleted
+    if abs(n - m) > limit:
+        return None
+    if not n or not m:
+        return n + m
+
+    # v[k] is the furthest x reached on diagonal k = x - y
+    walk = min(limit, MYERS_MAX_D)
+    offset = walk + 1
+    v = [0] * (2 * walk + 3)
+    for d in range(walk + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return d
+    if walk == limit:
+        return None
+
+    distance = n + m - 2 * lcs_length(a, b)
+    return distance if distance <= limit else None
+
+
+class BlockScorer:
+    """Similarity of normalized blocks, 2 * matches / total like difflib's ratio
+
+    'token' compares token sequences: every distinct word or punctuation run is
+    interned to an integer once, and the Myers diff runs on those integers.
+    'compat' ranks candidates the same way but gives the pair finally chosen
+    its character ratio, so match/nomatch decisions use the difflib score with
+    one character comparison per row instead of one per candidate.
+    'difflib' is the character ratio everywhere.
+    """
+
+    def __init__(self, mode='compat'):
+        if mode not in MODES:
+            raise ValueError(f"Unknown similarity mode: {mode}")
+        self.mode = mode
+        self.vocabulary = {}
+        self.encoded = {}
+        self.matchers = {}
+
+    def encode(self, text):
+        codes = self.encoded.get(text)
+        if codes is None:
+            vocabulary = self.vocabulary
+            codes = self.encoded[text] = tuple(
+                vocabulary.setdefault(token, len(vocabulary)) for token in TOKEN_RE.findall(text))
+        return codes
+
+    def token_ratio(self, a, b, min_ratio=0.0):
+        """Token similarity; 0.0 when it is certainly not above min_ratio"""
+        codes_a = self.encode(a)
+        codes_b = self.encode(b)
+        total = len(codes_a) + len(codes_b)
+        if not total:
+            return 1.0
+        # ratio = 1 - distance / total, so min_ratio caps the distance worth computing
+        max_d = int(total * (1.0 - min_ratio)) if min_ratio > 0 else None
+        distance = edit_distance(codes_a, codes_b, max_d)
+        if distance is None:
+            return 0.0
+        return 1.0 - distance / total
+
+    def char_ratio(self, a, b):
+        """difflib's character ratio; one matcher per b so difflib analyses it only once"""
+        matcher = self.matchers.get(b)
+        if matcher is None:
+            matcher = self.matchers[b] = difflib.SequenceMatcher(None, '', b)
+        matcher.set_seq1(a)
+        return matcher.ratio()
+
+    def ratio(self, a, b, min_ratio=0.0):
+        """Score of one pair (0.0 when certainly not above min_ratio)"""
+        if self.mode == 'token':
+            return self.token_ratio(a, b, min_ratio)
+        return self.char_ratio(a, b)
+
+    def best_char_match(self, a, candidates):
+        """Best candidate by character ratio, skipping those difflib's cheap bounds rule out"""
+        best_index, best_ratio = None, 0
+        for index, text in candidates:
+            matcher = self.matchers.get(text)
+            if matcher is None:
+                matcher = self.matchers[text] = difflib.SequenceMatcher(None, '', text)
+            matcher.set_seq1(a)
+            if matcher.real_quick_ratio() <= best_ratio or matcher.quick_ratio() <= best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio > best_ratio:
+                best_index, best_ratio = index, ratio
+        return best_index, best_ratio
+
+    def best_match(self, a, candidates):
+        """(index, ratio) of the candidate most similar to a, (None, 0) when none is
+
+        candidates are (index, text) pairs; ties go to the earliest candidate.
+        """
+        if self.mode == 'difflib':
+            return self.best_char_match(a, candidates)
+
+        scored = []
+        best = 0.0
+        for index, text in candidates:
+            # The token diff stops early for candidates that cannot come close to the best
+            floor = best if self.mode == 'token' else best - COMPAT_MARGIN
+            score = self.token_ratio(a, text, max(floor, 0.0))
+            if score > 0:
+                scored.append((score, index, text))
+                best = max(best, score)
+
+        if self.mode == 'compat':
+            if best < COMPAT_MIN_SCORE:
+                # No real match: whichever block the character ratio prefers takes this
+                # row, as it did before, so later rows keep their candidates
+                return self.best_char_match(a, candidates)
+            shortlist = sorted(scored, key=lambda item: (-item[0], item[1]))[:COMPAT_SHORTLIST]
+            scored = [(self.char_ratio(a, text), index, text)
+                      for score, index, text in shortlist if score >= best - COMPAT_MARGIN]
+
+        best_index, best_ratio = None, 0
+        for ratio, index, _ in sorted(scored, key=lambda item: item[1]):
+            if ratio > best_ratio:
+                best_index, best_ratio = index, ratio
+        return best_index, best_ratio
+
+
+def main():
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python line_diff.py <file_a> <file_b> [difflib|token|compat]")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        a = f.read()
+    with open(sys.argv[2], 'r', encoding='utf-8') as f:
+        b = f.read()
+    scorer = BlockScorer(sys.argv[3] if len(sys.argv) == 4 else 'compat')
+    print(f"{scorer.ratio(a, b):.4f}")
+
+
+if __name__ == '__main__':
+    main()
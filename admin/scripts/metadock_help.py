@@ -0,0 +1,124 @@
+import argparse
+import os
+import sys
+
+# Run from anywhere: the stage modules are siblings of this script
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Choices of compare_help_html.py (line_diff.MODES for the block score), listed
+# here so building the parser does not import the comparison modules
+ENGINES = ('auto', 'difflib', 'indexed')
+SIMILARITY_MODES = ('compat', 'token', 'difflib')
+FORMATS = ('html', 'json')
+
+
+def ensure_parent_dirs(*paths):
+    """Create parent directories of output files ('-' is stdout)"""
+    for path in paths:
+        directory = os.path.dirname(path)
+        if path != '-' and directory:
+            os.makedirs(directory, exist_ok=True)
+
+
+# Each stage imports its modules when it runs, so 'parse' never loads the
+# comparison code and 'render' never loads the parsers
+
+def run_parse(help_file, para_file, usage_file):
+    import param
+    ensure_parent_dirs(para_file, usage_file)
+    try:
+        param.process_help_file(help_file, para_file, usage_file)
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return False
+    return True
+
+
+def run_render(para_file, usage_file, output_file):
+    import json_to_help
+    ensure_parent_dirs(output_file)
+    return json_to_help.json_to_help(para_file, usage_file, output_file)
+
+
+def run_compare(help_file, generated_help_file, output_file, engine='auto', full=False, output_format='html',
+                similarity=None, para_file=None, usage_file=None):
+    import compare_help_html
+    ensure_parent_dirs(output_file)
+    return compare_help_html.process_help_file(help_file, generated_help_file, output_file,
+                                               para_file=para_file, usage_file=usage_file, engine=engine,
+                                               full=full, output_format=output_format, similarity=similarity)
+
+
+def cmd_parse(args):
+    return run_parse(args.help_file, args.para_file, args.usage_file)
+
+
+def cmd_render(args):
+    return run_render(args.para_file, args.usage_file, args.output_file)
+
+
+def cmd_compare(args):
+    return run_compare(args.help_file, args.generated_help_file, args.output_file, args.engine, args.full,
+                       args.format, args.similarity)
+
+
+def cmd_all(args):
+    """parse -> render -> compare in this process; the lexer cache is shared by the stages"""
+    return (run_parse(args.help_file, args.para_file, args.usage_file)
+            and run_render(args.para_file, args.usage_file, args.generated_help_file)
+            and run_compare(args.help_file, args.generated_help_file, args.output_file, args.engine, args.full,
+                            args.format, args.similarity, args.para_file, args.usage_file))
+
+
+def add_compare_options(parser):
+    parser.add_argument('--engine', default='auto', choices=ENGINES, help='block alignment engine')
+    parser.add_argument('--similarity', choices=SIMILARITY_MODES,
+                        help='block score (default: METADOCK_SIMILARITY or compat)')
+    parser.add_argument('--full', action='store_true',
+                        help='compare block by block even when the structure is identical')
+    parser.add_argument('--format', default='html', choices=FORMATS,
+                        help='HTML report, or JSON rows for the virtualized viewer')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Parse help pages, render generated help and compare the two')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parse = commands.add_parser('parse', help='help page -> _para.json and _usage.json (param.py)')
+    parse.add_argument('help_file')
+    parse.add_argument('para_file')
+    parse.add_argument('usage_file')
+    parse.set_defaults(handler=cmd_parse)
+
+    render = commands.add_parser('render', help='_para.json and _usage.json -> generated help (json_to_help.py)')
+    render.add_argument('para_file')
+    render.add_argument('usage_file')
+    render.add_argument('output_file')
+    render.set_defaults(handler=cmd_render)
+
+    compare = commands.add_parser('compare', help='help page vs generated help -> report (compare_help_html.py)')
+    add_compare_options(compare)
+    compare.add_argument('help_file')
+    compare.add_argument('generated_help_file')
+    compare.add_argument('output_file', help="report path, '-' for stdout")
+    compare.set_defaults(handler=cmd_compare)
+
+    run_all = commands.add_parser('all', help='parse, render and compare in one process')
+    add_compare_options(run_all)
+    run_all.add_argument('help_file')
+    run_all.add_argument('para_file')
+    run_all.add_argument('usage_file')
+    run_all.add_argument('generated_help_file')
+    run_all.add_argument('output_file', help="report path, '-' for stdout")
+    run_all.set_defaults(handler=cmd_all)
+
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    sys.exit(0 if args.handler(args) else 1)
+
+
+if __name__ == '__main__':
+    main()
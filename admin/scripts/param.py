@@ -1,243 +1,140 @@
 import os
 import json
-import re
 import sys
+import time
 
-def capture_usage_content(input_file, usage_output_file):
-    # Read input file
-    with open(input_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    # Store Usage section content
-    usage_content = []
-    temp_usage = ""  # Temporary string to concatenate the entire Usage section
-    capturing_usage = False
-    
-    for line in lines:
-        line = line.strip()
-
-        # Start capturing Usage section
-        if line.startswith("Usage:") or line.startswith("usage:")or line.startswith("USAGE"):
-            capturing_usage = True
-            temp_usage = line  # Initialize temp_usage with Usage line
-
-        # If capturing Usage section, continue saving subsequent content
-        elif capturing_usage:
-            if line == "":
-                # Stop capturing once an empty line is encountered
-                usage_content.append(temp_usage)  # Add concatenated Usage section to content
-                break
-            temp_usage += " " + line  # Append subsequent content to temp_usage (space-separated)
-
-    # Write captured Usage section content to output file in JSON format
-    with open(usage_output_file, 'w', encoding='utf-8') as f:
-        json.dump({"usage": usage_content}, f, ensure_ascii=False, indent=4)
-
-
-def process_json(data):
-    # Iterate through each entry, process short and long options, update needs_input
-    for entry in data:
-        short_value = entry["short"]
-        long_value = entry["long"]
-        description = entry["description"]
-
-        if long_value:
-            # Check number of spaces, if multiple spaces exist
-            if long_value.count(' ') > 1:
-                # Find first part separated by consecutive spaces
-                parts = re.split(r'  | : ', long_value, maxsplit=1)
-                if len(parts) > 1:
-                    long_value = parts[0].strip()
-                    # Move remaining content to description
-                    entry["description"] = parts[1].strip() + (' ' + description if description else '')
-
-            # Update long value
-            entry["long"] = long_value
-
-        if short_value:
-            # Check number of spaces, if multiple spaces exist
-            if short_value.count(' ') > 1:
-                # Find first part separated by consecutive spaces
-                parts = re.split(r'  | : ', short_value, maxsplit=1) 
-                if len(parts) > 1:
-                    short_value = parts[0].strip()
-                    # Move remaining content to description
-                    entry["description"] = parts[1].strip() + (' ' + description if description else '')
-
-            # Update short value
-            entry["short"] = short_value
-
-        # Get short and long fields, replace None with empty string
-        short = entry.get("short", "")
-        long = entry.get("long", "")
-        
-        # If short or long is None, set to empty string
-        if short is None:
-            short = ""
-        if long is None:
-            long = ""
-
-        # Check if short or long contains spaces
-        if (' ' in short) or (' ' in long):
-            entry["needs_input"] = True
-        else:
-            entry["needs_input"] = False
-
-    return data
-
-
-def parse_and_process_help_file(input_file, output_file):
-    """Parse help file, extract parameter information and save as JSON"""
-    with open(input_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    parsed_data = []
-    current_category = None
-    current_param = None
-    description_lines = []
-    num_lines = len(lines)
-
-    # Use enumerate to ensure i increments correctly
-    for i, line in enumerate(lines):
-        line = line.strip()
-
-        # Ensure it's a category: ends with ':' and next line starts with '-'
-        if line.endswith(':') and i + 1 < num_lines and lines[i + 1].strip().startswith('-'):
-            if current_param:
-                current_param['description'] = '\n'.join(description_lines)
-                parsed_data.append(current_param)
-            
-            current_category = line[:-1]  # Record current category
-            current_param = None
-            description_lines = []
-        
-        elif line.startswith('-'):
-            if current_param:
-                current_param['description'] = '\n'.join(description_lines)
-                parsed_data.append(current_param)
-
-            # Parse parameter
-            current_param = {
-                'category': current_category, 
-                'short': None, 
-                'long': None, 
-                'needs_input': False, 
-                'description': None
-            }
-
-            # First try comma separation
-            parts = line.split(', ')
-            if len(parts) == 1:
-                # If no comma, try space or slash separation (must be followed by -)
-                parts = re.split(r'[\s/]+(?=-)', line)
-            
-            previous_part = None  # Record last valid option type
-            
-            for part in parts:
-                option = part.strip()
-                
-                if option.startswith('--'):
-                    current_param['long'] = option
-                    previous_part = 'long'
-                elif option.startswith('-'):
-                    current_param['short'] = option
-                    previous_part = 'short'
-                else:
-                    if option.startswith(' '):
-                        break
-                    # Append to previous option
-                    if previous_part == 'long' and current_param['long']:
-                        current_param['long'] += ", " + option
-                    elif previous_part == 'short' and current_param['short']:
-                        current_param['short'] += ", " + option
-
-            # Check if input is needed
-            current_param['needs_input'] = len(parts) > 1
-            description_lines = []
-
-        else:
-            description_lines.append(line)
-
-    # Process last parameter
-    if current_param:
-        current_param['description'] = '\n'.join(description_lines)
-        parsed_data.append(current_param)
-
-    # Process data
-    processed_data = process_json(parsed_data)
+import help_lexer
+import help_model
+import help_parsers
+import pipeline_trace
 
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(processed_data, f, ensure_ascii=False, indent=4)
+# Bump whenever parsing, rendering or comparison output changes; cached artifacts are keyed on it
+PARSER_VERSION = "3"
+
+def parse_help_tokens(tokens):
+    """Single pass over lexed help lines returning (usage_content, parameters)
+
+    Only the formats help_parsers detects on the page run, each with its own collector.
+    """
+    selected = help_parsers.select_formats(tokens)
+    pipeline_trace.note('formats', {fmt.name: confidence for fmt, confidence in selected})
 
-def extract_flags_from_txt(input_file, output_file):
-    """Parse lines ending with ':' or starting with 'Flags' in .txt file and append to _para.json"""
-    with open(input_file, 'r', encoding='utf-8') as file:
-        lines = file.readlines()
+    usage = help_parsers.UsageCollector()
+    parsers = [fmt.collector() for fmt, _ in selected]
+    collectors = [usage] + parsers
 
-    extracting = False
-    current_category = None
+    for index, token in enumerate(tokens):
+        next_token = tokens[index + 1] if index + 1 < len(tokens) else None
+        for collector in collectors:
+            collector.feed(token, next_token)
+
+    # Entries follow registry order: options, then key=value flags, then JVM options
     parameters = []
+    for parser in parsers:
+        parameters += parser.result()
+    return usage.result(), parameters
 
-    for i, line in enumerate(lines):
-        line = line.strip()
-
-        # Identify lines ending with ':' or starting with "Flags"
-        if (line.endswith(":") and "  " not in line) or line == "Flags":
-            current_category = line.strip(':')
-            extracting = True
-            continue  
-
-        if extracting:
-            # Match parameters in key=value format
-            match = re.match(r'(\S+)=([^ ]*)\s*(.*)', line)
-            if match:
-                short = match.group(1) + '='  
-                long = match.group(2) if match.group(2) else "null"  
-                description = match.group(3).strip()
-
-                # Check for line continuation in description
-                j = i + 1
-                while j < len(lines) and lines[j].startswith(" "):  
-                    description += " " + lines[j].strip()
-                    j += 1  
-
-                parameters.append({
-                    "category": current_category,
-                    "short": short,
-                    "long": long,
-                    "needs_input": True,
-                    "description": description if description else "No description available"
-                })
-
-    # Read existing _para.json (if exists)
-    if os.path.exists(output_file):
-        with open(output_file, 'r', encoding='utf-8') as f:
-            existing_data = json.load(f)
-    else:
-        existing_data = []
 
-    # Append newly parsed data
-    existing_data.extend(parameters)
+def parse_help_text(text):
+    """Parse help text, sharing the lexer cache with the other stages"""
+    return parse_help_tokens(help_lexer.tokenize_file_lines(text))
+
 
-    # Write updated JSON
-    with open(output_file, 'w', encoding='utf-8') as outfile:
-        json.dump(existing_data, outfile, ensure_ascii=False, indent=4)
-        
-def batch_process(input_folder, output_folder):
-    """Batch process txt files in help folder"""
+def parse_help_file(input_file):
+    """Read a help file once and return (usage_content, parameters)"""
+    return parse_help_text(help_lexer.read_help_file(input_file))
+
+
+def write_json(data, output_file):
+    """Write JSON output in the pretty-printed layout used by parameters/"""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+
+
+def process_batch_item(input_path, para_output_path, usage_output_path):
+    """Process one batch file, reporting failure instead of raising"""
+    start = time.perf_counter()
+    try:
+        process_help_file(input_path, para_output_path, usage_output_path)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)}"
+
+    return {
+        'file': input_path,
+        'success': error is None,
+        'seconds': time.perf_counter() - start,
+        'error': error
+    }
+
+def print_batch_summary(results, elapsed):
+    """Print per-file timings followed by success/failure totals"""
+    failures = [r for r in results if not r['success']]
+
+    for result in sorted(results, key=lambda r: r['seconds'], reverse=True):
+        status = 'ok' if result['success'] else 'FAILED'
+        print(f"{status:>6}  {result['seconds']:8.3f}s  {os.path.basename(result['file'])}")
+    for result in failures:
+        print(f"Error: {result['file']}: {result['error']}", file=sys.stderr)
+
+    print(f"Processed {len(results)} files in {elapsed:.3f}s: "
+          f"{len(results) - len(failures)} succeeded, {len(failures)} failed")
+
+def batch_process(input_folder, output_folder, workers=None):
+    """Batch process txt files in help folder, spread across a process pool
+
+    workers defaults to the number of CPUs; workers=1 processes files in this process.
+    A file that fails to parse is reported in the summary and does not stop the batch.
+    """
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    for filename in os.listdir(input_folder):
+    jobs = []
+    for filename in sorted(os.listdir(input_folder)):
         if filename.endswith(".txt"):
             input_path = os.path.join(input_folder, filename)
             base_name = os.path.splitext(filename)[0]
             para_output_path = os.path.join(output_folder, f"{base_name}_para.json")
             usage_output_path = os.path.join(output_folder, f"{base_name}_usage.json")
+            jobs.append((input_path, para_output_path, usage_output_path))
 
-            capture_usage_content(input_path, usage_output_path)
-            parse_and_process_help_file(input_path, para_output_path)
-            extract_flags_from_txt(input_path, para_output_path)  # Append flag information
+    start = time.perf_counter()
+    results = []
+    if workers == 1 or len(jobs) <= 1:
+        results = [process_batch_item(*job) for job in jobs]
+    else:
+        # Only batches need the process pool; single files skip importing multiprocessing
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(process_batch_item, *job): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # The worker process itself died (e.g. killed), record it against its file
+                    results.append({
+                        'file': futures[future][0],
+                        'success': False,
+                        'seconds': 0.0,
+                        'error': f"{type(e).__name__}: {str(e)}"
+                    })
+
+    print_batch_summary(results, time.perf_counter() - start)
+    return results
+
+def process_help_file(input_file, para_output_file, usage_output_file):
+    """Extract usage and parameters from one help file into explicit output paths"""
+    with pipeline_trace.stage('parse', pipeline_trace.tool_name(input_file)):
+        text = help_lexer.read_help_file(input_file)
+        tokens = help_lexer.tokenize_file_lines(text)
+        usage_content, parameters = parse_help_tokens(tokens)
+        pipeline_trace.count('bytes', len(text))
+        pipeline_trace.count('lines', len(tokens))
+        pipeline_trace.count('parameters', len(parameters))
+
+        # Each output file is written exactly once
+        write_json({"usage": usage_content}, usage_output_file)
+        write_json(help_model.parameters_to_json(parameters), para_output_file)
 
 def process_single_file(input_file, output_folder):
     """Process single file"""
@@ -248,13 +145,18 @@ def process_single_file(input_file, output_folder):
     para_output_path = os.path.join(output_folder, f"{base_name}_para.json")
     usage_output_path = os.path.join(output_folder, f"{base_name}_usage.json")
 
-    capture_usage_content(input_file, usage_output_path)
-    parse_and_process_help_file(input_file, para_output_path)
-    extract_flags_from_txt(input_file, para_output_path)  # Append flag information
+    process_help_file(input_file, para_output_path, usage_output_path)
 
 if __name__ == "__main__":
+    # Batch mode: python param.py --batch <input_folder> <output_folder> [workers]
+    if len(sys.argv) in (4, 5) and sys.argv[1] == "--batch":
+        workers = int(sys.argv[4]) if len(sys.argv) == 5 else None
+        results = batch_process(sys.argv[2], sys.argv[3], workers)
+        sys.exit(0 if all(r['success'] for r in results) else 1)
+
     if len(sys.argv) != 4:
         print("Usage: python param.py <input_file> <para_output_file> <usage_output_file>")
+        print("       python param.py --batch <input_folder> <output_folder> [workers]")
         sys.exit(1)
 
     input_file = sys.argv[1]
@@ -266,7 +168,5 @@ if __name__ == "__main__":
     os.makedirs(os.path.dirname(usage_output_file), exist_ok=True)
 
     # Process file
-    capture_usage_content(input_file, usage_output_file)
-    parse_and_process_help_file(input_file, para_output_file)
-    extract_flags_from_txt(input_file, para_output_file)
+    process_help_file(input_file, para_output_file, usage_output_file)
 
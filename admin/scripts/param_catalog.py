@@ -0,0 +1,246 @@
+import json
+import os
+import sqlite3
+import sys
+from urllib.request import pathname2url
+
+from help_model import PARAMETER_FIELDS
+
+# Catalog location, overridable from the environment
+DEFAULT_PARAMETERS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'parameters')
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'cache', 'param_catalog.sqlite')
+CATALOG_PATH = os.environ.get('METADOCK_PARAM_CATALOG', DEFAULT_CATALOG_PATH)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tools (
+    name TEXT PRIMARY KEY,
+    para_mtime_ns INTEGER,
+    para_size INTEGER,
+    usage_mtime_ns INTEGER,
+    usage_size INTEGER
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    tool TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    category TEXT,
+    short TEXT,
+    long TEXT,
+    option_name TEXT,
+    needs_input INTEGER,
+    description TEXT,
+    extra TEXT,
+    PRIMARY KEY (tool, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS usage (
+    tool TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    text TEXT,
+    PRIMARY KEY (tool, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS parameters_category ON parameters (tool, category);
+CREATE INDEX IF NOT EXISTS parameters_option_name ON parameters (option_name);
+CREATE INDEX IF NOT EXISTS parameters_short ON parameters (short);
+"""
+
+
+def option_name(entry):
+    """Option name used to look a parameter up, e.g. '--input_type' from '--input_type {fastq,...}'"""
+    for value in (entry.get('long'), entry.get('short')):
+        if value:
+            return value.split()[0]
+    return None
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None, None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def connect(catalog_path=None):
+    """Open (and create if needed) the catalog database"""
+    catalog_path = catalog_path or CATALOG_PATH
+    directory = os.path.dirname(catalog_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(catalog_path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def connect_readonly(catalog_path=None):
+    """Open an existing catalog for lookups, without creating the file or the schema"""
+    catalog_path = os.path.abspath(catalog_path or CATALOG_PATH)
+    conn = sqlite3.connect(f'file:{pathname2url(catalog_path)}?mode=ro', uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def update_tool(conn, tool, para_file, usage_file):
+    """(Re)load one tool's para/usage JSON into the catalog"""
+    with open(para_file, 'r', encoding='utf-8') as f:
+        params = json.load(f)
+    try:
+        with open(usage_file, 'r', encoding='utf-8') as f:
+            usage = json.load(f).get('usage', [])
+    except FileNotFoundError:
+        usage = []
+
+    para_mtime, para_size = file_signature(para_file)
+    usage_mtime, usage_size = file_signature(usage_file)
+
+    rows = []
+    for position, entry in enumerate(params):
+        # The standard fields get their own columns; anything else goes to 'extra'
+        extra = {k: v for k, v in entry.items() if k not in PARAMETER_FIELDS}
+        rows.append((
+            tool, position, entry.get('category'), entry.get('short'), entry.get('long'),
+            option_name(entry), int(bool(entry.get('needs_input'))), entry.get('description'),
+            json.dumps(extra, ensure_ascii=False) if extra else None
+        ))
+
+    with conn:
+        conn.execute("DELETE FROM parameters WHERE tool = ?", (tool,))
+        conn.execute("DELETE FROM usage WHERE tool = ?", (tool,))
+        conn.executemany("INSERT INTO parameters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany("INSERT INTO usage VALUES (?, ?, ?)",
+                         [(tool, position, text) for position, text in enumerate(usage)])
+        conn.execute("INSERT OR REPLACE INTO tools VALUES (?, ?, ?, ?, ?)",
+                     (tool, para_mtime, para_size, usage_mtime, usage_size))
+
+
+def remove_tool(conn, tool):
+    with conn:
+        conn.execute("DELETE FROM parameters WHERE tool = ?", (tool,))
+        conn.execute("DELETE FROM usage WHERE tool = ?", (tool,))
+        conn.execute("DELETE FROM tools WHERE name = ?", (tool,))
+
+
+def build_catalog(parameters_dir=None, catalog_path=None):
+    """Bring the catalog in line with parameters/, reloading only tools whose files changed"""
+    parameters_dir = parameters_dir or DEFAULT_PARAMETERS_DIR
+    conn = connect(catalog_path)
+    known = {row['name']: row for row in conn.execute("SELECT * FROM tools")}
+
+    summary = {'updated': [], 'unchanged': 0, 'removed': []}
+    present = set()
+    for filename in sorted(os.listdir(parameters_dir)):
+        if not filename.endswith('_para.json'):
+            continue
+        tool = filename[:-len('_para.json')]
+        present.add(tool)
+        para_file = os.path.join(parameters_dir, filename)
+        usage_file = os.path.join(parameters_dir, f"{tool}_usage.json")
+
+        row = known.get(tool)
+        signature = file_signature(para_file) + file_signature(usage_file)
+        if row is not None and signature == (row['para_mtime_ns'], row['para_size'],
+                                             row['usage_mtime_ns'], row['usage_size']):
+            summary['unchanged'] += 1
+            continue
+
+        try:
+            update_tool(conn, tool, para_file, usage_file)
+            summary['updated'].append(tool)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Warning: skipping {tool}: {str(e)}", file=sys.stderr)
+
+    for tool in set(known) - present:
+        remove_tool(conn, tool)
+        summary['removed'].append(tool)
+
+    conn.close()
+    return summary
+
+
+class ParamCatalog:
+    """Read-only access to the compiled catalog"""
+
+    def __init__(self, catalog_path=None):
+        self.conn = connect_readonly(catalog_path)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def row_to_parameter(row):
+        """Rebuild the _para.json entry shape"""
+        entry = {
+            'category': row['category'],
+            'short': row['short'],
+            'long': row['long'],
+            'needs_input': bool(row['needs_input']),
+            'description': row['description']
+        }
+        if row['extra']:
+            entry.update(json.loads(row['extra']))
+        return entry
+
+    def signature(self, tool):
+        """(para mtime, para size, usage mtime, usage size) the tool was loaded from, None if absent"""
+        row = self.conn.execute("SELECT * FROM tools WHERE name = ?", (tool,)).fetchone()
+        if row is None:
+            return None
+        return row['para_mtime_ns'], row['para_size'], row['usage_mtime_ns'], row['usage_size']
+
+    def tools(self):
+        return [row['name'] for row in self.conn.execute("SELECT name FROM tools ORDER BY name")]
+
+    def parameters(self, tool, category=None):
+        if category is None:
+            rows = self.conn.execute(
+                "SELECT * FROM parameters WHERE tool = ? ORDER BY position", (tool,))
+        else:
+            rows = self.conn.execute(
+                "SELECT * FROM parameters WHERE tool = ? AND category IS ? ORDER BY position", (tool, category))
+        return [self.row_to_parameter(row) for row in rows]
+
+    def usage(self, tool):
+        rows = self.conn.execute("SELECT text FROM usage WHERE tool = ? ORDER BY position", (tool,))
+        return [row['text'] for row in rows]
+
+    def categories(self, tool):
+        rows = self.conn.execute(
+            "SELECT category FROM parameters WHERE tool = ? GROUP BY category ORDER BY MIN(position)", (tool,))
+        return [row['category'] for row in rows]
+
+    def find_option(self, name, tool=None):
+        """Parameters whose option name (or BBTools 'key=') matches, optionally within one tool"""
+        query = "SELECT * FROM parameters WHERE (option_name = ? OR short = ?)"
+        args = [name, name]
+        if tool is not None:
+            query += " AND tool = ?"
+            args.append(tool)
+        rows = self.conn.execute(query + " ORDER BY tool, position", args)
+        return [dict(self.row_to_parameter(row), tool=row['tool']) for row in rows]
+
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] == 'build' and len(args) <= 3:
+        summary = build_catalog(*args[1:])
+        print(f"Catalog updated: {len(summary['updated'])} reloaded, "
+              f"{summary['unchanged']} unchanged, {len(summary['removed'])} removed")
+        return
+    if len(args) == 2 and args[0] == 'get':
+        with ParamCatalog() as catalog:
+            json.dump({'para': catalog.parameters(args[1]), 'usage': catalog.usage(args[1])},
+                      sys.stdout, ensure_ascii=False, separators=(',', ':'))
+        return
+
+    print("Usage: python param_catalog.py build [parameters_dir] [catalog_path]")
+    print("       python param_catalog.py get <tool>")
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Opt-in: tracing is off unless METADOCK_TRACE_DIR names a directory
+TRACE_DIR = os.environ.get('METADOCK_TRACE_DIR')
+# 'json' (default) or 'prometheus'; the JSON trace is always kept, the dashboard reads it
+TRACE_FORMAT = os.environ.get('METADOCK_TRACE_FORMAT', 'json')
+
+# File name suffixes stripped to get the tool name, longest first
+TOOL_SUFFIXES = ('_generated_help.txt', '_help.txt', '_para.json', '_usage.json', '.txt')
+
+# Stage record currently being filled, None when no stage is traced
+_current = None
+
+
+def enabled():
+    return bool(TRACE_DIR)
+
+
+def tool_name(path):
+    """Tool name from a help/parameter file path, e.g. 'help/bbduk_help.txt' -> 'bbduk'"""
+    name = os.path.basename(path)
+    for suffix in TOOL_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return os.path.splitext(name)[0]
+
+
+def count(name, n=1):
+    """Add to a counter of the stage being traced (no-op when tracing is off)"""
+    if _current is not None:
+        counters = _current['counters']
+        counters[name] = counters.get(name, 0) + n
+
+
+def note(name, value):
+    """Attach a value (e.g. the alignment engine used) to the stage being traced"""
+    if _current is not None:
+        _current['notes'][name] = value
+
+
+def peak_rss_kb():
+    """High-water mark of this process's resident memory"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+@contextmanager
+def stage(name, tool):
+    """Record wall/CPU time, peak RSS and counters of one pipeline stage for a tool"""
+    global _current
+    if not TRACE_DIR:
+        yield
+        return
+
+    record = {'counters': {}, 'notes': {}}
+    previous, _current = _current, record
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    except Exception as e:
+        record['error'] = str(e)
+        raise
+    finally:
+        _current = previous
+        record['wall_seconds'] = round(time.perf_counter() - wall_start, 6)
+        record['cpu_seconds'] = round(time.process_time() - cpu_start, 6)
+        record['peak_rss_kb'] = peak_rss_kb()
+        record['pid'] = os.getpid()
+        record['finished_at'] = datetime.now().isoformat(timespec='seconds')
+        try:
+            write_stage(tool, name, record)
+        except OSError as e:
+            # Tracing must never fail the pipeline
+            print(f"Warning: could not write trace for {tool}: {str(e)}", file=sys.stderr)
+
+
+def trace_path(tool, extension='json'):
+    return os.path.join(TRACE_DIR, f"{tool}.{extension}")
+
+
+def read_trace(tool):
+    try:
+        with open(trace_path(tool), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'tool': tool, 'stages': {}}
+
+
+def write_atomic(path, text):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def write_stage(tool, name, record):
+    """Merge one stage record into the tool's trace (each stage may run in its own process)"""
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    trace = read_trace(tool)
+    trace['stages'][name] = record
+    trace['updated_at'] = record['finished_at']
+    write_atomic(trace_path(tool), json.dumps(trace, indent=2))
+    if TRACE_FORMAT == 'prometheus':
+        write_atomic(trace_path(tool, 'prom'), prometheus_text(trace))
+
+
+def prometheus_text(trace):
+    """Trace in the Prometheus text exposition format (node_exporter textfile collector)"""
+    tool = trace['tool']
+    gauges = (
+        ('wall_seconds', 'Wall time of a help pipeline stage'),
+        ('cpu_seconds', 'CPU time of a help pipeline stage'),
+        ('peak_rss_kb', 'Peak resident memory of the process that ran the stage'),
+    )
+    lines = []
+    for field, description in gauges:
+        metric = f"metadock_help_stage_{field}"
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} gauge")
+        for name, record in trace['stages'].items():
+            if record.get(field) is not None:
+                lines.append(f'{metric}{{tool="{tool}",stage="{name}"}} {record[field]}')
+
+    metric = 'metadock_help_stage_count'
+    lines.append(f"# HELP {metric} Lines, blocks and matcher calls handled by a help pipeline stage")
+    lines.append(f"# TYPE {metric} gauge")
+    for name, record in trace['stages'].items():
+        for counter, value in sorted(record['counters'].items()):
+            lines.append(f'{metric}{{tool="{tool}",stage="{name}",counter="{counter}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    if len(sys.argv) != 2 or not TRACE_DIR:
+        print("Usage: METADOCK_TRACE_DIR=<dir> python pipeline_trace.py <tool>")
+        sys.exit(1)
+    json.dump(read_trace(sys.argv[1]), sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import random
+import sys
+
+# Options in one "1x" synthetic page, roughly the size of the real pages in help_pages_for_test/
+BASE_OPTIONS = 20
+OPTIONS_PER_CATEGORY = 25
+STYLES = ('argparse', 'getopt', 'bbtools')
+
+WORDS = (
+    'read', 'reads', 'file', 'output', 'input', 'quality', 'trim', 'adapter', 'length',
+    'threshold', 'sample', 'genome', 'kmer', 'memory', 'threads', 'minimum', 'maximum',
+    'paired', 'fastq', 'fasta', 'database', 'index', 'score', 'filter', 'report', 'mode',
+    'alignment', 'contig', 'coverage', 'taxonomy', 'marker', 'bins', 'directory', 'format',
+)
+METAVARS = ('FILE', 'INT', 'FLOAT', 'DIR', 'STR', 'N')
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def wrap(text, indent, width=79):
+    """Greedy wrap with a fixed indent, like argparse help output"""
+    lines, current = [], ''
+    for word in text.split():
+        if current and len(indent) + len(current) + 1 + len(word) > width:
+            lines.append(indent + current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        lines.append(indent + current)
+    return lines
+
+
+def argparse_page(rng, options, prog):
+    lines = [f"usage: {prog} [-h] [-i INPUT] [-o OUTPUT] [options]", '',
+             sentence(rng, 12), '']
+    for k in range(options):
+        if k % OPTIONS_PER_CATEGORY == 0:
+            if k:
+                lines.append('')
+            lines.append('optional arguments:' if k == 0 else f"group {k // OPTIONS_PER_CATEGORY} arguments:")
+        name = f"option_{k}"
+        metavar = rng.choice(METAVARS)
+        description = sentence(rng, rng.randint(6, 30))
+        if k % 5 == 0:
+            description += f" (default: {rng.randint(1, 100)})"
+        lines.append(f"  -{chr(97 + k % 26)}{k} {metavar}, --{name} {metavar}")
+        lines.extend(wrap(description, ' ' * 24))
+    return lines
+
+
+def getopt_page(rng, options, prog):
+    lines = [f"Usage: {prog} [options] <input>", '']
+    for k in range(options):
+        if k % OPTIONS_PER_CATEGORY == 0:
+            if k:
+                lines.append('')
+            lines.append(f"Section {k // OPTIONS_PER_CATEGORY + 1}:")
+        flag = f"--opt{k}"
+        if rng.random() < 0.5:
+            flag += f" <{rng.choice(METAVARS).lower()}>"
+        description = sentence(rng, rng.randint(6, 24))
+        head = f"  -{chr(97 + k % 26)}, {flag}"
+        wrapped = wrap(description, ' ' * 30)
+        if len(head) < 28:
+            lines.append(head.ljust(30) + wrapped[0].lstrip())
+            lines.extend(wrapped[1:])
+        else:
+            lines.append(head)
+            lines.extend(wrapped)
+    return lines
+
+
+def bbtools_page(rng, options, prog):
+    lines = [f"Usage:  {prog} in=<input file> out=<output file>", '',
+             sentence(rng, 14), '']
+    for k in range(options):
+        if k % OPTIONS_PER_CATEGORY == 0:
+            if k:
+                lines.append('')
+            lines.append(f"Parameter group {k // OPTIONS_PER_CATEGORY + 1}:")
+        value = rng.choice(('t', 'f', str(rng.randint(0, 64)), '<file>'))
+        head = f"key{k}={value}"
+        wrapped = wrap(sentence(rng, rng.randint(6, 24)), ' ' * 20)
+        lines.append(head.ljust(20) + wrapped[0].lstrip())
+        lines.extend(wrapped[1:])
+    lines.extend(['', 'Java Parameters:',
+                  '-Xmx                Set java memory usage, overriding autodetection.'])
+    return lines
+
+
+PAGE_BUILDERS = {
+    'argparse': argparse_page,
+    'getopt': getopt_page,
+    'bbtools': bbtools_page,
+}
+
+
+def generate_help_page(style, scale, seed=0):
+    """Synthetic help text in the given style, BASE_OPTIONS * scale options long"""
+    if style not in PAGE_BUILDERS:
+        raise ValueError(f"Unknown help style: {style}")
+    rng = random.Random(f"{style}:{scale}:{seed}")
+    lines = PAGE_BUILDERS[style](rng, BASE_OPTIONS * scale, f"synthetic_{style}")
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] not in PAGE_BUILDERS:
+        print(f"Usage: python synthetic_help.py <{'|'.join(STYLES)}> <scale>")
+        sys.exit(1)
+    sys.stdout.write(generate_help_page(sys.argv[1], int(sys.argv[2])))
+
+
+if __name__ == '__main__':
+    main()
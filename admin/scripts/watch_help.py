@@ -0,0 +1,427 @@
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+import compare_help_html
+import incremental_parse
+import json_to_help
+import param
+import param_catalog
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+DEFAULT_HELP_DIR = os.path.join(ROOT_DIR, 'help')
+DEFAULT_PARAMETERS_DIR = os.path.join(ROOT_DIR, 'parameters')
+DEFAULT_TEST_PAGES_DIR = os.path.join(ROOT_DIR, 'help_pages_for_test')
+# Artifacts of test pages must not overwrite the ones the app serves
+DEFAULT_TEST_OUTPUT_DIR = os.path.join(ROOT_DIR, 'temp', 'help_watch')
+DEFAULT_NOTIFY_URL = os.environ.get(
+    'METADOCK_WATCH_NOTIFY', f"http://127.0.0.1:{os.environ.get('PORT', 3010)}/admin/hooks/help-updated")
+WATCH_TOKEN = os.environ.get('METADOCK_WATCH_TOKEN')
+# Without METADOCK_WATCH_TOKEN the server generates the hook token and writes it here
+DEFAULT_TOKEN_FILE = os.path.join(ROOT_DIR, 'cache', 'watch_token')
+# An upload processing a tool claims it here; the watcher leaves claimed tools alone
+DEFAULT_CLAIMS_DIR = os.path.join(ROOT_DIR, 'cache', 'help_claims')
+# A claim older than this was left by an upload that never finished
+CLAIM_TTL = 600
+
+# Pipeline stages in order; a change re-runs its stage and everything after it
+STAGES = ('parse', 'render', 'compare')
+
+# inotify event bits (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE_SELF = 0x00000400
+IN_NONBLOCK = 0x00000800
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class Target:
+    """Source and artifact paths of one watched tool"""
+
+    def __init__(self, tool, help_file, para_file, usage_file, output_dir, notify):
+        self.tool = tool
+        self.help_file = help_file
+        self.para_file = para_file
+        self.usage_file = usage_file
+        self.generated_help_file = os.path.join(output_dir, f"{tool}_generated_help.txt")
+        self.comparison_file = os.path.join(output_dir, f"{tool}_comparison.html")
+        # Only tools the app serves are reported to the Node server
+        self.notify = notify
+
+    def outputs(self):
+        return (self.para_file, self.usage_file, self.generated_help_file, self.comparison_file)
+
+
+class Layout:
+    """Maps a changed file to the tool it belongs to and the first stage to re-run"""
+
+    def __init__(self, help_dir, parameters_dir, test_pages_dir, test_output_dir):
+        self.help_dir = os.path.abspath(help_dir)
+        self.parameters_dir = os.path.abspath(parameters_dir)
+        self.test_pages_dir = os.path.abspath(test_pages_dir) if test_pages_dir else None
+        self.test_output_dir = os.path.abspath(test_output_dir)
+
+    def directories(self):
+        return [d for d in (self.help_dir, self.parameters_dir, self.test_pages_dir) if d and os.path.isdir(d)]
+
+    def app_target(self, tool):
+        return Target(tool, os.path.join(self.help_dir, f"{tool}_help.txt"),
+                      os.path.join(self.parameters_dir, f"{tool}_para.json"),
+                      os.path.join(self.parameters_dir, f"{tool}_usage.json"),
+                      self.help_dir, notify=True)
+
+    def test_target(self, tool):
+        return Target(tool, os.path.join(self.test_pages_dir, f"{tool}.txt"),
+                      os.path.join(self.test_output_dir, f"{tool}_para.json"),
+                      os.path.join(self.test_output_dir, f"{tool}_usage.json"),
+                      self.test_output_dir, notify=False)
+
+    def classify(self, path):
+        """(target, stage) for a changed file, None for files that are not pipeline inputs"""
+        directory, name = os.path.split(os.path.abspath(path))
+        if directory == self.help_dir:
+            if name.endswith('_help.txt') and not name.endswith('_generated_help.txt'):
+                return self.app_target(name[:-len('_help.txt')]), 'parse'
+        elif directory == self.parameters_dir:
+            # Admin edits of the parameter JSON only need the later stages
+            for suffix in ('_para.json', '_usage.json'):
+                if name.endswith(suffix):
+                    target = self.app_target(name[:-len(suffix)])
+                    if os.path.exists(target.help_file):
+                        return target, 'render'
+        elif directory == self.test_pages_dir:
+            if name.endswith('.txt'):
+                return self.test_target(name[:-len('.txt')]), 'parse'
+        return None
+
+    def sources(self):
+        """Help pages present at start-up, for the incremental parse baseline"""
+        for directory in (self.help_dir, self.test_pages_dir):
+            if directory and os.path.isdir(directory):
+                for name in sorted(os.listdir(directory)):
+                    path = os.path.join(directory, name)
+                    found = self.classify(path)
+                    if found and found[1] == 'parse':
+                        yield path
+
+
+class InotifyWatcher:
+    """Directory watch through the kernel's inotify (Linux, via ctypes)"""
+
+    def __init__(self, directories):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError('libc not found')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError('inotify is not available')
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.directories = {}
+        # Editors that save through a rename produce IN_MOVED_TO instead of IN_CLOSE_WRITE
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+            self.directories[wd] = directory
+
+    def wait(self, timeout):
+        """Paths written since the last call, waiting up to timeout seconds (None: forever)"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_DELETE_SELF:
+                print(f"Warning: watched directory removed: {self.directories.get(wd)}", file=sys.stderr)
+            elif name and wd in self.directories:
+                paths.append(os.path.join(self.directories[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback for systems without inotify: compares file signatures every interval"""
+
+    def __init__(self, directories, interval=1.0):
+        self.directories = directories
+        self.interval = interval
+        self.signatures = self.scan()
+
+    def scan(self):
+        signatures = {}
+        for directory in self.directories:
+            try:
+                names = os.listdir(directory)
+            except FileNotFoundError:
+                continue
+            for name in names:
+                path = os.path.join(directory, name)
+                signature = param_catalog.file_signature(path)
+                if signature[0] is not None:
+                    signatures[path] = signature
+        return signatures
+
+    def wait(self, timeout):
+        time.sleep(self.interval if timeout is None else min(self.interval, timeout))
+        signatures = self.scan()
+        changed = [path for path, signature in signatures.items() if self.signatures.get(path) != signature]
+        self.signatures = signatures
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(directories, polling=False, interval=1.0):
+    if not polling:
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({str(e)}), polling every {interval}s", file=sys.stderr)
+    return PollingWatcher(directories, interval)
+
+
+def watch_token(token_file=DEFAULT_TOKEN_FILE):
+    """Hook token: METADOCK_WATCH_TOKEN, else the one the running server wrote"""
+    if WATCH_TOKEN:
+        return WATCH_TOKEN
+    try:
+        with open(token_file, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def notify_server(url, payload):
+    """Tell the Node server a tool's artifacts changed so it reloads the tool's config entry"""
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'), method='POST',
+                                     headers={'Content-Type': 'application/json'})
+    # Read on every call: the server writes a new token each time it starts
+    token = watch_token()
+    if token:
+        request.add_header('X-Metadock-Watch-Token', token)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError) as e:
+        # The server may simply not be running; artifacts on disk are still current
+        print(f"Warning: could not notify {url}: {str(e)}", file=sys.stderr)
+        return False
+
+
+class HelpWatcher:
+    """Debounces changes per tool and re-runs the stages they affect"""
+
+    def __init__(self, layout, watcher, debounce=0.5, notify_url=None, full=False, update_catalog=True,
+                 claims_dir=DEFAULT_CLAIMS_DIR):
+        self.layout = layout
+        self.watcher = watcher
+        self.debounce = debounce
+        self.notify_url = notify_url
+        self.full = full
+        self.update_catalog = update_catalog
+        # tool key -> [target, first stage, due time]
+        self.pending = {}
+        # File signatures of artifacts written here, so our own writes do not trigger runs
+        self.written = {}
+        # Tools an upload is processing: tool key -> target, until the claim is released
+        self.claims_dir = claims_dir
+        self.claimed = {}
+        # Last seen text of each help page: the baseline of the incremental parse
+        self.snapshots = {}
+        for path in layout.sources():
+            self.snapshots[path] = read_text(path)
+
+    def is_claimed(self, target):
+        """True while an upload processes the tool (only tools the app serves are uploaded)"""
+        if not target.notify:
+            return False
+        try:
+            age = time.time() - os.path.getmtime(os.path.join(self.claims_dir, target.tool))
+        except OSError:
+            return False
+        return age < CLAIM_TTL
+
+    def release(self, key):
+        """Adopt what a finished upload wrote, so its files do not trigger a second run"""
+        target = self.claimed.pop(key, None)
+        if target is None:
+            return
+        if os.path.exists(target.help_file):
+            self.snapshots[target.help_file] = read_text(target.help_file)
+        for path in (target.help_file,) + target.outputs():
+            self.written[path] = param_catalog.file_signature(path)
+
+    def queue(self, path):
+        found = self.layout.classify(path)
+        if not found or not os.path.exists(path):
+            return
+        target, stage = found
+        key = (target.help_file, target.tool)
+        if self.is_claimed(target):
+            self.claimed[key] = target
+            self.pending.pop(key, None)
+            return
+        self.release(key)
+        if self.written.get(path) == param_catalog.file_signature(path):
+            return
+        due = time.monotonic() + self.debounce
+        if key in self.pending:
+            entry = self.pending[key]
+            entry[1] = min(entry[1], stage, key=STAGES.index)
+            entry[2] = due
+        else:
+            self.pending[key] = [target, stage, due]
+
+    def run_due(self):
+        for key, target in list(self.claimed.items()):
+            if not self.is_claimed(target):
+                self.release(key)
+        now = time.monotonic()
+        for key, (target, stage, due) in list(self.pending.items()):
+            if due <= now:
+                del self.pending[key]
+                if self.is_claimed(target):
+                    self.claimed[key] = target
+                else:
+                    self.run(target, stage)
+
+    def timeout(self):
+        # Claimed tools are looked at again shortly so a released claim is adopted promptly
+        claim_poll = self.debounce if self.claimed else None
+        if not self.pending:
+            return claim_poll
+        due = max(0.0, min(entry[2] for entry in self.pending.values()) - time.monotonic())
+        return due if claim_poll is None else min(due, claim_poll)
+
+    def run(self, target, first_stage):
+        stages = STAGES[STAGES.index(first_stage):]
+        start = time.perf_counter()
+        result = {'tool': target.tool, 'stages': list(stages), 'success': False, 'error': None}
+        try:
+            os.makedirs(os.path.dirname(target.comparison_file), exist_ok=True)
+            if 'parse' in stages:
+                result['changes'] = self.parse(target)
+            if not json_to_help.json_to_help(target.para_file, target.usage_file, target.generated_help_file):
+                raise RuntimeError('Failed to render help from parameter JSON')
+            if not compare_help_html.process_help_file(target.help_file, target.generated_help_file,
+                                                       target.comparison_file, para_file=target.para_file,
+                                                       usage_file=target.usage_file, full=self.full):
+                raise RuntimeError('Failed to generate comparison report')
+            if self.update_catalog and target.notify:
+                refresh_catalog(target)
+            result['success'] = True
+        except Exception as e:
+            result['error'] = f"{type(e).__name__}: {str(e)}"
+        finally:
+            for path in target.outputs():
+                self.written[path] = param_catalog.file_signature(path)
+
+        result['seconds'] = round(time.perf_counter() - start, 3)
+        status = 'ok' if result['success'] else f"FAILED ({result['error']})"
+        print(f"{target.tool}: {' -> '.join(stages)} in {result['seconds']:.3f}s {status}", flush=True)
+        if target.notify and self.notify_url:
+            notify_server(self.notify_url, result)
+        return result
+
+    def parse(self, target):
+        """Parse the changed page; a page parsed before is merged to keep admin edits"""
+        text = read_text(target.help_file)
+        previous = self.snapshots.get(target.help_file)
+        self.snapshots[target.help_file] = text
+        if previous is None or not os.path.exists(target.para_file):
+            param.process_help_file(target.help_file, target.para_file, target.usage_file)
+            return None
+
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='_help.txt', delete=False) as f:
+            f.write(previous)
+            previous_file = f.name
+        try:
+            changes = incremental_parse.incremental_update(previous_file, target.help_file,
+                                                           target.para_file, target.usage_file)
+        finally:
+            os.unlink(previous_file)
+        return changes['summary']
+
+    def serve(self):
+        print(f"Watching {', '.join(self.layout.directories())} ({type(self.watcher).__name__})", flush=True)
+        try:
+            while True:
+                for path in self.watcher.wait(self.timeout()):
+                    self.queue(path)
+                self.run_due()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.watcher.close()
+
+
+def read_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def refresh_catalog(target):
+    try:
+        conn = param_catalog.connect()
+        try:
+            param_catalog.update_tool(conn, target.tool, target.para_file, target.usage_file)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Warning: could not update parameter catalog for {target.tool}: {str(e)}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Regenerate help artifacts when help pages or parameter JSON change')
+    parser.add_argument('--help-dir', default=DEFAULT_HELP_DIR, help='directory of <tool>_help.txt pages')
+    parser.add_argument('--parameters-dir', default=DEFAULT_PARAMETERS_DIR, help='directory of <tool>_para.json files')
+    parser.add_argument('--test-pages-dir', default=DEFAULT_TEST_PAGES_DIR,
+                        help='directory of <tool>.txt test pages (empty string to skip)')
+    parser.add_argument('--test-output-dir', default=DEFAULT_TEST_OUTPUT_DIR, help='where test page artifacts go')
+    parser.add_argument('--debounce', type=float, default=0.5, help='seconds without changes before a tool is rebuilt')
+    parser.add_argument('--poll', action='store_true', help='poll file signatures instead of using inotify')
+    parser.add_argument('--interval', type=float, default=1.0, help='polling interval in seconds')
+    parser.add_argument('--notify-url', default=DEFAULT_NOTIFY_URL, help='Node hook told about rebuilt tools')
+    parser.add_argument('--no-notify', action='store_true', help='do not notify the Node server')
+    parser.add_argument('--full', action='store_true', help='always write the full comparison report')
+    args = parser.parse_args()
+
+    layout = Layout(args.help_dir, args.parameters_dir, args.test_pages_dir or None, args.test_output_dir)
+    directories = layout.directories()
+    if not directories:
+        print("Error: none of the watched directories exist", file=sys.stderr)
+        sys.exit(1)
+
+    watcher = open_watcher(directories, args.poll, args.interval)
+    HelpWatcher(layout, watcher, args.debounce, None if args.no_notify else args.notify_url, args.full).serve()
+
+
+if __name__ == '__main__':
+    main()
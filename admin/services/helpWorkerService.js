@@ -0,0 +1,143 @@
+// services/helpWorkerService.js
+const { spawn } = require('child_process');
+const readline = require('readline');
+const adminConfig = require('../config/adminConfig');
+
+// Long-lived Python process that loads param.py, json_to_help.py and
+// compare_help_html.py once and answers JSON-RPC requests over stdin/stdout
+class HelpWorkerService {
+    // timeout: milliseconds a request may wait for its response (queue time included)
+    constructor(scriptPath, pythonCommand = 'python', timeout = 10 * 60 * 1000) {
+        this.scriptPath = scriptPath;
+        this.pythonCommand = pythonCommand;
+        this.timeout = timeout;
+        this.child = null;
+        this.nextId = 1;
+        this.pending = new Map();
+    }
+
+    // start the worker if it is not already running
+    start() {
+        if (this.child) {
+            return this.child;
+        }
+
+        console.log('Starting help worker:', this.scriptPath);
+        // traces go where the admin trace route reads them
+        const env = { ...process.env };
+        if (adminConfig.paths.traceDir) {
+            env.METADOCK_TRACE_DIR = adminConfig.paths.traceDir;
+        }
+
+        const child = spawn(this.pythonCommand, [this.scriptPath], {
+            stdio: ['pipe', 'pipe', 'pipe'],
+            env
+        });
+
+        const lines = readline.createInterface({ input: child.stdout });
+        lines.on('line', (line) => this.handleResponse(line));
+
+        child.stderr.on('data', (data) => {
+            console.error('help worker stderr:', data.toString());
+        });
+
+        child.on('exit', (code, signal) => {
+            console.warn(`Help worker exited (code: ${code}, signal: ${signal || 'None'})`);
+            this.handleExit(child, new Error('Help worker exited before responding'));
+        });
+
+        // a command that cannot be spawned (e.g. ENOENT) emits 'error' and never 'exit'
+        child.on('error', (err) => {
+            console.error('Help worker error:', err);
+            this.handleExit(child, new Error(`Help worker failed: ${err.message}`));
+        });
+
+        child.stdin.on('error', (err) => {
+            console.error('Help worker stdin error:', err);
+            child.kill();
+            this.handleExit(child, new Error(`Help worker stopped reading requests: ${err.message}`));
+        });
+
+        this.child = child;
+        return child;
+    }
+
+    // forget a worker that is gone and fail its in-flight requests; the next call restarts it
+    handleExit(child, error) {
+        if (this.child !== child) {
+            return;
+        }
+        this.child = null;
+        for (const { reject, timer } of this.pending.values()) {
+            clearTimeout(timer);
+            reject(error);
+        }
+        this.pending.clear();
+    }
+
+    handleResponse(line) {
+        let response;
+        try {
+            response = JSON.parse(line);
+        } catch (error) {
+            console.error('Invalid help worker response:', line);
+            return;
+        }
+
+        const request = this.pending.get(response.id);
+        if (!request) {
+            return;
+        }
+        this.pending.delete(response.id);
+        clearTimeout(request.timer);
+
+        if (response.error) {
+            request.reject(new Error(response.error.message));
+        } else {
+            request.resolve(response.result);
+        }
+    }
+
+    // send one request and wait for its response, at most timeout milliseconds
+    call(method, params = {}, timeout = this.timeout) {
+        const child = this.start();
+        const id = this.nextId++;
+
+        return new Promise((resolve, reject) => {
+            const timer = setTimeout(() => {
+                this.pending.delete(id);
+                reject(new Error(`Help worker did not answer ${method} within ${timeout} ms`));
+            }, timeout);
+            this.pending.set(id, { resolve, reject, timer });
+            child.stdin.write(JSON.stringify({ jsonrpc: '2.0', id, method, params }) + '\n');
+        });
+    }
+
+    // run param -> json_to_help -> compare_help_html for one tool
+    process(paths) {
+        return this.call('process', paths);
+    }
+
+    // regenerate generated help and comparison from existing parameter files
+    render(paths) {
+        return this.call('render', paths);
+    }
+
+    // requests are answered one at a time; true while some are waiting
+    busy() {
+        return this.pending.size > 0;
+    }
+
+    // a tool's { para, usage } from the compiled parameter catalog
+    lookup(paths, timeout = this.timeout) {
+        return this.call('lookup', paths, timeout);
+    }
+
+    stop() {
+        if (this.child) {
+            this.child.stdin.end(JSON.stringify({ jsonrpc: '2.0', id: 0, method: 'shutdown' }) + '\n');
+        }
+    }
+}
+
+module.exports = new HelpWorkerService(adminConfig.scripts.helpWorker);
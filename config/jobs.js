@@ -0,0 +1,39 @@
+const path = require('path');
+
+// Job queue for tool commands (handlers/jobQueue.js)
+module.exports = {
+  // Jobs running at once on the remote host, all users together
+  maxConcurrent: parseInt(process.env.METADOCK_MAX_JOBS) || 4,
+  // Jobs running at once per user (SSH login)
+  maxPerUser: parseInt(process.env.METADOCK_MAX_JOBS_PER_USER) || 2,
+  // Priority of jobs whose tool entry sets none; higher runs first
+  defaultPriority: 0,
+  // Highest priority an admin may give a job
+  maxPriority: 10,
+  // Queue state, kept across restarts (credentials are never written)
+  stateFile: path.join(__dirname, '..', 'cache', 'jobs.json'),
+  // Finished jobs kept in the list
+  keepFinished: 200,
+  // Seconds between SIGTERM and closing the channel when a job is cancelled
+  cancelGrace: 10,
+  // Batch runs: one job per sample of a directory (handlers/batchRuns.js)
+  batch: {
+    // File names a batch picks up when the request gives no pattern
+    defaultPattern: '*.{fastq,fq}{,.gz}',
+    // Jobs of one batch running at once, unless the request asks for fewer
+    maxParallel: parseInt(process.env.METADOCK_BATCH_PARALLEL) || 4,
+    // Samples one batch may contain
+    maxSamples: 1000,
+    // Batches (with their per-sample results) kept across restarts
+    stateFile: path.join(__dirname, '..', 'cache', 'batches.json'),
+    keepBatches: 50
+  },
+  // Workflow runs: the steps of config/workflows.js per sample (handlers/workflowRuns.js)
+  workflow: {
+    // Steps of one run running at once, unless the request asks for fewer
+    maxParallel: parseInt(process.env.METADOCK_WORKFLOW_PARALLEL) || 4,
+    // Runs (with the state of every step) kept across restarts
+    stateFile: path.join(__dirname, '..', 'cache', 'workflows.json'),
+    keepRuns: 50
+  }
+};
@@ -0,0 +1,85 @@
+// Workflows chaining the tools of config/tools.js (handlers/workflowRuns.js)
+//
+// Every step runs once per sample. In a step:
+//   tool     key of config/tools.js
+//   params   options of the tool's para.json: value, [values] or true for a flag
+//   args     positional arguments, after the options
+//   outputs  name -> option of params whose value is the output path, or a path;
+//            a path ending in '/' is a directory created before the step runs,
+//            which counts as made once it is not empty
+//   after    steps to wait for without using their outputs
+// Values may use {sample}, {workdir} (the run's work directory), {input.<name>}
+// (files of the sample, named by `inputs`) and {<step>.<output>}; a step
+// referring to another step's output runs after it. A step is skipped while
+// its outputs exist, its inputs are older and its command is unchanged.
+module.exports = {
+  "reads_qc_profile": {
+    "title": "Read QC, adapter trimming and taxonomic profiling",
+    "inputs": ["r1", "r2"],
+    "steps": {
+      "qc": {
+        "tool": "fastqc_v0.12.1",
+        "params": { "--outdir": "{workdir}/{sample}/fastqc/" },
+        "args": ["{input.r1}", "{input.r2}"],
+        "outputs": { "reports": "--outdir" }
+      },
+      "trim": {
+        "tool": "cutadapt_v2.6",
+        "params": {
+          "-a": "AGATCGGAAGAGCACACGTCTGAACTCCAGTCA",
+          "-A": "AGATCGGAAGAGCGTCGTGTAGGGAAAGAGTGT",
+          "-m": "50",
+          "-o": "{workdir}/{sample}/trimmed_R1.fastq.gz",
+          "-p": "{workdir}/{sample}/trimmed_R2.fastq.gz"
+        },
+        "args": ["{input.r1}", "{input.r2}"],
+        "outputs": { "r1": "-o", "r2": "-p" }
+      },
+      "profile": {
+        "tool": "metaphlan_v4.1.1",
+        "params": {
+          "--input_type": "fastq",
+          "--bowtie2out": "{workdir}/{sample}/metaphlan.bowtie2.bz2",
+          "-o": "{workdir}/{sample}/metaphlan_profile.txt"
+        },
+        "args": ["{trim.r1},{trim.r2}"],
+        "outputs": { "mapping": "--bowtie2out", "profile": "-o" }
+      }
+    }
+  },
+  "genome_annotation": {
+    "title": "Assembly, annotation and taxonomic classification",
+    "inputs": ["r1", "r2"],
+    "steps": {
+      "assemble": {
+        "tool": "metaspades_v4.2.0",
+        "params": {
+          "-1": "{input.r1}",
+          "-2": "{input.r2}",
+          "-o": "{workdir}/{sample}/metaspades"
+        },
+        "outputs": { "dir": "-o", "contigs": "{workdir}/{sample}/metaspades/contigs.fasta" }
+      },
+      "annotate": {
+        "tool": "bakta_v1.11.0",
+        "params": {
+          "--output": "{workdir}/{sample}/bakta",
+          "--prefix": "{sample}",
+          "--force": true
+        },
+        "args": ["{assemble.contigs}"],
+        "outputs": { "dir": "--output", "genome": "{workdir}/{sample}/bakta/{sample}.fna" }
+      },
+      "classify": {
+        "tool": "gtdbtk_classify_wf_v2.4.0",
+        "params": {
+          "--genome_dir": "{annotate.dir}",
+          "--extension": "fna",
+          "--skip_ani_screen": true,
+          "--out_dir": "{workdir}/{sample}/gtdbtk"
+        },
+        "outputs": { "dir": "--out_dir" }
+      }
+    }
+  }
+};
@@ -0,0 +1,379 @@
+const crypto = require('crypto');
+const fs = require('fs').promises;
+const path = require('path');
+const toolsConfig = require('../config/tools');
+const jobsConfig = require('../config/jobs');
+const jobQueue = require('./jobQueue');
+const sshPool = require('./sshPool');
+
+const FINISHED_STATES = new Set(['succeeded', 'failed', 'cancelled', 'interrupted']);
+
+// Removed from a file name to name its sample
+const FASTQ_EXTENSION = /\.(fastq|fq)(\.gz)?$/i;
+// Read mate of paired files: sample_R1_001.fastq.gz, sample_1.fq, sample.R2.fastq
+const MATE_MARKER = /[._-]R?([12])(_001)?$/i;
+// Placeholders of a command template
+const PLACEHOLDER = /\{(input|r1|r2|sample|dir)\}/g;
+
+// Shell glob for one path component: * ? [abc] {a,b}
+function globToRegExp(pattern) {
+  let source = '';
+  let braces = 0;
+  for (let i = 0; i < pattern.length; i++) {
+    const char = pattern[i];
+    if (char === '*') {
+      source += '[^/]*';
+    } else if (char === '?') {
+      source += '[^/]';
+    } else if (char === '[' && pattern.indexOf(']', i + 2) !== -1) {
+      const end = pattern.indexOf(']', i + 2);
+      const set = pattern.slice(i + 1, end).replace(/\\/g, '\\\\');
+      source += set[0] === '!' ? `[^${set.slice(1)}]` : `[${set}]`;
+      i = end;
+    } else if (char === '{') {
+      braces++;
+      source += '(?:';
+    } else if (char === '}' && braces > 0) {
+      braces--;
+      source += ')';
+    } else if (char === ',' && braces > 0) {
+      source += '|';
+    } else {
+      source += char.replace(/[.+^$()|\\{}]/g, '\\$&');
+    }
+  }
+  if (braces > 0) {
+    throw Object.assign(new Error(`Unbalanced braces in pattern: ${pattern}`), { status: 400 });
+  }
+  return new RegExp(`^${source}$`);
+}
+
+function shellQuote(value) {
+  return `'${String(value).replace(/'/g, `'\\''`)}'`;
+}
+
+// 'reads/*.fq.gz' relative to directory -> ['/data/reads', '*.fq.gz']
+function splitPattern(directory, pattern) {
+  const dir = path.posix.resolve('/', directory || '/', path.posix.dirname(pattern));
+  if (/[*?[{]/.test(dir)) {
+    throw Object.assign(new Error('Patterns match file names only, not directories'), { status: 400 });
+  }
+  return [dir, path.posix.basename(pattern)];
+}
+
+// Files of a sample, in mate order when paired; files that miss their mate are returned apart,
+// and files that name the same sample (and mate), e.g. a.fastq and a.fastq.gz, as conflicts
+function groupSamples(filenames, paired) {
+  const samples = new Map();
+  const slots = new Map();
+  for (const filename of filenames) {
+    let name = filename.replace(FASTQ_EXTENSION, '');
+    let mate = 0;
+    const marker = paired && name.match(MATE_MARKER);
+    if (marker) {
+      name = name.slice(0, marker.index);
+      mate = parseInt(marker[1]) - 1;
+    }
+    if (!samples.has(name)) {
+      samples.set(name, []);
+    }
+    samples.get(name)[mate] = filename;
+    const slot = `${name}\0${mate}`;
+    slots.set(slot, [...(slots.get(slot) || []), filename]);
+  }
+
+  const complete = [];
+  const unpaired = [];
+  for (const [sample, files] of samples) {
+    if (paired && !(files[0] && files[1])) {
+      unpaired.push(...files.filter(Boolean));
+    } else {
+      complete.push({ sample, files });
+    }
+  }
+  const conflicts = [...slots.values()].filter(files => files.length > 1);
+  return { samples: complete, unpaired, conflicts };
+}
+
+// Fill a command template for one sample; every value is shell-quoted
+function renderCommand(template, directory, sample, files) {
+  const paths = files.map(file => path.posix.join(directory, file));
+  const values = {
+    input: paths.map(shellQuote).join(' '),
+    r1: shellQuote(paths[0]),
+    r2: paths[1] ? shellQuote(paths[1]) : '',
+    sample: shellQuote(sample),
+    dir: shellQuote(directory)
+  };
+  return template.replace(PLACEHOLDER, (match, name) => values[name]);
+}
+
+async function listFiles(connectionDetails, directory, regexp) {
+  const list = await sshPool.withSftp(connectionDetails, (sftp) => new Promise((resolve, reject) => {
+    sftp.readdir(directory, (err, list) => err ? reject(err) : resolve(list));
+  }));
+  return list
+    .filter(file => !file.filename.startsWith('.') && file.attrs.isFile() && regexp.test(file.filename))
+    .map(file => file.filename)
+    .sort((a, b) => a.localeCompare(b, undefined, { numeric: true }));
+}
+
+// Samples of a directory: { directory, pattern, paired }
+// -> { directory, pattern, samples: [{ sample, files }], unpaired }
+async function listSamples({ directory, pattern, paired = false }, connectionDetails) {
+  const [dir, filePattern] = splitPattern(directory, pattern || jobsConfig.batch.defaultPattern);
+  const files = await listFiles(connectionDetails, dir, globToRegExp(filePattern));
+  const { samples, unpaired, conflicts } = groupSamples(files, paired);
+  if (conflicts.length) {
+    const names = conflicts.map(files => files.join(' and ')).join('; ');
+    throw Object.assign(new Error(`Files name the same sample: ${names}`), { status: 400 });
+  }
+  if (!samples.length) {
+    throw Object.assign(new Error(`No ${paired ? 'paired ' : ''}files match ${filePattern} in ${dir}`), { status: 400 });
+  }
+  if (samples.length > jobsConfig.batch.maxSamples) {
+    throw Object.assign(new Error(`${samples.length} samples, at most ${jobsConfig.batch.maxSamples} at once`), { status: 400 });
+  }
+  return { directory: dir, pattern: filePattern, samples, unpaired };
+}
+
+// One command per sample of a directory: { tool, directory, pattern, paired, template }
+// -> { directory, samples: [{ sample, files, command }], unpaired }
+async function planBatch({ tool, directory, pattern, paired = false, template }, connectionDetails) {
+  if (!toolsConfig[tool]) {
+    throw Object.assign(new Error(`Unknown tool: ${tool}`), { status: 404 });
+  }
+  if (typeof template !== 'string' || !template.trim()) {
+    throw Object.assign(new Error('Command template is required'), { status: 400 });
+  }
+  const placeholders = new Set([...template.matchAll(PLACEHOLDER)].map(match => match[1]));
+  if (!paired && placeholders.has('r2')) {
+    throw Object.assign(new Error('{r2} needs paired samples'), { status: 400 });
+  }
+  // Without an input placeholder the files go last, as positional arguments
+  if (!['input', 'r1', 'r2'].some(name => placeholders.has(name))) {
+    template = `${template.trim()} {input}`;
+  }
+
+  const { directory: dir, pattern: filePattern, samples, unpaired } = await listSamples(
+    { directory, pattern, paired }, connectionDetails);
+  for (const sample of samples) {
+    sample.command = renderCommand(template, dir, sample.sample, sample.files);
+  }
+  return { directory: dir, pattern: filePattern, paired, template, samples, unpaired };
+}
+
+// Batches and the outcome of their samples; live state comes from the job queue,
+// results are copied here when a job finishes so they outlive the queue's history
+class BatchStore {
+  constructor(options = jobsConfig.batch) {
+    this.options = options;
+    this.batches = new Map();
+    this.saving = Promise.resolve();
+    this.loaded = this.load();
+    jobQueue.on('finish', (job) => this.record(job));
+  }
+
+  async load() {
+    try {
+      const state = JSON.parse(await fs.readFile(this.options.stateFile, 'utf8'));
+      for (const batch of state.batches || []) {
+        this.batches.set(batch.id, batch);
+      }
+    } catch (error) {
+      if (error.code !== 'ENOENT') {
+        console.error('Error reading batch state:', error);
+      }
+    }
+  }
+
+  save() {
+    const batches = [...this.batches.values()];
+    this.saving = this.saving.then(async () => {
+      const file = this.options.stateFile;
+      await fs.mkdir(path.dirname(file), { recursive: true });
+      await fs.writeFile(`${file}.tmp`, JSON.stringify({ batches }, null, 2));
+      await fs.rename(`${file}.tmp`, file);
+    }).catch((error) => console.error('Error saving batch state:', error));
+    return this.saving;
+  }
+
+  async create(plan, { tool, parallel }, connectionDetails) {
+    await this.loaded;
+    const id = crypto.randomUUID();
+    const jobs = await jobQueue.submitAll(plan.samples.map(({ sample, command }) => ({
+      tool,
+      command,
+      batch: { id, sample, parallel }
+    })), connectionDetails);
+
+    const batch = {
+      id,
+      tool,
+      user: jobs[0].user,
+      directory: plan.directory,
+      pattern: plan.pattern,
+      paired: plan.paired,
+      template: plan.template,
+      parallel,
+      createdAt: new Date().toISOString(),
+      unpaired: plan.unpaired,
+      samples: plan.samples.map(({ sample, files, command }, index) => ({
+        sample,
+        files,
+        command,
+        jobId: jobs[index].id,
+        status: jobs[index].status
+      }))
+    };
+    this.batches.set(id, batch);
+    this.prune();
+    await this.save();
+    return this.describe(batch);
+  }
+
+  // copy a finished job's result to its sample
+  record(job) {
+    const batch = job.batch && this.batches.get(job.batch.id);
+    const sample = batch && batch.samples.find(sample => sample.jobId === job.id);
+    if (!sample) {
+      return;
+    }
+    for (const field of ['status', 'startedAt', 'finishedAt', 'exitCode', 'signal', 'error']) {
+      sample[field] = job[field];
+    }
+    this.save();
+  }
+
+  // forget the oldest batches beyond keepBatches
+  prune() {
+    const batches = [...this.batches.values()].sort((a, b) => a.createdAt.localeCompare(b.createdAt));
+    for (const batch of batches.slice(0, Math.max(0, batches.length - this.options.keepBatches))) {
+      this.batches.delete(batch.id);
+    }
+  }
+
+  // the batch with every sample's current job state and per-status counts
+  async describe(batch) {
+    const jobs = await jobQueue.getAll(batch.samples.map(sample => sample.jobId));
+    const counts = {};
+    const samples = batch.samples.map((sample) => {
+      const job = jobs.get(sample.jobId);
+      const row = { ...sample };
+      if (job) {
+        for (const field of ['status', 'position', 'startedAt', 'finishedAt', 'exitCode', 'signal', 'error', 'events']) {
+          row[field] = job[field];
+        }
+      } else if (!FINISHED_STATES.has(row.status)) {
+        // dropped from the queue before its result was recorded
+        row.status = 'unknown';
+      }
+      counts[row.status] = (counts[row.status] || 0) + 1;
+      return row;
+    });
+    return { ...batch, samples, counts, finished: samples.every(row => FINISHED_STATES.has(row.status) || row.status === 'unknown') };
+  }
+
+  async get(id) {
+    await this.loaded;
+    const batch = this.batches.get(id);
+    return batch ? this.describe(batch) : null;
+  }
+
+  async list(user = null) {
+    await this.loaded;
+    const batches = [...this.batches.values()]
+      .filter(batch => !user || batch.user === user)
+      .sort((a, b) => b.createdAt.localeCompare(a.createdAt));
+    return Promise.all(batches.map(async (batch) => {
+      const { samples, ...summary } = await this.describe(batch);
+      return { ...summary, total: samples.length };
+    }));
+  }
+
+  async cancel(id) {
+    await this.loaded;
+    const batch = this.batches.get(id);
+    if (!batch) {
+      return null;
+    }
+    await jobQueue.cancelAll(batch.samples.map(sample => sample.jobId));
+    return this.describe(batch);
+  }
+}
+
+const batchStore = new BatchStore();
+
+// POST /batches { tool, directory, pattern, paired, template[, parallel][, dryRun] }
+// -> 200 with the planned commands (dryRun), or 202 with the batch
+async function submitBatch(req, res) {
+  const connectionDetails = req.app.locals.connectionDetails;
+  if (!connectionDetails) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+
+  const { tool, dryRun } = req.body;
+  const maxParallel = jobsConfig.batch.maxParallel;
+  const parallel = Math.max(1, Math.min(parseInt(req.body.parallel) || maxParallel, maxParallel));
+  try {
+    const plan = await planBatch({
+      tool,
+      directory: req.body.directory,
+      pattern: req.body.pattern,
+      paired: req.body.paired === true || req.body.paired === 'true',
+      template: req.body.template
+    }, connectionDetails);
+    if (dryRun) {
+      return res.json({ ...plan, parallel });
+    }
+    res.status(202).json(await batchStore.create(plan, { tool, parallel }, connectionDetails));
+  } catch (error) {
+    console.error('Error submitting batch:', error);
+    // a missing directory is the caller's mistake, not the server's
+    const status = error.status || (error.code === 2 ? 404 : 500);
+    res.status(status).json({ error: error.message });
+  }
+}
+
+// GET /batches[?all=1] -> the caller's batches with per-status counts, newest first
+async function listBatches(req, res) {
+  const user = jobQueue.listUser(req);
+  if (user === undefined) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+  res.json({ batches: await batchStore.list(user) });
+}
+
+// GET /batches/:batchId -> the batch with one row per sample
+async function batchStatus(req, res) {
+  if (!req.app.locals.connectionDetails) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+  const batch = await batchStore.get(req.params.batchId);
+  if (jobQueue.checkOwner(req, res, batch, 'Batch')) {
+    res.json(batch);
+  }
+}
+
+// POST /batches/:batchId/cancel -> the batch, its unfinished samples cancelled
+async function cancelBatch(req, res) {
+  if (!req.app.locals.connectionDetails) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+  if (jobQueue.checkOwner(req, res, await batchStore.get(req.params.batchId), 'Batch')) {
+    res.json(await batchStore.cancel(req.params.batchId));
+  }
+}
+
+module.exports = batchStore;
+module.exports.BatchStore = BatchStore;
+module.exports.globToRegExp = globToRegExp;
+module.exports.groupSamples = groupSamples;
+module.exports.renderCommand = renderCommand;
+module.exports.shellQuote = shellQuote;
+module.exports.listSamples = listSamples;
+module.exports.planBatch = planBatch;
+module.exports.submitBatch = submitBatch;
+module.exports.listBatches = listBatches;
+module.exports.batchStatus = batchStatus;
+module.exports.cancelBatch = cancelBatch;
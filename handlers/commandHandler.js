@@ -1,68 +1,104 @@
-const { Client } = require('ssh2');
+const sshPool = require('./sshPool');
+const commandRuns = require('./commandRuns');
 const iconv = require('iconv-lite');
 
+// First line printed by commands started with trackPid, carrying the remote shell's PID
+const PID_MARKER = '__METADOCK_PID__=';
+
+// Start config's command on the remote host, its output going to run (a new one
+// unless given). trackPid records the remote shell's PID in run.pid so the
+// process group can be signalled later. Resolves to { run, stream } once the
+// channel is open; run emits 'exit' when the command ends.
+async function startCommand(config, connectionDetails, command, { run = null, trackPid = false } = {}) {
+  const fullCommand = config.env.replace('__COMMAND__', command);
+  const remoteCommand = trackPid ? `echo "${PID_MARKER}$$"; ${fullCommand}` : fullCommand;
+  // Pooled connection: only the first command of a login pays for the handshake
+  const stream = await sshPool.exec(connectionDetails, remoteCommand);
+  console.log('[Connection Established] ✓ SSH channel is now open.');
+  console.log(`[Executing Command] $\x1b[34m${fullCommand}\x1b[0m`);
+
+  // Output goes to a bounded buffer instead of one growing string
+  run = run || commandRuns.createRun(command, commandRuns.userKey(connectionDetails));
+  console.log(`[Output Start] --- Real-time Output (run ${run.id}) ---`);
+
+  // Streaming decoders keep multi-byte characters split across packets intact
+  const stdoutDecoder = iconv.getDecoder('utf-8');
+  let pidLine = trackPid ? '' : null;
+  stream.on('data', (data) => {
+    let decoded = stdoutDecoder.write(data);
+    if (pidLine !== null) {
+      // Hold output back until the marker line is complete
+      pidLine += decoded;
+      const newline = pidLine.indexOf('\n');
+      if (newline === -1) {
+        return;
+      }
+      const first = pidLine.slice(0, newline);
+      decoded = first.startsWith(PID_MARKER) ? pidLine.slice(newline + 1) : pidLine;
+      if (first.startsWith(PID_MARKER)) {
+        run.pid = parseInt(first.slice(PID_MARKER.length)) || null;
+      }
+      pidLine = null;
+    }
+    run.write(decoded, 'stdout');
+    process.stdout.write(`\x1b[90m${decoded}\x1b[0m`);
+  });
+
+  const stderrDecoder = iconv.getDecoder('utf-8');
+  if (config.hasStderr) {
+    stream.stderr.on('data', (errData) => {
+      const errDecoded = stderrDecoder.write(errData);
+      run.write(errDecoded, 'stderr');
+      process.stdout.write(`\x1b[31m[ERROR] ${errDecoded}\x1b[0m`);
+    });
+  } else {
+    // Unread stderr would stall the channel once its window fills up
+    stream.stderr.resume();
+  }
+
+  stream.on('close', (code, signal) => {
+    run.write((pidLine || '') + (stdoutDecoder.end() || ''), 'stdout');
+    if (config.hasStderr) {
+      run.write(stderrDecoder.end() || '', 'stderr');
+    }
+    console.log('\n[Output End] --- Command Execution Completed ---');
+    console.log(`[Status] Exit Code: ${code}, Signal: ${signal || 'None'}`);
+    run.finish(code, signal);
+  });
+
+  return { run, stream };
+}
+
 module.exports = (config) => async (req, res) => {
   if (!req.app.locals.connectionDetails) {
     console.log('[Request Interception] Connection details not provided.');
     return res.status(400).send('Connection details not provided.');
   }
 
-  const { command } = req.body;
+  // stream: true answers at once with a run id; the output follows on /runs/:runId/events
+  const { command, stream: streamOutput } = req.body;
   console.log(`[New Request] Command received: ${command}`);
   
-  const conn = new Client();
-  console.log('[Connection Phase] Initializing SSH connection...');
-
   try {
-    const output = await new Promise((resolve, reject) => {
-      conn.on('error', (err) => {
-        console.error('[Connection Error] SSH connection failed:', err);
-        reject(err);
-      });
-
-      conn.on('ready', () => {
-        console.log('[Connection Established] ✓ SSH tunnel is now active.');
-        
-        const fullCommand = config.env.replace('__COMMAND__', command);
-        console.log(`[Executing Command] $\x1b[34m${fullCommand}\x1b[0m`);
-
-        conn.exec(fullCommand, (err, stream) => {
-          if (err) {
-            console.error('[Command Error] Execution failed:', err);
-            return reject(err);
-          }
+    const { run } = await startCommand(config, req.app.locals.connectionDetails, command);
 
-          let output = '';
-          console.log('[Output Start] --- Real-time Output ---');
+    if (streamOutput) {
+      return res.json({ runId: run.id, events: `/runs/${run.id}/events` });
+    }
 
-          stream.on('data', (data) => {
-            const decoded = iconv.decode(data, 'utf-8');
-            output += decoded;
-            process.stdout.write(`\x1b[90m${decoded}\x1b[0m`);
-          });
-
-          if (config.hasStderr) {
-            stream.stderr.on('data', (errData) => {
-              const errDecoded = iconv.decode(errData, 'utf-8');
-              output += errDecoded;
-              process.stdout.write(`\x1b[31m[ERROR] ${errDecoded}\x1b[0m`);
-            });
-          }
-
-          stream.on('close', (code, signal) => {
-            console.log('\n[Output End] --- Command Execution Completed ---');
-            console.log(`[Status] Exit Code: ${code}, Signal: ${signal || 'None'}`);
-            conn.end();
-            resolve(output || 'No output available');
-          });
-        });
-      }).connect(req.app.locals.connectionDetails);
-    });
+    // Clients that wait for the whole output get what the buffer still holds
+    if (!run.finished) {
+      await new Promise((resolve) => run.once('exit', resolve));
+    }
+    const dropped = run.output.start;
+    const output = (dropped ? `[... ${dropped} characters of earlier output dropped ...]\n` : '') + run.output.text();
 
     console.log('[Completed] Request processed successfully.');
-    res.json({ output });
+    res.json({ output: output || 'No output available' });
   } catch (err) {
     console.error('\x1b[31m[Critical Error]\x1b[0m', err);
     res.status(500).send('Error executing command');
   }
 };
+
+module.exports.startCommand = startCommand;
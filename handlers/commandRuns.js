@@ -0,0 +1,236 @@
+const crypto = require('crypto');
+const { EventEmitter } = require('events');
+
+// Output kept per run (characters); older output is dropped once a run writes more
+const OUTPUT_BUFFER_CHARS = parseInt(process.env.METADOCK_OUTPUT_BUFFER_CHARS) || 1024 * 1024;
+// Finished runs stay available to late or reconnecting clients this long
+const FINISHED_RUN_TTL = parseInt(process.env.METADOCK_RUN_TTL_MS) || 15 * 60 * 1000;
+// Comment lines keep proxies from closing a quiet event stream
+const HEARTBEAT_INTERVAL = 15000;
+
+// Commands, and the jobs queued for them, belong to the SSH login that started them
+function userKey(connectionDetails) {
+  return `${connectionDetails.username}@${connectionDetails.host}`;
+}
+
+// Sends 404 or 403 and returns false unless the caller owns the item
+function checkOwner(req, res, item, name) {
+  if (!item) {
+    res.status(404).json({ error: `${name} not found` });
+    return false;
+  }
+  if (item.user !== userKey(req.app.locals.connectionDetails)) {
+    res.status(403).json({ error: `${name} belongs to another user` });
+    return false;
+  }
+  return true;
+}
+
+// Bounded output of one run, addressed by absolute character offsets so a
+// client can ask for everything after the last offset it saw
+class OutputRing {
+  constructor(capacity = OUTPUT_BUFFER_CHARS) {
+    this.capacity = capacity;
+    this.chunks = [];
+    this.head = 0;
+    // offsets of the oldest retained character and of the end of the output
+    this.start = 0;
+    this.end = 0;
+  }
+
+  append(text, stream) {
+    if (!text) {
+      return null;
+    }
+    const chunk = { offset: this.end, text, stream };
+    this.chunks.push(chunk);
+    this.end += text.length;
+    this.trim();
+    return chunk;
+  }
+
+  trim() {
+    while (this.end - this.start > this.capacity) {
+      const first = this.chunks[this.head];
+      const excess = this.end - this.start - this.capacity;
+      if (first.text.length <= excess) {
+        this.head++;
+        this.start += first.text.length;
+      } else {
+        first.text = first.text.slice(excess);
+        first.offset += excess;
+        this.start += excess;
+      }
+    }
+    // drop consumed slots once they make up most of the array
+    if (this.head > 1024 && this.head * 2 > this.chunks.length) {
+      this.chunks = this.chunks.slice(this.head);
+      this.head = 0;
+    }
+  }
+
+  // retained chunks after offset, the first one cut at offset
+  since(offset) {
+    let low = this.head;
+    let high = this.chunks.length;
+    while (low < high) {
+      const mid = (low + high) >> 1;
+      const chunk = this.chunks[mid];
+      if (chunk.offset + chunk.text.length <= offset) {
+        low = mid + 1;
+      } else {
+        high = mid;
+      }
+    }
+    const chunks = this.chunks.slice(low);
+    if (chunks.length && chunks[0].offset < offset) {
+      const first = chunks[0];
+      chunks[0] = { offset, text: first.text.slice(offset - first.offset), stream: first.stream };
+    }
+    return chunks;
+  }
+
+  text() {
+    return this.chunks.slice(this.head).map(chunk => chunk.text).join('');
+  }
+}
+
+// A remote command whose output is streamed to any number of clients
+class CommandRun extends EventEmitter {
+  // user: userKey() of the login the command runs under
+  constructor(command, user) {
+    super();
+    // one listener pair per connected browser tab
+    this.setMaxListeners(0);
+    this.id = crypto.randomUUID();
+    this.command = command;
+    this.user = user;
+    this.output = new OutputRing();
+    this.startedAt = new Date();
+    this.finished = false;
+    this.exitCode = null;
+    this.signal = null;
+  }
+
+  write(text, stream = 'stdout') {
+    const chunk = this.output.append(text, stream);
+    if (chunk) {
+      this.emit('output', chunk);
+    }
+  }
+
+  finish(code, signal) {
+    this.finished = true;
+    this.exitCode = code;
+    this.signal = signal || null;
+    this.emit('exit', this.status());
+    setTimeout(() => runs.delete(this.id), FINISHED_RUN_TTL).unref();
+  }
+
+  status() {
+    return {
+      id: this.id,
+      command: this.command,
+      startedAt: this.startedAt.toISOString(),
+      finished: this.finished,
+      exitCode: this.exitCode,
+      signal: this.signal,
+      start: this.output.start,
+      end: this.output.end
+    };
+  }
+}
+
+const runs = new Map();
+
+function createRun(command, user) {
+  const run = new CommandRun(command, user);
+  runs.set(run.id, run);
+  return run;
+}
+
+function getRun(id) {
+  return runs.get(id);
+}
+
+// GET /runs/:runId -> status of a run
+function runStatus(req, res) {
+  if (!req.app.locals.connectionDetails) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+  const run = runs.get(req.params.runId);
+  if (checkOwner(req, res, run, 'Run')) {
+    res.json(run.status());
+  }
+}
+
+// GET /runs/:runId/events -> Server-Sent Events with the run's output
+//
+// Every output event carries the offset after it as its id, so EventSource
+// resumes by itself after a disconnect (Last-Event-ID); ?offset= resumes
+// explicitly. Output dropped from the buffer is announced with a 'truncated' event.
+function streamRun(req, res) {
+  if (!req.app.locals.connectionDetails) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+  const run = runs.get(req.params.runId);
+  if (!checkOwner(req, res, run, 'Run')) {
+    return;
+  }
+
+  const resumeFrom = req.get('Last-Event-ID') || req.query.offset;
+  const offset = Math.max(0, Math.min(parseInt(resumeFrom) || 0, run.output.end));
+
+  res.writeHead(200, {
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    // nginx would otherwise buffer the stream
+    'X-Accel-Buffering': 'no'
+  });
+  res.write('retry: 3000\n\n');
+
+  const send = (event, data, id) => {
+    res.write(`${id === undefined ? '' : `id: ${id}\n`}event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+  };
+  const sendChunk = (chunk) => {
+    send('output', chunk, chunk.offset + chunk.text.length);
+  };
+  const sendExit = (status) => {
+    send('exit', status);
+    res.end();
+  };
+
+  if (offset < run.output.start) {
+    send('truncated', { from: offset, to: run.output.start });
+  }
+  run.output.since(offset).forEach(sendChunk);
+  if (run.finished) {
+    return sendExit(run.status());
+  }
+
+  const heartbeat = setInterval(() => res.write(': ping\n\n'), HEARTBEAT_INTERVAL);
+  const cleanup = () => {
+    clearInterval(heartbeat);
+    run.off('output', sendChunk);
+    run.off('exit', onExit);
+  };
+  const onExit = (status) => {
+    cleanup();
+    sendExit(status);
+  };
+  run.on('output', sendChunk);
+  run.once('exit', onExit);
+  req.on('close', cleanup);
+}
+
+module.exports = {
+  userKey,
+  checkOwner,
+  OutputRing,
+  CommandRun,
+  createRun,
+  getRun,
+  runStatus,
+  streamRun
+};
@@ -0,0 +1,451 @@
+const crypto = require('crypto');
+const { EventEmitter } = require('events');
+const fs = require('fs').promises;
+const path = require('path');
+const toolsConfig = require('../config/tools');
+const jobsConfig = require('../config/jobs');
+const commandRuns = require('./commandRuns');
+const sshPool = require('./sshPool');
+const { startCommand } = require('./commandHandler');
+
+const { userKey, checkOwner } = commandRuns;
+
+const FINISHED_STATES = new Set(['succeeded', 'failed', 'cancelled', 'interrupted']);
+
+// Jobs, batches and workflow runs are listed to and changed by their own user only;
+// admins may list everyone's with ?all=1
+function listUser(req) {
+  if (req.query.all === '1' && req.session.isAdmin) {
+    return null;
+  }
+  const connectionDetails = req.app.locals.connectionDetails;
+  return connectionDetails ? userKey(connectionDetails) : undefined;
+}
+
+// Tool commands queued and run under global, per-user and per-tool limits
+//
+// Queued jobs start by priority (higher first), then in submission order,
+// skipping jobs whose user, tool or batch is at its limit. The queue is
+// written to stateFile on every change; jobs queued before a restart wait
+// until their user connects again, jobs running at the time are marked
+// interrupted. Emits 'finish' with the job once it succeeded, failed or was
+// cancelled, and 'credentials' with the user whose login was (re)registered.
+class JobQueue extends EventEmitter {
+  constructor(options = jobsConfig) {
+    super();
+    this.options = options;
+    this.jobs = new Map();
+    // user -> connection details, in memory only
+    this.credentials = new Map();
+    // job id -> { run, stream } of running jobs
+    this.active = new Map();
+    this.nextSequence = 1;
+    this.saving = Promise.resolve();
+    this.loaded = this.load();
+  }
+
+  async load() {
+    let state;
+    try {
+      state = JSON.parse(await fs.readFile(this.options.stateFile, 'utf8'));
+    } catch (error) {
+      if (error.code !== 'ENOENT') {
+        console.error('Error reading job queue state:', error);
+      }
+      return;
+    }
+
+    for (const job of state.jobs || []) {
+      if (job.status === 'running') {
+        job.status = 'interrupted';
+        job.finishedAt = new Date().toISOString();
+        job.error = 'Server restarted while the job was running';
+      }
+      if (!FINISHED_STATES.has(job.status)) {
+        job.runId = commandRuns.createRun(job.command, job.user).id;
+      }
+      this.jobs.set(job.id, job);
+      this.nextSequence = Math.max(this.nextSequence, job.sequence + 1);
+    }
+    console.log(`Job queue restored: ${this.queued().length} queued jobs`);
+    this.schedule();
+  }
+
+  // write the queue atomically; saves are serialized so an older state never wins
+  save() {
+    const jobs = [...this.jobs.values()];
+    this.saving = this.saving.then(async () => {
+      const file = this.options.stateFile;
+      await fs.mkdir(path.dirname(file), { recursive: true });
+      await fs.writeFile(`${file}.tmp`, JSON.stringify({ jobs }, null, 2));
+      await fs.rename(`${file}.tmp`, file);
+    }).catch((error) => console.error('Error saving job queue state:', error));
+    return this.saving;
+  }
+
+  // connection details a user's jobs run with, e.g. after /connect
+  setCredentials(connectionDetails) {
+    const user = userKey(connectionDetails);
+    this.credentials.set(user, connectionDetails);
+    this.schedule();
+    this.emit('credentials', user);
+  }
+
+  // connection details of a user who connected since the server started
+  credentialsOf(user) {
+    return this.credentials.get(user) || null;
+  }
+
+  async submit(spec, connectionDetails) {
+    const [job] = await this.submitAll([spec], connectionDetails);
+    return job;
+  }
+
+  // queue jobs { tool, command[, priority][, batch] } with a single save;
+  // batch is { id, sample, parallel } for the samples of a batch (handlers/batchRuns.js)
+  async submitAll(specs, connectionDetails) {
+    await this.loaded;
+    // nothing is queued unless every job is valid
+    for (const { tool, command } of specs) {
+      if (!toolsConfig[tool]) {
+        throw Object.assign(new Error(`Unknown tool: ${tool}`), { status: 404 });
+      }
+      if (typeof command !== 'string' || !command.trim()) {
+        throw Object.assign(new Error('Command is required'), { status: 400 });
+      }
+    }
+
+    const user = userKey(connectionDetails);
+    this.credentials.set(user, connectionDetails);
+
+    const jobs = specs.map(({ tool, command, priority, batch = null }) => {
+      const job = {
+        id: crypto.randomUUID(),
+        sequence: this.nextSequence++,
+        tool,
+        command,
+        user,
+        priority: priority === undefined ? (toolsConfig[tool].priority ?? this.options.defaultPriority) : priority,
+        status: 'queued',
+        createdAt: new Date().toISOString(),
+        startedAt: null,
+        finishedAt: null,
+        exitCode: null,
+        signal: null,
+        error: null,
+        runId: commandRuns.createRun(command, user).id,
+        batch
+      };
+      this.jobs.set(job.id, job);
+      return job;
+    });
+    this.schedule();
+
+    const queued = this.queued();
+    const submitted = new Set(jobs);
+    queued.forEach((job, index) => {
+      if (submitted.has(job)) {
+        commandRuns.getRun(job.runId).write(`[Job queued at position ${index + 1}]\n`, 'status');
+      }
+    });
+    this.prune();
+    await this.save();
+    return jobs.map(job => this.describe(job, queued));
+  }
+
+  queued() {
+    return [...this.jobs.values()]
+      .filter(job => job.status === 'queued')
+      .sort((a, b) => b.priority - a.priority || a.sequence - b.sequence);
+  }
+
+  running() {
+    return [...this.jobs.values()].filter(job => job.status === 'running');
+  }
+
+  // start every queued job the limits allow
+  schedule() {
+    const running = this.running();
+    const perUser = new Map();
+    const perTool = new Map();
+    const perBatch = new Map();
+    const count = (counts, key) => counts.set(key, (counts.get(key) || 0) + 1);
+    for (const job of running) {
+      count(perUser, job.user);
+      count(perTool, job.tool);
+      if (job.batch) {
+        count(perBatch, job.batch.id);
+      }
+    }
+
+    let slots = this.options.maxConcurrent - running.length;
+    for (const job of this.queued()) {
+      if (slots <= 0) {
+        break;
+      }
+      const toolLimit = toolsConfig[job.tool] && toolsConfig[job.tool].maxConcurrent;
+      if ((perUser.get(job.user) || 0) >= this.options.maxPerUser ||
+          (toolLimit && (perTool.get(job.tool) || 0) >= toolLimit) ||
+          (job.batch && (perBatch.get(job.batch.id) || 0) >= job.batch.parallel) ||
+          !this.credentials.has(job.user)) {
+        continue;
+      }
+      count(perUser, job.user);
+      count(perTool, job.tool);
+      if (job.batch) {
+        count(perBatch, job.batch.id);
+      }
+      slots--;
+      this.start(job);
+    }
+  }
+
+  start(job) {
+    const config = toolsConfig[job.tool];
+    job.status = 'running';
+    job.startedAt = new Date().toISOString();
+    const run = commandRuns.getRun(job.runId) || commandRuns.createRun(job.command, job.user);
+    job.runId = run.id;
+    run.write(`[Job started]\n`, 'status');
+    this.save();
+
+    if (!config) {
+      // after the schedule() loop that started the job, whose counts would go stale
+      setImmediate(() => this.finish(job, { error: `Tool ${job.tool} is no longer configured` }));
+      return;
+    }
+
+    startCommand(config, this.credentials.get(job.user), job.command, { run, trackPid: true })
+      .then(({ stream }) => {
+        this.active.set(job.id, { run, stream });
+        run.once('exit', ({ exitCode, signal }) => this.finish(job, { exitCode, signal }));
+        // cancelled while the channel was opening
+        if (job.cancelRequested) {
+          this.terminate(job);
+        }
+      })
+      .catch((error) => {
+        console.error(`Error starting job ${job.id}:`, error);
+        this.finish(job, { error: error.message });
+      });
+  }
+
+  finish(job, result) {
+    this.settle(job, result);
+    this.schedule();
+    this.prune();
+    this.save();
+  }
+
+  // record how a job ended; finish() also starts the jobs it made room for
+  settle(job, { exitCode = null, signal = null, error = null }) {
+    this.active.delete(job.id);
+    job.exitCode = exitCode;
+    job.signal = signal;
+    job.error = error;
+    job.finishedAt = new Date().toISOString();
+    if (job.cancelRequested) {
+      job.status = 'cancelled';
+    } else {
+      job.status = !error && exitCode === 0 ? 'succeeded' : 'failed';
+    }
+
+    const run = commandRuns.getRun(job.runId);
+    if (run && !run.finished) {
+      run.write(`[Job ${job.status}${error ? `: ${error}` : ''}]\n`, 'status');
+      run.finish(exitCode, signal);
+    }
+    this.emit('finish', this.describe(job));
+  }
+
+  // SIGTERM to the remote process group, the channel closed if it outlives cancelGrace
+  terminate(job) {
+    const active = this.active.get(job.id);
+    if (!active) {
+      return;
+    }
+    const { run, stream } = active;
+    const connectionDetails = this.credentials.get(job.user);
+    if (run.pid && connectionDetails) {
+      // The remote shell leads the process group of everything the command started
+      sshPool.exec(connectionDetails, `kill -TERM -- -${run.pid} 2>/dev/null || kill -TERM ${run.pid}`)
+        .then(killer => killer.resume())
+        .catch(error => console.error(`Error signalling job ${job.id}:`, error));
+    } else {
+      stream.signal('TERM');
+    }
+    setTimeout(() => {
+      if (this.active.has(job.id)) {
+        stream.close();
+      }
+    }, this.options.cancelGrace * 1000).unref();
+  }
+
+  async cancel(id) {
+    await this.loaded;
+    const job = this.jobs.get(id);
+    if (!job) {
+      return null;
+    }
+    if (job.status === 'queued') {
+      job.cancelRequested = true;
+      this.finish(job, {});
+    } else if (job.status === 'running' && !job.cancelRequested) {
+      job.cancelRequested = true;
+      const run = commandRuns.getRun(job.runId);
+      if (run) {
+        run.write('[Cancelling job]\n', 'status');
+      }
+      this.terminate(job);
+      await this.save();
+    }
+    return this.describe(job);
+  }
+
+  // cancel several jobs, e.g. the rest of a batch, with a single save
+  async cancelAll(ids) {
+    await this.loaded;
+    const jobs = ids.map(id => this.jobs.get(id)).filter(Boolean);
+    for (const job of jobs) {
+      if (job.status === 'queued') {
+        job.cancelRequested = true;
+        this.settle(job, {});
+      }
+    }
+    for (const job of jobs) {
+      if (job.status === 'running' && !job.cancelRequested) {
+        job.cancelRequested = true;
+        const run = commandRuns.getRun(job.runId);
+        if (run) {
+          run.write('[Cancelling job]\n', 'status');
+        }
+        this.terminate(job);
+      }
+    }
+    this.schedule();
+    this.prune();
+    await this.save();
+    const queued = this.queued();
+    return jobs.map(job => this.describe(job, queued));
+  }
+
+  // forget the oldest finished jobs beyond keepFinished
+  prune() {
+    const finished = [...this.jobs.values()]
+      .filter(job => FINISHED_STATES.has(job.status))
+      .sort((a, b) => a.sequence - b.sequence);
+    for (const job of finished.slice(0, Math.max(0, finished.length - this.options.keepFinished))) {
+      this.jobs.delete(job.id);
+    }
+  }
+
+  // queued: this.queued(), passed in when describing many jobs at once
+  describe(job, queued = null) {
+    const description = { ...job };
+    delete description.cancelRequested;
+    if (job.status === 'queued') {
+      description.position = (queued || this.queued()).indexOf(job) + 1;
+      description.waitingForLogin = !this.credentials.has(job.user);
+    }
+    if (!FINISHED_STATES.has(job.status) || commandRuns.getRun(job.runId)) {
+      description.events = `/runs/${job.runId}/events`;
+    }
+    return description;
+  }
+
+  async list(user = null) {
+    await this.loaded;
+    const queued = this.queued();
+    return [...this.jobs.values()]
+      .filter(job => !user || job.user === user)
+      .sort((a, b) => b.sequence - a.sequence)
+      .map(job => this.describe(job, queued));
+  }
+
+  // id -> description of the jobs still in the queue
+  async getAll(ids) {
+    await this.loaded;
+    const queued = this.queued();
+    const jobs = new Map();
+    for (const id of ids) {
+      const job = this.jobs.get(id);
+      if (job) {
+        jobs.set(id, this.describe(job, queued));
+      }
+    }
+    return jobs;
+  }
+
+  async get(id) {
+    await this.loaded;
+    const job = this.jobs.get(id);
+    return job ? this.describe(job) : null;
+  }
+}
+
+const jobQueue = new JobQueue();
+
+// POST /jobs { tool, command[, priority] } -> 202 with the queued job
+async function submitJob(req, res) {
+  const connectionDetails = req.app.locals.connectionDetails;
+  if (!connectionDetails) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+
+  // Only admins choose a priority; everyone else gets the tool's
+  let priority;
+  if (req.session.isAdmin && req.body.priority !== undefined) {
+    priority = Math.max(-jobsConfig.maxPriority, Math.min(parseInt(req.body.priority) || 0, jobsConfig.maxPriority));
+  }
+
+  try {
+    const job = await jobQueue.submit({ tool: req.body.tool, command: req.body.command, priority }, connectionDetails);
+    res.status(202).json(job);
+  } catch (error) {
+    console.error('Error submitting job:', error);
+    res.status(error.status || 500).json({ error: error.message });
+  }
+}
+
+// GET /jobs[?all=1] -> the caller's jobs (everyone's for admins with all=1), newest first
+async function listJobs(req, res) {
+  const user = listUser(req);
+  if (user === undefined) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+  res.json({
+    limits: { maxConcurrent: jobsConfig.maxConcurrent, maxPerUser: jobsConfig.maxPerUser },
+    jobs: await jobQueue.list(user)
+  });
+}
+
+// GET /jobs/:jobId -> one job
+async function jobStatus(req, res) {
+  if (!req.app.locals.connectionDetails) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+  const job = await jobQueue.get(req.params.jobId);
+  if (checkOwner(req, res, job, 'Job')) {
+    res.json(job);
+  }
+}
+
+// POST /jobs/:jobId/cancel -> the job, cancelled or being cancelled
+async function cancelJob(req, res) {
+  if (!req.app.locals.connectionDetails) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+  if (checkOwner(req, res, await jobQueue.get(req.params.jobId), 'Job')) {
+    res.json(await jobQueue.cancel(req.params.jobId));
+  }
+}
+
+module.exports = jobQueue;
+module.exports.JobQueue = JobQueue;
+module.exports.userKey = userKey;
+module.exports.listUser = listUser;
+module.exports.checkOwner = checkOwner;
+module.exports.submitJob = submitJob;
+module.exports.listJobs = listJobs;
+module.exports.jobStatus = jobStatus;
+module.exports.cancelJob = cancelJob;
@@ -0,0 +1,277 @@
+const crypto = require('crypto');
+const { Client } = require('ssh2');
+
+const DEFAULT_OPTIONS = {
+  // ssh2 sends a keepalive after this much silence and drops the connection
+  // once keepaliveCountMax of them go unanswered
+  keepaliveInterval: parseInt(process.env.METADOCK_SSH_KEEPALIVE_MS) || 15000,
+  keepaliveCountMax: 3,
+  // Connections nobody used for this long are closed
+  idleTimeout: parseInt(process.env.METADOCK_SSH_IDLE_MS) || 5 * 60 * 1000,
+  // Channels (commands plus the shared SFTP session) open at once on one
+  // connection; OpenSSH refuses more than MaxSessions, 10 by default
+  maxChannels: parseInt(process.env.METADOCK_SSH_MAX_CHANNELS) || 8,
+  readyTimeout: 20000
+};
+
+// A reused connection can die before keepalive notices; its next channel fails
+function isStale(connection, err) {
+  return connection.closed || err.message === 'Not connected';
+}
+
+// One pooled connection per login; the credentials are part of the key so a
+// changed password never reuses a connection opened with the old one
+function poolKey(details) {
+  const secret = crypto.createHash('sha256')
+    .update(String(details.password || ''))
+    .update(details.privateKey ? Buffer.from(details.privateKey) : '')
+    .digest('hex');
+  return `${details.username}@${details.host}:${details.port || 22}#${secret.slice(0, 16)}`;
+}
+
+// An authenticated connection, its channel slots and its SFTP session
+class PooledConnection {
+  constructor(details, options, onClose) {
+    this.options = options;
+    this.onClose = onClose;
+    this.closed = false;
+    this.closeError = null;
+    // out of the pool, closed once the requests still using it are done
+    this.draining = false;
+    this.channels = 0;
+    this.waiting = [];
+    this.leases = 0;
+    this.idleTimer = null;
+    this.sftpSession = null;
+
+    this.client = new Client();
+    this.ready = new Promise((resolve, reject) => {
+      this.client.once('ready', resolve);
+      this.client.once('error', reject);
+    });
+    // Nothing waits on ready until the first request; avoid an unhandled rejection
+    this.ready.catch(() => {});
+
+    this.client.on('error', (err) => {
+      console.error('[SSH Pool] Connection error:', err.message);
+      this.destroy(err);
+    });
+    this.client.on('close', () => this.destroy(new Error('SSH connection closed')));
+
+    this.client.connect({
+      ...details,
+      keepaliveInterval: options.keepaliveInterval,
+      keepaliveCountMax: options.keepaliveCountMax,
+      readyTimeout: details.readyTimeout || options.readyTimeout
+    });
+  }
+
+  // a request starts using the connection; it is not idle until released
+  lease() {
+    this.leases++;
+    clearTimeout(this.idleTimer);
+    this.idleTimer = null;
+  }
+
+  release() {
+    this.leases--;
+    if (this.leases === 0 && this.draining) {
+      this.destroy(new Error('SSH connection closed'));
+    } else if (this.leases === 0 && !this.closed) {
+      this.idleTimer = setTimeout(() => this.destroy(new Error('SSH connection idle')), this.options.idleTimeout);
+      // an idle connection must not keep the process alive
+      this.idleTimer.unref();
+    }
+  }
+
+  // wait for a free channel slot
+  openSlot() {
+    if (this.closed) {
+      return Promise.reject(this.closeError);
+    }
+    if (this.channels < this.options.maxChannels) {
+      this.channels++;
+      return Promise.resolve();
+    }
+    return new Promise((resolve, reject) => this.waiting.push({ resolve, reject }));
+  }
+
+  // free a slot, handing it straight to the next waiter
+  closeSlot() {
+    const next = this.waiting.shift();
+    if (next) {
+      next.resolve();
+    } else {
+      this.channels--;
+    }
+  }
+
+  async exec(command, options = {}) {
+    await this.openSlot();
+    return new Promise((resolve, reject) => {
+      try {
+        this.client.exec(command, options, (err, stream) => {
+          if (err) {
+            this.closeSlot();
+            return reject(err);
+          }
+          stream.once('close', () => this.closeSlot());
+          resolve(stream);
+        });
+      } catch (err) {
+        // ssh2 throws 'Not connected' when the socket is already gone
+        this.closeSlot();
+        reject(err);
+      }
+    });
+  }
+
+  // the SFTP subsystem is started once and shared; it multiplexes requests itself
+  sftp() {
+    if (!this.sftpSession) {
+      const session = this.openSlot().then(() => new Promise((resolve, reject) => {
+        try {
+          this.client.sftp((err, sftp) => {
+            if (err) {
+              this.closeSlot();
+              return reject(err);
+            }
+            sftp.once('close', () => {
+              this.closeSlot();
+              if (this.sftpSession === session) {
+                this.sftpSession = null;
+              }
+            });
+            resolve(sftp);
+          });
+        } catch (err) {
+          this.closeSlot();
+          reject(err);
+        }
+      }));
+      session.catch(() => {
+        if (this.sftpSession === session) {
+          this.sftpSession = null;
+        }
+      });
+      this.sftpSession = session;
+    }
+    return this.sftpSession;
+  }
+
+  // close once idle; running commands and transfers keep their channels
+  drain() {
+    if (this.leases === 0) {
+      return this.destroy(new Error('SSH connection closed'));
+    }
+    this.draining = true;
+    // later requests open a new connection instead of leasing this one
+    this.onClose(this);
+  }
+
+  destroy(err) {
+    if (this.closed) {
+      return;
+    }
+    this.closed = true;
+    this.closeError = err;
+    clearTimeout(this.idleTimer);
+    for (const { reject } of this.waiting) {
+      reject(err);
+    }
+    this.waiting = [];
+    this.sftpSession = null;
+    this.client.end();
+    this.onClose(this);
+  }
+}
+
+// Authenticated SSH connections shared by the command, file browser and SFTP routes
+class SshPool {
+  constructor(options = {}) {
+    this.options = { ...DEFAULT_OPTIONS, ...options };
+    this.connections = new Map();
+  }
+
+  // ready connection for these details, opening one if needed
+  async connection(details) {
+    const key = poolKey(details);
+    let connection = this.connections.get(key);
+    if (!connection || connection.closed) {
+      connection = new PooledConnection(details, this.options, (closed) => {
+        if (this.connections.get(key) === closed) {
+          this.connections.delete(key);
+        }
+      });
+      this.connections.set(key, connection);
+    }
+    await connection.ready;
+    return connection;
+  }
+
+  // open (or reuse) a connection, e.g. to check credentials
+  async connect(details) {
+    const connection = await this.connection(details);
+    // starts the idle timer of a connection nobody uses yet
+    connection.lease();
+    connection.release();
+  }
+
+  // lease a connection and open a channel with open(connection); a stale
+  // connection is replaced once, before anything ran on it
+  async openChannel(details, open) {
+    for (let attempt = 0; ; attempt++) {
+      const connection = await this.connection(details);
+      connection.lease();
+      try {
+        return { connection, channel: await open(connection) };
+      } catch (err) {
+        connection.release();
+        if (!isStale(connection, err) || attempt > 0) {
+          throw err;
+        }
+        connection.destroy(err);
+      }
+    }
+  }
+
+  // run a command; the channel is returned to the pool when its stream closes
+  async exec(details, command, options = {}) {
+    const { connection, channel: stream } = await this.openChannel(
+      details, (connection) => connection.exec(command, options));
+    stream.once('close', () => connection.release());
+    return stream;
+  }
+
+  // call fn(sftp) with the connection's shared SFTP session
+  async withSftp(details, fn) {
+    const { connection, channel: sftp } = await this.openChannel(details, (connection) => connection.sftp());
+    try {
+      return await fn(sftp);
+    } finally {
+      connection.release();
+    }
+  }
+
+  // whether two logins would share a pooled connection
+  sameLogin(a, b) {
+    return poolKey(a) === poolKey(b);
+  }
+
+  // take a login's connection out of the pool; it closes when its last request ends
+  close(details) {
+    const connection = this.connections.get(poolKey(details));
+    if (connection) {
+      connection.drain();
+    }
+  }
+
+  closeAll() {
+    for (const connection of [...this.connections.values()]) {
+      connection.destroy(new Error('SSH connection pool closed'));
+    }
+  }
+}
+
+module.exports = new SshPool();
+module.exports.SshPool = SshPool;
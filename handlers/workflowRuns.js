@@ -0,0 +1,647 @@
+const crypto = require('crypto');
+const fs = require('fs').promises;
+const path = require('path');
+const toolsConfig = require('../config/tools');
+const workflowsConfig = require('../config/workflows');
+const jobsConfig = require('../config/jobs');
+const jobQueue = require('./jobQueue');
+const sshPool = require('./sshPool');
+const { listSamples, shellQuote } = require('./batchRuns');
+
+// Steps that let the steps after them start
+const DONE_STATES = new Set(['succeeded', 'skipped']);
+// Steps that stop the steps after them; resuming a run starts them again
+const STOPPED_STATES = new Set(['failed', 'cancelled', 'interrupted', 'blocked']);
+// Steps a run is still waiting for
+const ACTIVE_STATES = new Set(['pending', 'checking', 'queued']);
+// {sample}, {workdir}, {input.r1}, {trim.r1}; other braces are left as they are
+const REFERENCE = /\{([A-Za-z_][\w-]*)(?:\.([\w-]+))?\}/g;
+// Under the work directory: the command each step last succeeded with, per sample
+const MARKER_DIR = '.metadock';
+
+// option -> needs_input, for the options of a tool's para.json
+async function toolOptions(tool) {
+  const params = JSON.parse(await fs.readFile(path.join(__dirname, '..', toolsConfig[tool].paraPath), 'utf8'));
+  const options = new Map();
+  for (const param of params) {
+    for (const name of [param.short, param.long]) {
+      const option = name && name.split(' ')[0];
+      if (option && !options.has(option)) {
+        options.set(option, param.needs_input);
+      }
+    }
+  }
+  return options;
+}
+
+function references(value) {
+  return [].concat(value)
+    .filter(item => typeof item === 'string')
+    .flatMap(item => [...item.matchAll(REFERENCE)]);
+}
+
+// Check a workflow against config/tools.js and the tools' para.json
+// -> { order, dependencies: step -> [steps], problems }
+async function checkWorkflow(workflow) {
+  const steps = workflow.steps || {};
+  const inputs = new Set(workflow.inputs || []);
+  const problems = [];
+  const dependencies = {};
+  if (inputs.size < 1 || inputs.size > 2) {
+    problems.push('inputs: a sample is one file or a pair of files');
+  }
+
+  for (const [name, step] of Object.entries(steps)) {
+    const problem = (message) => problems.push(`${name}: ${message}`);
+    const params = step.params || {};
+    const deps = new Set(step.after || []);
+    dependencies[name] = deps;
+    for (const after of deps) {
+      if (!steps[after]) {
+        problem(`waits for unknown step ${after}`);
+      }
+    }
+    if (!toolsConfig[step.tool]) {
+      problem(`unknown tool ${step.tool}`);
+      continue;
+    }
+
+    let options;
+    try {
+      options = await toolOptions(step.tool);
+    } catch (error) {
+      problem(`cannot read the parameters of ${step.tool}: ${error.message}`);
+      continue;
+    }
+    for (const [option, value] of Object.entries(params)) {
+      if (!options.has(option)) {
+        problem(`${option} is not an option of ${step.tool}`);
+      } else if (value === true && options.get(option)) {
+        problem(`${option} needs a value`);
+      }
+    }
+    for (const [output, value] of Object.entries(step.outputs || {})) {
+      if (/^-|=$/.test(value) && !(value in params)) {
+        problem(`output ${output} names ${value}, which the step does not set`);
+      }
+    }
+
+    const values = [...Object.values(params), ...(step.args || []), ...Object.values(step.outputs || {})];
+    for (const [reference, scope, field] of values.flatMap(references)) {
+      if (!field) {
+        continue;
+      }
+      if (scope === 'input') {
+        if (!inputs.has(field)) {
+          problem(`${reference} is not an input of the workflow`);
+        }
+      } else if (!steps[scope]) {
+        problem(`${reference} refers to an unknown step`);
+      } else if (!(field in (steps[scope].outputs || {}))) {
+        problem(`${reference} is not an output of ${scope}`);
+      } else {
+        deps.add(scope);
+      }
+    }
+  }
+
+  // Steps in dependency order; whatever is left over is on a cycle
+  const order = [];
+  const remaining = new Set(Object.keys(steps));
+  while (remaining.size) {
+    const ready = [...remaining].filter(name => [...dependencies[name]].every(dep => !remaining.has(dep)));
+    if (!ready.length) {
+      problems.push(`cycle between steps ${[...remaining].join(', ')}`);
+      break;
+    }
+    for (const name of ready) {
+      order.push(name);
+      remaining.delete(name);
+    }
+  }
+
+  return {
+    order,
+    dependencies: Object.fromEntries(Object.entries(dependencies).map(([name, deps]) => [name, [...deps]])),
+    problems
+  };
+}
+
+// The steps of one sample: their commands, outputs and the files they read
+function planSample(workflow, { order, dependencies }, sample, workdir) {
+  const inputs = Object.fromEntries(workflow.inputs.map((name, index) => [name, sample.paths[index]]));
+  const outputs = {};
+
+  return order.map((name) => {
+    const step = workflow.steps[name];
+    const reads = new Set();
+    const resolve = (value, used = null) => String(value).replace(REFERENCE, (match, scope, field) => {
+      if (!field) {
+        return scope === 'sample' ? sample.sample : scope === 'workdir' ? workdir : match;
+      }
+      const file = scope === 'input' ? inputs[field] : outputs[scope][field];
+      if (used) {
+        used.add(file);
+      }
+      return file;
+    });
+
+    const params = Object.entries(step.params || {}).map(([option, value]) =>
+      [option, value === true ? true : [].concat(value).map(item => resolve(item, reads))]);
+    const stepOutputs = {};
+    for (const [output, value] of Object.entries(step.outputs || {})) {
+      const param = params.find(([option]) => option === value);
+      stepOutputs[output] = param ? param[1][0] : resolve(value);
+    }
+    outputs[name] = stepOutputs;
+
+    // bbduk-style options take their value as in=<file>
+    const renderParam = ([option, values]) => values === true ? [option]
+      : option.endsWith('=') ? values.map(value => option + shellQuote(value))
+        : [option, ...values.map(shellQuote)];
+    const command = [
+      step.tool,
+      ...params.flatMap(renderParam),
+      ...(step.args || []).map(arg => shellQuote(resolve(arg, reads)))
+    ].join(' ');
+
+    return {
+      key: `${sample.sample}/${name}`,
+      sample: sample.sample,
+      step: name,
+      tool: step.tool,
+      after: dependencies[name],
+      command,
+      hash: crypto.createHash('sha256').update(command).digest('hex').slice(0, 16),
+      marker: path.posix.join(workdir, MARKER_DIR, sample.sample, `${name}.done`),
+      outputs: stepOutputs,
+      inputs: [...reads].filter(file => !Object.values(stepOutputs).includes(file)),
+      status: 'pending',
+      jobId: null
+    };
+  });
+}
+
+// Shell script that prints 'fresh' when the step's marker holds the same command,
+// its outputs exist and none of its inputs changed since, then creates its output
+// directories. The tests come first and a directory output must not be empty, so a
+// directory made here never counts as an output; a step that is not fresh loses
+// its marker. Outputs ending in '/' are directories the tool expects to exist
+function freshnessScript(step, force) {
+  const marker = shellQuote(step.marker);
+  const script = [];
+  if (force) {
+    script.push(`rm -f ${marker}`);
+  } else {
+    const tests = [
+      `[ -f ${marker} ]`,
+      `[ "$(cat ${marker})" = ${shellQuote(step.hash)} ]`,
+      ...Object.values(step.outputs).map(file => file.endsWith('/')
+        ? `[ -n "$(ls -A ${shellQuote(file)} 2>/dev/null)" ]`
+        : `[ -e ${shellQuote(file)} ]`),
+      ...step.inputs.map(file => `[ ! ${shellQuote(file)} -nt ${marker} ]`)
+    ];
+    script.push(`if ${tests.join(' && ')}; then echo fresh; else rm -f ${marker}; fi`);
+  }
+  // a directory output without '/' (e.g. -o of metaspades) is left for the tool to make
+  const outputs = Object.values(step.outputs);
+  const made = outputs.filter(file => !file.endsWith('/'));
+  const dirs = outputs.map(file => file.endsWith('/') ? file : path.posix.dirname(file))
+    .filter(dir => !made.some(file => dir === file || dir.startsWith(`${file}/`)));
+  dirs.push(path.posix.dirname(step.marker));
+  script.push(`mkdir -p ${[...new Set(dirs)].map(shellQuote).join(' ')}`);
+  return script.join('\n');
+}
+
+// stdout of a shell script; these run outside the tools' env wrappers
+async function remoteOutput(connectionDetails, script) {
+  const stream = await sshPool.exec(connectionDetails, script);
+  return new Promise((resolve) => {
+    let output = '';
+    stream.on('data', (data) => {
+      output += data;
+    });
+    stream.stderr.resume();
+    stream.on('close', () => resolve(output));
+  });
+}
+
+// Every step of every sample of a directory: { directory, pattern, workdir }
+async function planRun(name, { directory, pattern, workdir }, connectionDetails) {
+  const workflow = workflowsConfig[name];
+  if (!workflow) {
+    throw Object.assign(new Error(`Unknown workflow: ${name}`), { status: 404 });
+  }
+  const check = await checkWorkflow(workflow);
+  if (check.problems.length) {
+    throw Object.assign(new Error(`Workflow ${name} is invalid: ${check.problems.join('; ')}`), { status: 400 });
+  }
+
+  const listing = await listSamples({ directory, pattern, paired: workflow.inputs.length === 2 }, connectionDetails);
+  const samples = listing.samples.map(({ sample, files }) => ({
+    sample,
+    paths: files.map(file => path.posix.join(listing.directory, file))
+  }));
+  const runDir = path.posix.resolve(listing.directory, workdir || `metadock_${name}`);
+  return {
+    workflow: name,
+    title: workflow.title,
+    directory: listing.directory,
+    pattern: listing.pattern,
+    workdir: runDir,
+    steps: check.order,
+    samples,
+    unpaired: listing.unpaired,
+    nodes: samples.flatMap(sample => planSample(workflow, check, sample, runDir))
+  };
+}
+
+// Workflow runs: each step of each sample becomes a job once the steps it
+// depends on succeeded or were skipped as up to date. Steps of one run share
+// the run's `parallel` cap in the job queue, so branches and samples overlap.
+class WorkflowStore {
+  constructor(options = jobsConfig.workflow) {
+    this.options = options;
+    this.runs = new Map();
+    this.saving = Promise.resolve();
+    this.loaded = this.load();
+    jobQueue.on('finish', (job) => this.jobFinished(job));
+    jobQueue.on('credentials', (user) => this.resumeUser(user));
+  }
+
+  async load() {
+    let state;
+    try {
+      state = JSON.parse(await fs.readFile(this.options.stateFile, 'utf8'));
+    } catch (error) {
+      if (error.code !== 'ENOENT') {
+        console.error('Error reading workflow state:', error);
+      }
+      return;
+    }
+
+    for (const run of state.runs || []) {
+      this.runs.set(run.id, run);
+    }
+    // Steps whose job ended or vanished while the server was down
+    for (const run of this.runs.values()) {
+      if (run.status !== 'running') {
+        continue;
+      }
+      const waiting = run.nodes.filter(node => node.status === 'queued');
+      const jobs = await jobQueue.getAll(waiting.map(node => node.jobId));
+      for (const node of waiting) {
+        const job = jobs.get(node.jobId);
+        if (!job) {
+          Object.assign(node, { status: 'interrupted', error: 'Job lost while the server was down' });
+        } else if (!['queued', 'running'].includes(job.status)) {
+          this.settle(node, job);
+        }
+      }
+      for (const node of run.nodes) {
+        if (node.status === 'checking') {
+          node.status = 'pending';
+        }
+      }
+    }
+  }
+
+  save() {
+    const runs = [...this.runs.values()];
+    this.saving = this.saving.then(async () => {
+      const file = this.options.stateFile;
+      await fs.mkdir(path.dirname(file), { recursive: true });
+      await fs.writeFile(`${file}.tmp`, JSON.stringify({ runs }, null, 2));
+      await fs.rename(`${file}.tmp`, file);
+    }).catch((error) => console.error('Error saving workflow state:', error));
+    return this.saving;
+  }
+
+  async create(plan, { parallel, force }, connectionDetails) {
+    await this.loaded;
+    const run = {
+      id: crypto.randomUUID(),
+      ...plan,
+      user: jobQueue.userKey(connectionDetails),
+      parallel,
+      force,
+      status: 'running',
+      createdAt: new Date().toISOString(),
+      finishedAt: null
+    };
+    this.runs.set(run.id, run);
+    this.prune();
+    jobQueue.setCredentials(connectionDetails);
+    this.advance(run);
+    await this.save();
+    return this.describe(run);
+  }
+
+  // start every step whose dependencies are done, block those behind a
+  // stopped one and finish the run once nothing is left to wait for
+  advance(run) {
+    if (run.status !== 'running') {
+      return;
+    }
+    const nodes = new Map(run.nodes.map(node => [node.key, node]));
+    const connectionDetails = jobQueue.credentialsOf(run.user);
+    const ready = [];
+    // nodes are in dependency order per sample, so blocking spreads in one pass
+    for (const node of run.nodes) {
+      if (node.status !== 'pending') {
+        continue;
+      }
+      const deps = node.after.map(step => nodes.get(`${node.sample}/${step}`));
+      if (run.cancelRequested) {
+        node.status = 'cancelled';
+      } else if (deps.some(dep => STOPPED_STATES.has(dep.status))) {
+        node.status = 'blocked';
+      } else if (connectionDetails && deps.every(dep => DONE_STATES.has(dep.status))) {
+        ready.push(node);
+      }
+    }
+    if (ready.length) {
+      this.startNodes(run, ready, connectionDetails);
+    }
+
+    if (!run.nodes.some(node => ACTIVE_STATES.has(node.status))) {
+      run.status = run.nodes.every(node => DONE_STATES.has(node.status)) ? 'succeeded'
+        : run.cancelRequested ? 'cancelled' : 'failed';
+      run.finishedAt = new Date().toISOString();
+    }
+    this.save();
+  }
+
+  // skip the steps that are up to date and queue the others in one submission
+  async startNodes(run, nodes, connectionDetails) {
+    for (const node of nodes) {
+      node.status = 'checking';
+    }
+    const fresh = await Promise.all(nodes.map(node =>
+      remoteOutput(connectionDetails, freshnessScript(node, run.force))
+        .then(output => output.includes('fresh'))
+        .catch((error) => {
+          console.error(`Error checking workflow step ${node.key}:`, error);
+          return false;
+        })));
+
+    const stale = [];
+    nodes.forEach((node, index) => {
+      if (run.cancelRequested) {
+        node.status = 'cancelled';
+      } else if (fresh[index]) {
+        node.status = 'skipped';
+      } else {
+        stale.push(node);
+      }
+    });
+    if (stale.length) {
+      try {
+        const jobs = await jobQueue.submitAll(stale.map(node => ({
+          tool: node.tool,
+          command: node.command,
+          batch: { id: run.id, sample: node.key, parallel: run.parallel }
+        })), connectionDetails);
+        stale.forEach((node, index) => {
+          node.jobId = jobs[index].id;
+          // a job can end before submitAll returns
+          if (node.status === 'checking') {
+            node.status = 'queued';
+          }
+        });
+      } catch (error) {
+        for (const node of stale) {
+          Object.assign(node, { status: 'failed', error: error.message });
+        }
+      }
+    }
+    this.advance(run);
+  }
+
+  settle(node, job) {
+    node.jobId = job.id;
+    for (const field of ['status', 'startedAt', 'finishedAt', 'exitCode', 'signal', 'error']) {
+      node[field] = job[field];
+    }
+  }
+
+  async jobFinished(job) {
+    await this.loaded;
+    const run = job.batch && this.runs.get(job.batch.id);
+    const node = run && run.nodes.find(node => node.key === job.batch.sample);
+    if (!node) {
+      return;
+    }
+    if (job.status === 'succeeded') {
+      // later runs skip the step while this marker, its outputs and inputs stay as they are
+      const script = `printf '%s\\n' ${shellQuote(node.hash)} > ${shellQuote(node.marker)} && echo recorded`;
+      try {
+        const output = await remoteOutput(jobQueue.credentialsOf(run.user), script);
+        if (!output.includes('recorded')) {
+          console.error(`Could not record workflow step ${node.key} as done`);
+        }
+      } catch (error) {
+        console.error(`Error recording workflow step ${node.key}:`, error);
+      }
+    }
+    this.settle(node, job);
+    this.advance(run);
+  }
+
+  // runs left waiting for their user's login, e.g. after a restart
+  async resumeUser(user) {
+    await this.loaded;
+    for (const run of this.runs.values()) {
+      if (run.user === user) {
+        this.advance(run);
+      }
+    }
+  }
+
+  // run the failed, cancelled and blocked steps of a finished run again
+  async resume(id, connectionDetails) {
+    await this.loaded;
+    const run = this.runs.get(id);
+    if (!run) {
+      return null;
+    }
+    if (run.status === 'running') {
+      throw Object.assign(new Error('Workflow run is still running'), { status: 409 });
+    }
+    for (const node of run.nodes) {
+      if (STOPPED_STATES.has(node.status)) {
+        Object.assign(node, {
+          status: 'pending', jobId: null, startedAt: null, finishedAt: null, exitCode: null, signal: null, error: null
+        });
+      }
+    }
+    Object.assign(run, { status: 'running', cancelRequested: false, finishedAt: null });
+    jobQueue.setCredentials(connectionDetails);
+    this.advance(run);
+    return this.describe(run);
+  }
+
+  async cancel(id) {
+    await this.loaded;
+    const run = this.runs.get(id);
+    if (!run) {
+      return null;
+    }
+    if (run.status === 'running') {
+      run.cancelRequested = true;
+      await jobQueue.cancelAll(run.nodes.filter(node => node.status === 'queued').map(node => node.jobId));
+      this.advance(run);
+    }
+    return this.describe(run);
+  }
+
+  // forget the oldest finished runs beyond keepRuns
+  prune() {
+    const finished = [...this.runs.values()]
+      .filter(run => run.status !== 'running')
+      .sort((a, b) => a.createdAt.localeCompare(b.createdAt));
+    for (const run of finished.slice(0, Math.max(0, finished.length - this.options.keepRuns))) {
+      this.runs.delete(run.id);
+    }
+  }
+
+  // the run with the live state of its queued steps and per-status counts
+  async describe(run) {
+    const jobs = await jobQueue.getAll(run.nodes.filter(node => node.status === 'queued').map(node => node.jobId));
+    const counts = {};
+    const nodes = run.nodes.map((node) => {
+      const job = jobs.get(node.jobId);
+      const row = { ...node };
+      if (job) {
+        for (const field of ['status', 'position', 'startedAt', 'events']) {
+          row[field] = job[field];
+        }
+      }
+      counts[row.status] = (counts[row.status] || 0) + 1;
+      return row;
+    });
+    return { ...run, nodes, counts };
+  }
+
+  async get(id) {
+    await this.loaded;
+    const run = this.runs.get(id);
+    return run ? this.describe(run) : null;
+  }
+
+  async list(user = null) {
+    await this.loaded;
+    return [...this.runs.values()]
+      .filter(run => !user || run.user === user)
+      .sort((a, b) => b.createdAt.localeCompare(a.createdAt))
+      .map(({ nodes, samples, unpaired, ...summary }) => {
+        const counts = {};
+        for (const node of nodes) {
+          counts[node.status] = (counts[node.status] || 0) + 1;
+        }
+        return { ...summary, total: nodes.length, sampleCount: samples.length, counts };
+      });
+  }
+}
+
+const workflowStore = new WorkflowStore();
+
+// GET /workflow-definitions -> workflows with their step order and any problems
+async function listWorkflows(req, res) {
+  const workflows = await Promise.all(Object.entries(workflowsConfig).map(async ([name, workflow]) => {
+    const { order, dependencies, problems } = await checkWorkflow(workflow);
+    return {
+      name,
+      title: workflow.title,
+      inputs: workflow.inputs,
+      steps: order.map(step => ({ name: step, tool: workflow.steps[step].tool, after: dependencies[step] })),
+      problems
+    };
+  }));
+  res.json({ workflows });
+}
+
+// POST /workflow-runs { workflow, directory, pattern[, workdir][, parallel][, force][, dryRun] }
+// -> 200 with the planned steps (dryRun), or 202 with the run
+async function startRun(req, res) {
+  const connectionDetails = req.app.locals.connectionDetails;
+  if (!connectionDetails) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+
+  const maxParallel = jobsConfig.workflow.maxParallel;
+  const parallel = Math.max(1, Math.min(parseInt(req.body.parallel) || maxParallel, maxParallel));
+  const force = req.body.force === true || req.body.force === 'true';
+  try {
+    const plan = await planRun(req.body.workflow, {
+      directory: req.body.directory,
+      pattern: req.body.pattern,
+      workdir: req.body.workdir
+    }, connectionDetails);
+    if (req.body.dryRun) {
+      return res.json({ ...plan, parallel, force });
+    }
+    res.status(202).json(await workflowStore.create(plan, { parallel, force }, connectionDetails));
+  } catch (error) {
+    console.error('Error starting workflow run:', error);
+    const status = error.status || (error.code === 2 ? 404 : 500);
+    res.status(status).json({ error: error.message });
+  }
+}
+
+// GET /workflow-runs[?all=1] -> the caller's runs with per-status step counts, newest first
+async function listRuns(req, res) {
+  const user = jobQueue.listUser(req);
+  if (user === undefined) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+  res.json({ runs: await workflowStore.list(user) });
+}
+
+// GET /workflow-runs/:runId -> the run with one entry per step and sample
+async function runStatus(req, res) {
+  if (!req.app.locals.connectionDetails) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+  const run = await workflowStore.get(req.params.runId);
+  if (jobQueue.checkOwner(req, res, run, 'Workflow run')) {
+    res.json(run);
+  }
+}
+
+// POST /workflow-runs/:runId/cancel -> the run, its waiting steps cancelled
+async function cancelRun(req, res) {
+  if (!req.app.locals.connectionDetails) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+  if (jobQueue.checkOwner(req, res, await workflowStore.get(req.params.runId), 'Workflow run')) {
+    res.json(await workflowStore.cancel(req.params.runId));
+  }
+}
+
+// POST /workflow-runs/:runId/resume -> the run, its stopped steps pending again
+async function resumeRun(req, res) {
+  const connectionDetails = req.app.locals.connectionDetails;
+  if (!connectionDetails) {
+    return res.status(401).json({ error: 'Not connected to remote server' });
+  }
+  try {
+    if (jobQueue.checkOwner(req, res, await workflowStore.get(req.params.runId), 'Workflow run')) {
+      res.json(await workflowStore.resume(req.params.runId, connectionDetails));
+    }
+  } catch (error) {
+    res.status(error.status || 500).json({ error: error.message });
+  }
+}
+
+module.exports = workflowStore;
+module.exports.WorkflowStore = WorkflowStore;
+module.exports.checkWorkflow = checkWorkflow;
+module.exports.planSample = planSample;
+module.exports.planRun = planRun;
+module.exports.listWorkflows = listWorkflows;
+module.exports.startRun = startRun;
+module.exports.listRuns = listRuns;
+module.exports.runStatus = runStatus;
+module.exports.cancelRun = cancelRun;
+module.exports.resumeRun = resumeRun;
@@ -1,14 +1,20 @@
 const express = require('express');
 const { exec } = require('child_process');
-const { Client } = require('ssh2');
 const fs = require('fs').promises;
 const multer = require('multer');
 const toolsConfig = require('./config/tools');
 const visualizationConfig = require('./config/visualization');
+const workflowsConfig = require('./config/workflows');
 const commandHandler = require('./handlers/commandHandler');
+const commandRuns = require('./handlers/commandRuns');
+const jobQueue = require('./handlers/jobQueue');
+const batchRuns = require('./handlers/batchRuns');
+const workflowRuns = require('./handlers/workflowRuns');
+const sshPool = require('./handlers/sshPool');
 const iconv = require('iconv-lite');
 const path = require('path');
 const adminRoutes = require('./admin/routes/adminRoutes');
+const helpWorker = require('./admin/services/helpWorkerService');
 const session = require('express-session');
 const { promisify } = require('util');
 const JSZip = require('jszip');
@@ -105,9 +111,25 @@ app.get('/dashboard', checkConnection, (req, res) => {
     return res.redirect('/admin');
   }
   // Otherwise show regular user dashboard
-  res.render('dashboard', { toolsConfig });
+  res.render('dashboard', { toolsConfig, workflowsConfig });
 });
 
+// A tool's parameters and usage from the compiled catalog (param_catalog.py).
+// A page load does not wait behind an upload or re-parse: while the help worker
+// is busy, or when it does not answer within PARAMETER_LOOKUP_TIMEOUT ms, the
+// routes send the JSON files instead
+const PARAMETER_LOOKUP_TIMEOUT = 2000;
+
+async function lookupParameters(tool) {
+  if (helpWorker.busy()) {
+    throw new Error('Help worker is busy');
+  }
+  return helpWorker.lookup({
+    para_file: path.join(__dirname, tool.paraPath),
+    usage_file: path.join(__dirname, tool.usagePath)
+  }, PARAMETER_LOOKUP_TIMEOUT);
+}
+
 // Dynamic tool routes - must be before the :tool/file-browser route
 Object.values(toolsConfig).forEach(tool => {
   // Add case-insensitive routes
@@ -121,12 +143,22 @@ Object.values(toolsConfig).forEach(tool => {
 
     app.post(tool.commandRoute, commandHandler(tool));
   
-    app.get(`/get_${path.basename(tool.usagePath, '_usage.json')}_usage`, (req, res) => {
-      res.sendFile(path.join(__dirname, tool.usagePath));
+    app.get(`/get_${path.basename(tool.usagePath, '_usage.json')}_usage`, async (req, res) => {
+      try {
+        const { usage } = await lookupParameters(tool);
+        res.json({ usage });
+      } catch (error) {
+        res.sendFile(path.join(__dirname, tool.usagePath));
+      }
     });
   
-    app.get(`/get_${path.basename(tool.paraPath, '_para.json')}_para`, (req, res) => {
-      res.sendFile(path.join(__dirname, tool.paraPath));
+    app.get(`/get_${path.basename(tool.paraPath, '_para.json')}_para`, async (req, res) => {
+      try {
+        const { para } = await lookupParameters(tool);
+        res.json(para);
+      } catch (error) {
+        res.sendFile(path.join(__dirname, tool.paraPath));
+      }
     });
   
     app.get(tool.selectionRoute, async (req, res) => {
@@ -145,6 +177,33 @@ Object.values(toolsConfig).forEach(tool => {
     });
   });
 
+// Live output of tool commands (started with { stream: true } on a command route, or as jobs)
+app.get('/runs/:runId', commandRuns.runStatus);
+app.get('/runs/:runId/events', commandRuns.streamRun);
+
+// Queued tool commands, run under global and per-user limits (config/jobs.js)
+app.post('/jobs', jobQueue.submitJob);
+app.get('/jobs', jobQueue.listJobs);
+app.get('/jobs/:jobId', jobQueue.jobStatus);
+app.post('/jobs/:jobId/cancel', jobQueue.cancelJob);
+
+// One job per sample of a directory, at most `parallel` of them running at once
+app.post('/batches', batchRuns.submitBatch);
+app.get('/batches', batchRuns.listBatches);
+app.get('/batches/:batchId', batchRuns.batchStatus);
+app.post('/batches/:batchId/cancel', batchRuns.cancelBatch);
+
+// Workflows chaining tools per sample (config/workflows.js)
+app.get('/workflows', checkConnection, (req, res) => {
+  res.render('workflows', { workflowsConfig });
+});
+app.get('/workflow-definitions', workflowRuns.listWorkflows);
+app.post('/workflow-runs', workflowRuns.startRun);
+app.get('/workflow-runs', workflowRuns.listRuns);
+app.get('/workflow-runs/:runId', workflowRuns.runStatus);
+app.post('/workflow-runs/:runId/cancel', workflowRuns.cancelRun);
+app.post('/workflow-runs/:runId/resume', workflowRuns.resumeRun);
+
 // Dynamic visualization routes
 Object.values(visualizationConfig).forEach(visualization => {
   app.get(`/${visualization.route.toLowerCase()}`, checkConnection, (req, res) => {
@@ -168,68 +227,41 @@ const sshConfig = {
 
 // Helper function to get file list from remote system
 async function getRemoteFileList(dir, sshConfig) {
-    return new Promise((resolve, reject) => {
-        const conn = new Client();
-        const fileList = [];
-
-        conn.on('ready', () => {
-            conn.sftp((err, sftp) => {
-                if (err) {
-                    conn.end();
-                    return reject(err);
-                }
-
-                sftp.readdir(dir, (err, list) => {
-                    if (err) {
-                        conn.end();
-                        return reject(err);
-                    }
-
-                    // Process each file
-                    const processFile = (index) => {
-                        if (index >= list.length) {
-                            conn.end();
-                            // Sort directories first, then files alphabetically
-                            return resolve(fileList.sort((a, b) => {
-                                if (a.isDirectory && !b.isDirectory) return -1;
-                                if (!a.isDirectory && b.isDirectory) return 1;
-                                return a.filename.localeCompare(b.filename);
-                            }));
-                        }
-
-                        const file = list[index];
-                        // Skip system files and hidden files
-                        if (file.filename.startsWith('.') || 
-                            file.filename === 'pagefile.sys' || 
-                            file.filename === 'hiberfil.sys' || 
-                            file.filename === 'swapfile.sys') {
-                            return processFile(index + 1);
-                        }
-
-                        const isDirectory = file.attrs.isDirectory();
-                        const filePath = path.posix.join(dir, file.filename);
-                        
-                        fileList.push({
-                            filename: file.filename, // Only the filename
-                            size: formatFileSize(file.attrs.size),
-                            date: new Date(file.attrs.mtime * 1000).toLocaleString(),
-                            permissions: getFilePermissions(file.attrs.mode),
-                            isDirectory: isDirectory,
-                            fullPath: filePath, // Add fullPath for navigation
-                            buttons: isDirectory 
-                                ? `<button onclick="navigateToFolder('${filePath}')" class="folder-btn">Open</button>`
-                                : `<button onclick="selectFile('${file.filename}')" class="file-btn">Select</button>`
-                        });
+    const list = await sshPool.withSftp(sshConfig, (sftp) => new Promise((resolve, reject) => {
+        sftp.readdir(dir, (err, list) => err ? reject(err) : resolve(list));
+    }));
+
+    const fileList = [];
+    for (const file of list) {
+        // Skip system files and hidden files
+        if (file.filename.startsWith('.') || 
+            file.filename === 'pagefile.sys' || 
+            file.filename === 'hiberfil.sys' || 
+            file.filename === 'swapfile.sys') {
+            continue;
+        }
 
-                        processFile(index + 1);
-                    };
+        const isDirectory = file.attrs.isDirectory();
+        const filePath = path.posix.join(dir, file.filename);
+        
+        fileList.push({
+            filename: file.filename, // Only the filename
+            size: formatFileSize(file.attrs.size),
+            date: new Date(file.attrs.mtime * 1000).toLocaleString(),
+            permissions: getFilePermissions(file.attrs.mode),
+            isDirectory: isDirectory,
+            fullPath: filePath, // Add fullPath for navigation
+            buttons: isDirectory 
+                ? `<button onclick="navigateToFolder('${filePath}')" class="folder-btn">Open</button>`
+                : `<button onclick="selectFile('${file.filename}')" class="file-btn">Select</button>`
+        });
+    }
 
-                    processFile(0);
-                });
-            });
-        }).on('error', (err) => {
-            reject(err);
-        }).connect(sshConfig);
+    // Sort directories first, then files alphabetically
+    return fileList.sort((a, b) => {
+        if (a.isDirectory && !b.isDirectory) return -1;
+        if (!a.isDirectory && b.isDirectory) return 1;
+        return a.filename.localeCompare(b.filename);
     });
 }
 
@@ -299,78 +331,44 @@ app.post('/upload-files', upload.array('files'), async (req, res) => {
             password: connectionDetails.password
         };
         
-        const conn = new Client();
-        conn.on('ready', () => {
-            conn.sftp((err, sftp) => {
-                if (err) {
-                    conn.end();
-                    return res.status(500).json({ error: err.message });
-                }
-
-                let uploaded = 0;
-                const total = files.length;
-                let hasError = false;
-
-                const uploadNext = (index) => {
-                    if (index >= files.length) {
-                        // Clean up temporary files
-                        files.forEach(file => {
-                            try {
-                                require('fs').unlinkSync(file.path);
-                            } catch (err) {
-                                console.error(`Error deleting temporary file ${file.path}:`, err);
-                            }
-                        });
-                        conn.end();
-                        if (!hasError) {
-                            res.end(JSON.stringify({ success: true }));
-                        }
-                        return;
-                    }
-
-                    const file = files[index];
+        let uploaded = 0;
+        const total = files.length;
+        try {
+            await sshPool.withSftp(sshConfig, async (sftp) => {
+                for (const file of files) {
                     // Get only the original filename without any path
                     const originalName = path.basename(file.originalname);
                     // Create the remote path using only the current directory and original filename
                     const remotePath = path.posix.join(currentDir, originalName);
 
-                    sftp.fastPut(file.path, remotePath, (err) => {
-                        if (err) {
-                            console.error(`Error uploading ${originalName}:`, err);
-                            hasError = true;
-                            if (!res.headersSent) {
-                                res.status(500).json({ error: `Failed to upload ${originalName}: ${err.message}` });
-                            }
-                            return;
-                        }
-                        uploaded++;
-                        if (!hasError) {
-                            res.write(JSON.stringify({ progress: Math.round((uploaded / total) * 100) }) + '\n');
-                        }
-                        uploadNext(index + 1);
-                    });
-                };
-
-                uploadNext(0);
-            });
-        }).on('error', (err) => {
-            // Clean up temporary files on error
-            if (files) {
-                files.forEach(file => {
                     try {
-                        require('fs').unlinkSync(file.path);
+                        await new Promise((resolve, reject) => {
+                            sftp.fastPut(file.path, remotePath, (err) => err ? reject(err) : resolve());
+                        });
                     } catch (err) {
-                        console.error(`Error deleting temporary file ${file.path}:`, err);
+                        console.error(`Error uploading ${originalName}:`, err);
+                        throw new Error(`Failed to upload ${originalName}: ${err.message}`);
                     }
-                });
-            }
-            if (!res.headersSent) {
-                res.status(500).json({ error: err.message });
-            }
-        }).connect(sshConfig);
+                    uploaded++;
+                    res.write(JSON.stringify({ progress: Math.round((uploaded / total) * 100) }) + '\n');
+                }
+            });
+            res.end(JSON.stringify({ success: true }));
+        } finally {
+            // Clean up temporary files
+            files.forEach(file => {
+                try {
+                    require('fs').unlinkSync(file.path);
+                } catch (err) {
+                    console.error(`Error deleting temporary file ${file.path}:`, err);
+                }
+            });
+        }
     } catch (error) {
         if (!res.headersSent) {
             res.status(500).json({ error: error.message });
+        } else {
+            res.end(JSON.stringify({ error: error.message }) + '\n');
         }
     }
 });
@@ -400,64 +398,35 @@ app.post('/download-files', async (req, res) => {
             password: connectionDetails.password
         };
         
-        const conn = new Client();
-        conn.on('ready', () => {
-            conn.sftp((err, sftp) => {
-                if (err) {
-                    conn.end();
-                    return res.status(500).json({ error: err.message });
-                }
-
-                // Create a zip file
-                const zip = new JSZip();
-                let hasError = false;
-
-                const processNext = (index) => {
-                    if (index >= files.length) {
-                        // Generate zip file
-                        zip.generateAsync({ type: 'nodebuffer' })
-                            .then(content => {
-                                if (!hasError) {
-                                    res.setHeader('Content-Type', 'application/zip');
-                                    res.setHeader('Content-Disposition', 'attachment; filename=selected_files.zip');
-                                    res.send(content);
-                                }
-                                conn.end();
-                            })
-                            .catch(err => {
-                                if (!hasError) {
-                                    hasError = true;
-                                    res.status(500).json({ error: 'Failed to create zip file: ' + err.message });
-                                }
-                                conn.end();
-                            });
-                        return;
-                    }
-
-                    const filename = path.basename(files[index]);
-                    const filePath = path.posix.join(currentDir, filename);
-
-                    sftp.readFile(filePath, (err, data) => {
-                        if (err) {
-                            console.error(`Error reading ${filename}:`, err);
-                            if (!hasError) {
-                                hasError = true;
-                                res.status(500).json({ error: `Failed to read ${filename}: ${err.message}` });
-                            }
-                        } else {
-                            zip.file(filename, data);
-                        }
-                        processNext(index + 1);
+        // Create a zip file
+        const zip = new JSZip();
+        await sshPool.withSftp(sshConfig, async (sftp) => {
+            for (const file of files) {
+                const filename = path.basename(file);
+                const filePath = path.posix.join(currentDir, filename);
+
+                try {
+                    const data = await new Promise((resolve, reject) => {
+                        sftp.readFile(filePath, (err, data) => err ? reject(err) : resolve(data));
                     });
-                };
-
-                processNext(0);
-            });
-        }).on('error', (err) => {
-            if (!res.headersSent) {
-                res.status(500).json({ error: err.message });
+                    zip.file(filename, data);
+                } catch (err) {
+                    console.error(`Error reading ${filename}:`, err);
+                    throw new Error(`Failed to read ${filename}: ${err.message}`);
+                }
             }
-        }).connect(sshConfig);
+        });
+
+        // Generate zip file
+        let content;
+        try {
+            content = await zip.generateAsync({ type: 'nodebuffer' });
+        } catch (err) {
+            return res.status(500).json({ error: 'Failed to create zip file: ' + err.message });
+        }
+        res.setHeader('Content-Type', 'application/zip');
+        res.setHeader('Content-Disposition', 'attachment; filename=selected_files.zip');
+        res.send(content);
     } catch (error) {
         if (!res.headersSent) {
             res.status(500).json({ error: error.message });
@@ -490,63 +459,48 @@ app.post('/delete-files', async (req, res) => {
             password: connectionDetails.password
         };
         
-        const conn = new Client();
-        conn.on('ready', () => {
-            conn.sftp((err, sftp) => {
-                if (err) {
-                    conn.end();
-                    return res.status(500).json({ error: err.message });
-                }
-
-                // Set up streaming response
-                res.setHeader('Content-Type', 'application/json');
-                res.setHeader('Transfer-Encoding', 'chunked');
-                res.flushHeaders();
-
-                let deleted = 0;
-                const total = files.length;
-                let hasError = false;
-
-                const deleteNext = (index) => {
-                    if (index >= files.length) {
-                        conn.end();
-                        if (!hasError) {
-                            res.write(JSON.stringify({ success: true }) + '\n');
-                        }
-                        res.end();
-                        return;
-                    }
-
-                    // Use only the filename and current directory
-                    const filename = path.basename(files[index]);
-                    const filePath = path.posix.join(currentDir, filename);
-
-                    sftp.unlink(filePath, (err) => {
-                        if (err) {
-                            console.error(`Error deleting ${filename}:`, err);
-                            if (!hasError) {
-                                hasError = true;
-                                res.write(JSON.stringify({ error: `Failed to delete ${filename}: ${err.message}` }) + '\n');
-                            }
-                        }
-                        deleted++;
-                        if (!hasError) {
-                            res.write(JSON.stringify({ progress: Math.round((deleted / total) * 100) }) + '\n');
-                        }
-                        deleteNext(index + 1);
+        await sshPool.withSftp(sshConfig, async (sftp) => {
+            // Set up streaming response
+            res.setHeader('Content-Type', 'application/json');
+            res.setHeader('Transfer-Encoding', 'chunked');
+            res.flushHeaders();
+
+            let deleted = 0;
+            const total = files.length;
+            let hasError = false;
+
+            for (const file of files) {
+                // Use only the filename and current directory
+                const filename = path.basename(file);
+                const filePath = path.posix.join(currentDir, filename);
+
+                try {
+                    await new Promise((resolve, reject) => {
+                        sftp.unlink(filePath, (err) => err ? reject(err) : resolve());
                     });
-                };
+                } catch (err) {
+                    console.error(`Error deleting ${filename}:`, err);
+                    if (!hasError) {
+                        hasError = true;
+                        res.write(JSON.stringify({ error: `Failed to delete ${filename}: ${err.message}` }) + '\n');
+                    }
+                }
+                deleted++;
+                if (!hasError) {
+                    res.write(JSON.stringify({ progress: Math.round((deleted / total) * 100) }) + '\n');
+                }
+            }
 
-                deleteNext(0);
-            });
-        }).on('error', (err) => {
-            if (!res.headersSent) {
-                res.status(500).json({ error: err.message });
+            if (!hasError) {
+                res.write(JSON.stringify({ success: true }) + '\n');
             }
-        }).connect(sshConfig);
+            res.end();
+        });
     } catch (error) {
         if (!res.headersSent) {
             res.status(500).json({ error: error.message });
+        } else {
+            res.end();
         }
     }
 });
@@ -563,34 +517,24 @@ app.post('/connect', upload.none(), async (req, res) => {
   }
 
   try {
-    const conn = new Client();
-    await new Promise((resolve, reject) => {
-      conn.on('ready', () => {
-        console.log('SSH connection established');
-        req.app.locals.connectionDetails = {
-          host,
-          port: parseInt(port) || 22,
-          username,
-          password
-        };
-        conn.end();
-        resolve();
-      });
-
-      conn.on('error', (err) => {
-        console.error('SSH connection failed:', err);
-        reject(err);
-      });
-
-      conn.connect({
-        host,
-        port: parseInt(port) || 22,
-        username,
-        password,
-        readyTimeout: 10000,
-        tryKeyboard: true
-      });
-    });
+    const connectionDetails = {
+      host,
+      port: parseInt(port) || 22,
+      username,
+      password
+    };
+    // A different login retires the pooled connection of the previous one once
+    // its running commands and transfers are done; the same login keeps it
+    const previous = req.app.locals.connectionDetails;
+    if (previous && !sshPool.sameLogin(previous, connectionDetails)) {
+      sshPool.close(previous);
+    }
+    // The connection that checks the credentials stays in the pool for the next requests
+    await sshPool.connect({ ...connectionDetails, readyTimeout: 10000, tryKeyboard: true });
+    console.log('SSH connection established');
+    req.app.locals.connectionDetails = connectionDetails;
+    // Jobs this login queued before a restart can start again
+    jobQueue.setCredentials(connectionDetails);
 
     res.json({ 
       success: true, 
@@ -615,19 +559,8 @@ app.get('/check-connection', async (req, res) => {
   }
 
   try {
-    const conn = new Client();
-    await new Promise((resolve, reject) => {
-      conn.on('ready', () => {
-        conn.end();
-        resolve();
-      });
-
-      conn.on('error', (err) => {
-        reject(err);
-      });
-
-      conn.connect(req.app.locals.connectionDetails);
-    });
+    // Reuses the pooled connection; keepalive drops it when the server goes away
+    await sshPool.connect(req.app.locals.connectionDetails);
 
     res.json({ connected: true });
   } catch (err) {
@@ -646,7 +579,10 @@ app.get('/logout', (req, res) => {
     if (err) {
       console.error('Error destroying session:', err);
     }
-    // Clear connection details
+    // Retire the pooled connection (running jobs finish on it) and clear connection details
+    if (req.app.locals.connectionDetails) {
+      sshPool.close(req.app.locals.connectionDetails);
+    }
     req.app.locals.connectionDetails = null;
     res.redirect('/login');
   });
@@ -696,25 +632,10 @@ app.get('/check-folder', async (req, res) => {
             password: connectionDetails.password
         };
 
-        const conn = new Client();
-        conn.on('ready', () => {
-            conn.sftp((err, sftp) => {
-                if (err) {
-                    conn.end();
-                    return res.status(500).json({ error: err.message });
-                }
-
-                sftp.stat(dir, (err, stats) => {
-                    conn.end();
-                    if (err) {
-                        return res.json({ exists: false });
-                    }
-                    res.json({ exists: stats.isDirectory() });
-                });
-            });
-        }).on('error', (err) => {
-            res.status(500).json({ error: err.message });
-        }).connect(sshConfig);
+        const stats = await sshPool.withSftp(sshConfig, (sftp) => new Promise((resolve) => {
+            sftp.stat(dir, (err, stats) => resolve(err ? null : stats));
+        }));
+        res.json({ exists: stats ? stats.isDirectory() : false });
     } catch (error) {
         res.status(500).json({ error: error.message });
     }
@@ -807,35 +728,26 @@ app.get('/read-remote-file', checkConnection, async (req, res) => {
 
 // Helper function to read remote file content
 async function readRemoteFileContent(filePath, sshConfig) {
-  return new Promise((resolve, reject) => {
-    const { Client } = require('ssh2');
-    const conn = new Client();
-
-    conn.on('ready', () => {
-      conn.sftp((err, sftp) => {
+  let data;
+  try {
+    data = await sshPool.withSftp(sshConfig, (sftp) => new Promise((resolve, reject) => {
+      sftp.readFile(filePath, (err, data) => {
         if (err) {
-          conn.end();
-          return reject(new Error(`SFTP connection failed: ${err.message}`));
+          return reject(new Error(`Failed to read remote file: ${err.message}`));
         }
-
-        sftp.readFile(filePath, (err, data) => {
-          conn.end();
-          if (err) {
-            return reject(new Error(`Failed to read remote file: ${err.message}`));
-          }
-          
-          // Convert buffer to string with proper encoding
-          const content = data.toString('utf8');
-          resolve({
-            content: content,
-            size: data.length
-          });
-        });
+        resolve(data);
       });
-    }).on('error', (err) => {
-      reject(new Error(`SSH connection failed: ${err.message}`));
-    }).connect(sshConfig);
-  });
+    }));
+  } catch (err) {
+    throw err.message.startsWith('Failed to read remote file') ? err : new Error(`SSH connection failed: ${err.message}`);
+  }
+
+  // Convert buffer to string with proper encoding
+  const content = data.toString('utf8');
+  return {
+    content: content,
+    size: data.length
+  };
 }
 
 // Get visualization tools list